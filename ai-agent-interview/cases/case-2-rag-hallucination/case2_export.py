@@ -6,12 +6,16 @@ No dependency on map_invoices_to_base_carbone.py
 import datetime as dt
 import json
 import logging
+import math
 import os
 import re
+import threading
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
 import requests
 from openpyxl import load_workbook
 from openpyxl.workbook.workbook import Workbook
@@ -1693,6 +1697,164 @@ class MappingResult:
     detected_category: Optional[str] = None
 
 
+# ============================================================
+# FACTOR STORE
+# ============================================================
+# Index fields of a Base Carbone factor document (everything FactorRecord is built from)
+FACTOR_DOCUMENT_FIELDS = [
+    "row_index", "identifier", "status", "name_fr", "name_en",
+    "category", "tags_fr", "tags_en", "unit_fr", "unit_en",
+    "contributor", "other_contributors", "programme", "source",
+    "url", "location", "created_at", "modified_at", "validity",
+    "comments_fr", "comments_en", "total", "co2f", "ch4f", "ch4b", "n2o", "extra_gases",
+]
+# Emission values a FactorStore entry must share with a search hit to stand in for it: Base Carbone releases
+# keep identifiers and change values, so a store built from an older snapshot than the index is caught here
+FACTOR_VALUE_FIELDS = ["total", "co2f", "ch4f", "ch4b", "n2o"]
+# Fields requested from search when hits are resolved through a FactorStore
+FACTOR_KEY_FIELDS = ["id", "row_index", "identifier"] + FACTOR_VALUE_FIELDS
+# Phase one of two-phase retrieval without a FactorStore: keys plus the fields of the reranking text
+FACTOR_RERANK_FIELDS = ["id", "row_index", "identifier", "name_fr", "name_en", "category", "tags_fr", "tags_en"]
+
+
+def parse_extra_gases(value: Any) -> List[Tuple[str, Optional[float]]]:
+    """Parse the extra_gases field (JSON list of {"code", "value"} or [code, value] pairs)."""
+    try:
+        parsed = json.loads(value or "[]") if isinstance(value, str) else value
+    except Exception:
+        return []
+    gases: List[Tuple[str, Optional[float]]] = []
+    if isinstance(parsed, list):
+        for item in parsed:
+            if isinstance(item, dict):
+                gases.append((item.get("code"), item.get("value")))
+            elif isinstance(item, (list, tuple)) and len(item) >= 2:
+                gases.append((item[0], item[1]))
+    return gases
+
+
+def factor_from_document(doc: Dict[str, Any]) -> FactorRecord:
+    """Build a FactorRecord from a Base Carbone search document (search hit or snapshot row)."""
+    return FactorRecord(
+        row_index=int(doc.get("row_index") or 0),
+        identifier=doc.get("identifier"),
+        status=doc.get("status"),
+        name_fr=doc.get("name_fr"),
+        name_en=doc.get("name_en"),
+        category=doc.get("category"),
+        tags_fr=doc.get("tags_fr"),
+        unit_fr=doc.get("unit_fr"),
+        unit_en=doc.get("unit_en"),
+        contributor=doc.get("contributor"),
+        other_contributors=doc.get("other_contributors"),
+        programme=doc.get("programme"),
+        source=doc.get("source"),
+        url=doc.get("url"),
+        location=doc.get("location"),
+        created_at=doc.get("created_at"),
+        modified_at=doc.get("modified_at"),
+        validity=doc.get("validity"),
+        comments_fr=doc.get("comments_fr"),
+        comments_en=doc.get("comments_en"),
+        total=doc.get("total"),
+        co2f=doc.get("co2f"),
+        ch4f=doc.get("ch4f"),
+        ch4b=doc.get("ch4b"),
+        n2o=doc.get("n2o"),
+        extra_gases=parse_extra_gases(doc.get("extra_gases")),
+        raw=dict(doc) if hasattr(doc, "keys") else {},
+    )
+
+
+class FactorStore:
+    """
+    Base Carbone factors materialized once, keyed by index document id (row_index alone is not a key:
+    CSV documents in the same index number their rows too).
+    Search hits then only need to carry keys and scores; candidates share the stored FactorRecord
+    instead of parsing a new one (extra_gases JSON, raw copy) for every hit.
+    """
+
+    def __init__(self, factors: Dict[str, FactorRecord], version: Optional[str] = None) -> None:
+        self.version = version
+        self._by_id = dict(factors)
+
+    @classmethod
+    def from_documents(cls, documents: Sequence[Dict[str, Any]], version: Optional[str] = None) -> "FactorStore":
+        """
+        Args:
+            documents: Base Carbone documents as built for the index (e.g. from the Parquet snapshot)
+            version: Snapshot checksum the documents come from
+        """
+        factors = {}
+        for doc in documents:
+            # Same fields and values as a search hit (the index returns dates as ISO strings)
+            fields = {
+                name: value.isoformat() if isinstance(value, dt.datetime) else value
+                for name, value in ((name, doc.get(name)) for name in FACTOR_DOCUMENT_FIELDS)
+            }
+            factors[doc["id"]] = factor_from_document(fields)
+        return cls(factors, version=version)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, doc_id: str) -> Optional[FactorRecord]:
+        return self._by_id.get(doc_id)
+
+    def resolve_hit(self, hit: Dict[str, Any]) -> Optional[FactorRecord]:
+        """
+        Stored factor for a search hit, or None if the store doesn't have it or has another version of the row
+        (identifier or FACTOR_VALUE_FIELDS differ from the hit's); such hits are then read from the index.
+        """
+        factor = self._by_id.get(hit.get("id"))
+        if factor is None:
+            return None
+        for name in ["identifier"] + FACTOR_VALUE_FIELDS:
+            if name in hit and not _same_field_value(hit[name], getattr(factor, name)):
+                return None
+        return factor
+
+
+def _same_field_value(hit_value: Any, stored_value: Any) -> bool:
+    if hit_value == stored_value:
+        return True
+    # NaN emission values compare unequal to themselves
+    return isinstance(hit_value, float) and isinstance(stored_value, float) and math.isnan(hit_value) and math.isnan(stored_value)
+
+
+_factor_store: Optional[FactorStore] = None
+_factor_store_lock = threading.Lock()
+
+
+def get_factor_store() -> Optional[FactorStore]:
+    """
+    Get the process-wide FactorStore, loaded from the latest Base Carbone snapshot and
+    reloaded only when ingestion publishes a new one.
+
+    Returns:
+        FactorStore, or None when no snapshot is available (hits then carry every factor field)
+    """
+    global _factor_store
+    from companies.sdk.sola_rag import (
+        get_base_carbone_snapshot_manifest_path,
+        load_index_state,
+        load_latest_base_carbone_snapshot,
+    )
+
+    manifest = load_index_state(get_base_carbone_snapshot_manifest_path())
+    with _factor_store_lock:
+        if _factor_store is not None and _factor_store.version == manifest.get("sha256"):
+            return _factor_store
+        snapshot = load_latest_base_carbone_snapshot()
+        if snapshot is None:
+            _factor_store = None
+            return None
+        manifest, documents = snapshot
+        _factor_store = FactorStore.from_documents(documents, version=manifest.get("sha256"))
+        logger.info(f"[SOLA EXPORT] Factor store loaded: {len(_factor_store)} Base Carbone factors (snapshot {manifest.get('file')})")
+        return _factor_store
+
+
 # ============================================================
 # SEARCH AND MATCHING FUNCTIONS
 # ============================================================
@@ -1746,6 +1908,110 @@ def build_search_query(invoice: InvoiceRecord) -> str:
     return f"{base_clause}; mots-clés: {keywords_clause}; ADEME Base Carbone v23.6"
 
 
+def strict_mapping_key(invoice_type: Optional[str]) -> str:
+    """Strict mapping lookup key of an invoice type (same normalization as map_invoices_to_base_carbone.py)"""
+    return (invoice_type or "").lower().strip()
+
+
+def invoice_matching_key(invoice: InvoiceRecord) -> Tuple[Any, ...]:
+    """
+    Key of the invoice fields that drive factor matching (build_search_query, detect_invoice_category,
+    strict mappings). The activity amount is left out: invoices that differ only by amount (or date,
+    source file) share candidates and selected factor; emissions are still computed per invoice.
+    The invoice type is keyed as the strict mappings look it up, so a group never mixes invoices
+    with and without a strict match.
+    """
+    def _norm(value: Any) -> str:
+        return " ".join(str(value).split()).casefold() if value is not None else ""
+
+    return (
+        strict_mapping_key(invoice.invoice_type),
+        _norm(invoice.transportation_type),
+        _norm(invoice.location),
+        _norm(invoice.departure_city),
+        _norm(invoice.departure_country),
+        _norm(invoice.destination_city),
+        _norm(invoice.destination_country),
+        _norm(invoice.travel_class),
+        _norm(invoice.unit),
+        invoice.activity_data is not None,
+    )
+
+
+class MatchMemo:
+    """
+    Factor selections shared by the invoices of one export that have the same matching key (thread-safe).
+
+    A key's selection is always computed from its first invoice (deterministic whatever the worker
+    scheduling); per-key locks make concurrent duplicates wait for it instead of repeating the search.
+    A selection with an LLM decision is specific to its invoice (inferred activity, conversion): it is
+    not reused, and every other invoice of that key runs its own selection.
+    """
+
+    def __init__(
+        self,
+        select: Callable[[int], Any],
+        matching_keys: List[Tuple[Any, ...]],
+        representatives: Dict[Tuple[Any, ...], int],
+    ) -> None:
+        self.select = select
+        self.matching_keys = matching_keys
+        self.representatives = representatives
+        self.hits = 0
+        self.misses = 0
+        self._selections: Dict[Tuple[Any, ...], Any] = {}
+        self._not_reusable: Set[Tuple[Any, ...]] = set()
+        # Selections computed for a representative by a duplicate that got its key first
+        self._pending: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[Any, ...], threading.Lock] = {}
+
+    @staticmethod
+    def is_reusable(selection: Any) -> bool:
+        return selection is None or selection[2] is None
+
+    def get(self, invoice_index: int) -> Any:
+        """Selection for an invoice: select(invoice_index) or the memoized selection of its key."""
+        key = self.matching_keys[invoice_index]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._selections:
+                with self._lock:
+                    self.hits += 1
+                return self._selections[key]
+            if key not in self._not_reusable:
+                representative_index = self.representatives[key]
+                selection = self.select(representative_index)
+                with self._lock:
+                    self.misses += 1
+                if self.is_reusable(selection):
+                    self._selections[key] = selection
+                    return selection
+                self._not_reusable.add(key)
+                if representative_index == invoice_index:
+                    return selection
+                with self._lock:
+                    self._pending[representative_index] = selection
+        # Not reusable: this invoice gets its own selection (outside the key lock, duplicates run in parallel)
+        with self._lock:
+            if invoice_index in self._pending:
+                return self._pending.pop(invoice_index)
+        selection = self.select(invoice_index)
+        with self._lock:
+            self.misses += 1
+        return selection
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
 def detect_invoice_category(invoice: InvoiceRecord) -> Optional[str]:
     """Detect the category of an invoice based on its type and description."""
     searchable = " ".join(
@@ -2209,6 +2475,9 @@ def call_llm_decision(
 class ECBRateFetcher:
     def __init__(self) -> None:
         self._cache: Dict[Tuple[str, str], Optional[Tuple[float, str, str]]] = {}
+        # Thread-safe: one lock per (currency, date) so each rate is fetched once across matching workers
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
 
     def get_rate(
         self, date_str: Optional[str], currency: Optional[str]
@@ -2223,27 +2492,30 @@ class ECBRateFetcher:
                 "https://www.ecb.europa.eu/stats/policy_and_exchange_rates/euro_reference_exchange_rates/html/index.en.html",
             )
         key = (currency_upper, date_str)
-        if key in self._cache:
-            cached = self._cache[key]
-            if cached:
-                return cached
-            return None, None, None
-        try:
-            response = requests.get(
-                f"https://api.exchangerate.host/{date_str}",
-                params={"base": currency_upper, "symbols": "EUR"},
-                timeout=10,
-            )
-            response.raise_for_status()
-            data = response.json()
-            value = float(data["rates"]["EUR"])
-            source = "ECB reference (via exchangerate.host)"
-            url = data.get("motd", {}).get("url", "https://exchangerate.host")
-            self._cache[key] = (value, source, url)
-            return value, source, url
-        except Exception:
-            self._cache[key] = None
-            return None, None, None
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._cache:
+                cached = self._cache[key]
+                if cached:
+                    return cached
+                return None, None, None
+            try:
+                response = requests.get(
+                    f"https://api.exchangerate.host/{date_str}",
+                    params={"base": currency_upper, "symbols": "EUR"},
+                    timeout=10,
+                )
+                response.raise_for_status()
+                data = response.json()
+                value = float(data["rates"]["EUR"])
+                source = "ECB reference (via exchangerate.host)"
+                url = data.get("motd", {}).get("url", "https://exchangerate.host")
+                self._cache[key] = (value, source, url)
+                return value, source, url
+            except Exception:
+                self._cache[key] = None
+                return None, None, None
 
 
 # ============================================================
@@ -2582,6 +2854,7 @@ def export_sola_to_excel(
     task_id: str,
     company_id: int,
     progress_callback: Optional[Callable[[str, int, str], None]] = None,
+    max_workers: Optional[int] = None,
 ) -> Dict[str, Any]:
     """
     Export Sola RAG data to Excel with Base Carbone matching.
@@ -2591,18 +2864,22 @@ def export_sola_to_excel(
         task_id: Unique task identifier for progress tracking
         company_id: Company ID for file naming
         progress_callback: Optional callback function(status, progress, message)
+        max_workers: Invoices matched concurrently (default: EXPORT_MATCH_MAX_WORKERS)
     
     Returns:
         Dict with keys: status, file_path, error, strict_match_count, processed_count
     """
-    from azure.core.credentials import AzureKeyCredential
-    from azure.search.documents import SearchClient
     from azure.search.documents.models import VectorizedQuery
     from companies.sdk.sola_rag import (
-        AZURE_SEARCH_ENDPOINT,
-        AZURE_SEARCH_KEY,
+        EMBEDDING_BATCH_SIZE,
+        RAG_HYBRID_SEARCH,
+        RAG_TWO_PHASE_RETRIEVAL,
+        EXPORT_MATCH_MAX_WORKERS,
+        SEARCH_MAX_WORKERS,
         SOLA_RAG_INDEX_NAME,
         create_embedding_with_dimensions,
+        create_embeddings_with_dimensions,
+        get_search_client,
     )
     from companies.models import DataHubDocument
     from django.conf import settings
@@ -2685,12 +2962,19 @@ def export_sola_to_excel(
         if progress_callback:
             progress_callback("processing", 15, "Preparing Base Carbone vector search...")
         
-        logger.info("Preparing Azure AI Search client for Base Carbone factors (sola-rag-index)...")
-        search_client = SearchClient(
-            endpoint=AZURE_SEARCH_ENDPOINT,
-            index_name=SOLA_RAG_INDEX_NAME,
-            credential=AzureKeyCredential(AZURE_SEARCH_KEY),
-        )
+        logger.info("Preparing search client for Base Carbone factors (sola-rag-index)...")
+        search_client = get_search_client(SOLA_RAG_INDEX_NAME)
+        
+        # Base Carbone factors preloaded from the snapshot: search hits then only return keys and scores.
+        # Without it, candidate searches (30 hits) return keys + reranking text in two-phase mode and the
+        # final top-k are fetched from the index; lookups that keep every hit return full documents.
+        factor_store = get_factor_store()
+        if factor_store is not None:
+            candidate_fields = lookup_fields = FACTOR_KEY_FIELDS
+        else:
+            lookup_fields = FACTOR_DOCUMENT_FIELDS
+            candidate_fields = FACTOR_RERANK_FIELDS if RAG_TWO_PHASE_RETRIEVAL else FACTOR_DOCUMENT_FIELDS
+            logger.info(f"No Base Carbone snapshot available, factors are read from search (two-phase: {RAG_TWO_PHASE_RETRIEVAL})")
         
         # Step 3: Load strict mappings
         if progress_callback:
@@ -2738,211 +3022,161 @@ def export_sola_to_excel(
         llm_client = None
         logger.info("LLM decision disabled - using Sola RAG embedding only")
         
-        # Helper: strict match via Azure Search (same logic as map_invoices_to_base_carbone.py)
+        # Helper: strict match = lookup in the strict mappings resolved once before matching (strict_matches)
         def _find_strict_match(invoice: InvoiceRecord) -> Optional[MatchCandidate]:
-            if not invoice.invoice_type or not strict_mappings:
+            if not invoice.invoice_type:
                 return None
             
             # Normalize invoice type for matching (same as map_invoices_to_base_carbone.py)
-            invoice_type_normalized = invoice.invoice_type.lower().strip()
-            
-            # Check for exact match
-            if invoice_type_normalized not in strict_mappings:
-                return None
-            
-            mapping = strict_mappings[invoice_type_normalized]
-            factor_name_target = mapping.get("factor_name")
-            if not factor_name_target:
-                return None
-            
+            return strict_matches.get(strict_mapping_key(invoice.invoice_type))
+        
+        # Helper: resolve a strict mapping's target factor via Azure Search (same logic as map_invoices_to_base_carbone.py)
+        def _resolve_strict_factor(factor_name_target: str) -> Optional[MatchCandidate]:
             # Search for the factor in Azure Search by name (same as map_invoices_to_base_carbone.py)
-            results = search_client.search(
+            results = list(search_client.search(
                 search_text=factor_name_target,
-                select=[
-                    "row_index",
-                    "identifier",
-                    "status",
-                    "name_fr",
-                    "name_en",
-                    "category",
-                    "tags_fr",
-                    "tags_en",
-                    "unit_fr",
-                    "unit_en",
-                    "contributor",
-                    "other_contributors",
-                    "programme",
-                    "source",
-                    "url",
-                    "location",
-                    "created_at",
-                    "modified_at",
-                    "validity",
-                    "comments_fr",
-                    "comments_en",
-                    "total",
-                    "co2f",
-                    "ch4f",
-                    "ch4b",
-                    "n2o",
-                    "extra_gases",
-                ],
+                select=candidate_fields,
                 top=10,  # Get more results to find exact match
-            )
+            ))
             
             # Try exact match first (same as map_invoices_to_base_carbone.py)
-            for r in results:
-                try:
-                    name_fr = r.get("name_fr")
-                    name_en = r.get("name_en")
-                    
-                    # Exact match
-                    if name_fr == factor_name_target:
-                        return _build_match_candidate(r, similarity=1.0)
-                    
-                    # Partial match (same as map_invoices_to_base_carbone.py)
-                    if name_fr and factor_name_target in name_fr:
-                        return _build_match_candidate(r, similarity=0.99)
-                    if name_en and factor_name_target in name_en:
-                        return _build_match_candidate(r, similarity=0.99)
-                except Exception as parse_err:
-                    logger.debug(f"Skip strict match parse error: {parse_err}")
+            fields_list, hit_factors = _hit_fields(results)
+            for idx, (r, fields) in enumerate(zip(results, fields_list)):
+                name_fr = fields.get("name_fr")
+                name_en = fields.get("name_en")
+                
+                # Exact match
+                if name_fr == factor_name_target:
+                    similarity = 1.0
+                # Partial match (same as map_invoices_to_base_carbone.py)
+                elif (name_fr and factor_name_target in name_fr) or (name_en and factor_name_target in name_en):
+                    similarity = 0.99
+                else:
                     continue
+                factor = hit_factors[idx] if hit_factors is not None else _hydrate_factors([r])[0]
+                if factor is not None:
+                    return MatchCandidate(factor=factor, similarity=similarity)
             
             return None
         
-        # Helper: build MatchCandidate from Azure Search result
-        def _build_match_candidate(r: dict, similarity: float) -> MatchCandidate:
-            score = similarity
-            extra_raw = r.get("extra_gases") or "[]"
-            try:
-                parsed = json.loads(extra_raw) if isinstance(extra_raw, str) else extra_raw
-                extra_list = []
-                if isinstance(parsed, list):
-                    for item in parsed:
-                        if isinstance(item, dict):
-                            extra_list.append((item.get("code"), item.get("value")))
-                        elif isinstance(item, (list, tuple)) and len(item) >= 2:
-                            extra_list.append((item[0], item[1]))
-                else:
-                    extra_list = []
-            except Exception:
-                extra_list = []
-            
-            factor = FactorRecord(
-                row_index=int(r.get("row_index") or 0),
-                identifier=r.get("identifier"),
-                status=r.get("status"),
-                name_fr=r.get("name_fr"),
-                name_en=r.get("name_en"),
-                category=r.get("category"),
-                tags_fr=r.get("tags_fr"),
-                unit_fr=r.get("unit_fr"),
-                unit_en=r.get("unit_en"),
-                contributor=r.get("contributor"),
-                other_contributors=r.get("other_contributors"),
-                programme=r.get("programme"),
-                source=r.get("source"),
-                url=r.get("url"),
-                location=r.get("location"),
-                created_at=r.get("created_at"),
-                modified_at=r.get("modified_at"),
-                validity=r.get("validity"),
-                comments_fr=r.get("comments_fr"),
-                comments_en=r.get("comments_en"),
-                total=r.get("total"),
-                co2f=r.get("co2f"),
-                ch4f=r.get("ch4f"),
-                ch4b=r.get("ch4b"),
-                n2o=r.get("n2o"),
-                extra_gases=extra_list,
-                raw=dict(r) if hasattr(r, "keys") else {},
-            )
-            return MatchCandidate(factor=factor, similarity=float(score))
-
+        # Helper: factor fields of each hit (name matching, reranking text), plus the hits' FactorRecords
+        # when they had to be hydrated for that: hits resolved through the factor store only carry keys,
+        # so their fields come from the stored factors, and callers reuse those records instead of
+        # hydrating (and fetching store misses) a second time. Other hits keep their own fields (None).
+        def _hit_fields(hits: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[List[Optional[FactorRecord]]]]:
+            if factor_store is None:
+                return hits, None
+            factors = _hydrate_factors(hits)
+            return [factor.raw if factor is not None else {} for factor in factors], factors
+        
+        # Helper: phase two - FactorRecords for search hits. Full documents are parsed as they are;
+        # key-only hits come from the factor store, and whatever is left (no store, or indexed after the
+        # snapshot) is fetched from the index in one request. None for hits that no longer exist.
+        def _hydrate_factors(hits: List[Dict[str, Any]]) -> List[Optional[FactorRecord]]:
+            factors: List[Optional[FactorRecord]] = []
+            for r in hits:
+                try:
+                    if "extra_gases" in r:
+                        factors.append(factor_from_document(r))
+                    else:
+                        factors.append(factor_store.resolve_hit(r) if factor_store is not None else None)
+                except Exception as parse_err:
+                    logger.debug(f"Skip factor parse error: {parse_err}")
+                    factors.append(None)
+            keys = [
+                r.get("id") or f"base_carbone_{r.get('row_index')}"
+                for r, factor in zip(hits, factors) if factor is None and "extra_gases" not in r
+            ]
+            if keys:
+                key_list = ",".join(keys).replace("'", "''")
+                documents = search_client.search(
+                    search_text="*",
+                    filter=f"search.in(id, '{key_list}', ',')",
+                    select=["id"] + FACTOR_DOCUMENT_FIELDS,
+                    top=len(keys),
+                )
+                fetched = {doc.get("id"): factor_from_document(doc) for doc in documents}
+                factors = [
+                    fetched.get(r.get("id") or f"base_carbone_{r.get('row_index')}") if factor is None else factor
+                    for r, factor in zip(hits, factors)
+                ]
+            return factors
+        
         # Helper: keyword search fallback on Base Carbone factors
         def _keyword_search(prompt: str, top_k: int = 5) -> List[MatchCandidate]:
-            results = search_client.search(
+            results = list(search_client.search(
                 search_text=prompt,
-                select=[
-                    "row_index", "identifier", "status", "name_fr", "name_en",
-                    "category", "tags_fr", "tags_en", "unit_fr", "unit_en",
-                    "contributor", "other_contributors", "programme", "source",
-                    "url", "location", "created_at", "modified_at", "validity",
-                    "comments_fr", "comments_en", "total", "co2f", "ch4f", "ch4b", "n2o", "extra_gases"
-                ],
+                select=lookup_fields,
                 top=top_k,
-            )
-            matches: List[MatchCandidate] = []
-            for r in results:
-                try:
-                    score = r.get("@search.score") or 0.0
-                    extra_raw = r.get("extra_gases") or "[]"
-                    try:
-                        parsed = json.loads(extra_raw) if isinstance(extra_raw, str) else extra_raw
-                        extra_list = []
-                        if isinstance(parsed, list):
-                            for item in parsed:
-                                if isinstance(item, dict):
-                                    extra_list.append((item.get("code"), item.get("value")))
-                                elif isinstance(item, (list, tuple)) and len(item) >= 2:
-                                    extra_list.append((item[0], item[1]))
-                        else:
-                            extra_list = []
-                    except Exception:
-                        extra_list = []
-                    
-                    factor = FactorRecord(
-                        row_index=int(r.get("row_index") or 0),
-                        identifier=r.get("identifier"),
-                        status=r.get("status"),
-                        name_fr=r.get("name_fr"),
-                        name_en=r.get("name_en"),
-                        category=r.get("category"),
-                        tags_fr=r.get("tags_fr"),
-                        unit_fr=r.get("unit_fr"),
-                        unit_en=r.get("unit_en"),
-                        contributor=r.get("contributor"),
-                        other_contributors=r.get("other_contributors"),
-                        programme=r.get("programme"),
-                        source=r.get("source"),
-                        url=r.get("url"),
-                        location=r.get("location"),
-                        created_at=r.get("created_at"),
-                        modified_at=r.get("modified_at"),
-                        validity=r.get("validity"),
-                        comments_fr=r.get("comments_fr"),
-                        comments_en=r.get("comments_en"),
-                        total=r.get("total"),
-                        co2f=r.get("co2f"),
-                        ch4f=r.get("ch4f"),
-                        ch4b=r.get("ch4b"),
-                        n2o=r.get("n2o"),
-                        extra_gases=extra_list,
-                        raw=dict(r) if hasattr(r, "keys") else {},
+            ))
+            return [
+                MatchCandidate(factor=factor, similarity=float(r.get("@search.score") or 0.0))
+                for r, factor in zip(results, _hydrate_factors(results))
+                if factor is not None
+            ]
+        
+        # Helper: cosine scores (Azure's 1 / (1 + cosine distance)) of hybrid hits. Hybrid hits are scored by RRF,
+        # a rank artefact: their similarity is the vector subquery's score, read from the debug subscores.
+        # Keyword-only hits (outside the vector top k) have none: their vectors are fetched in one request
+        def _hybrid_vector_scores(query_vector: List[float], hits: List[Dict[str, Any]]) -> List[float]:
+            scores: List[Optional[float]] = []
+            for r in hits:
+                subscores = getattr(getattr(r.get("@search.document_debug_info"), "vectors", None), "subscores", None)
+                score = None
+                for field_scores in getattr(subscores, "vectors", None) or []:
+                    field_result = field_scores.get("content_vector")
+                    if field_result is not None and field_result.search_score is not None:
+                        score = float(field_result.search_score)
+                scores.append(score)
+            missing = [
+                r.get("id") or f"base_carbone_{r.get('row_index')}"
+                for r, score in zip(hits, scores) if score is None
+            ]
+            if missing:
+                key_list = ",".join(missing).replace("'", "''")
+                vectors = {
+                    doc.get("id"): doc.get("content_vector")
+                    for doc in search_client.search(
+                        search_text="*",
+                        filter=f"search.in(id, '{key_list}', ',')",
+                        select=["id", "content_vector"],
+                        top=len(missing),
                     )
-                    matches.append(MatchCandidate(factor=factor, similarity=float(score)))
-                except Exception as parse_err:
-                    logger.debug(f"Skip factor parse error: {parse_err}")
-                    continue
-            return matches
+                }
+                query = np.asarray(query_vector, dtype=np.float32)
+                query_norm = float(np.linalg.norm(query))
+                for i, (r, score) in enumerate(zip(hits, scores)):
+                    if score is not None:
+                        continue
+                    hit_vector = vectors.get(r.get("id") or f"base_carbone_{r.get('row_index')}")
+                    if hit_vector is None or not len(hit_vector):
+                        scores[i] = 0.0
+                        continue
+                    hit = np.asarray(hit_vector, dtype=np.float32)
+                    norms = query_norm * float(np.linalg.norm(hit))
+                    cosine = float(query @ hit) / norms if norms else 0.0
+                    scores[i] = 1.0 / (2.0 - cosine)
+            return scores
         
-        # Helper: run vector search on Base Carbone factors stored in sola-rag-index with keyword fallback
+        # Helper: run vector search (hybrid keyword + vector when RAG_HYBRID_SEARCH) on Base Carbone factors
+        # stored in sola-rag-index with keyword fallback
         # Follows RAG WITH CROSS-ATTENTION - 5 Step Flow
-        def _search_factors(prompt: str, top_k: int = 5) -> List[MatchCandidate]:
+        def _search_factors(prompt: str, top_k: int = 5, embedding: Optional[List[float]] = None) -> List[MatchCandidate]:
             # ============================================================
             # STEP 1: FAST RETRIEVAL (NO CROSS-ATTENTION)
             # ============================================================
+            retrieval_method = "Hybrid keyword + vector (reciprocal rank fusion)" if RAG_HYBRID_SEARCH else "Cosine similarity (vector search)"
             logger.info(f"[SOLA EXPORT] =========================================")
             logger.info(f"[SOLA EXPORT] STEP 1: FAST RETRIEVAL (NO CROSS-ATTENTION)")
             logger.info(f"[SOLA EXPORT] Goal: Retrieve many candidate Base Carbone factors quickly")
-            logger.info(f"[SOLA EXPORT] Method: Cosine similarity (vector search)")
+            logger.info(f"[SOLA EXPORT] Method: {retrieval_method}")
             logger.info(f"[SOLA EXPORT] Target: Top 30 candidates (range: 20-50)")
             logger.info(f"[SOLA EXPORT] Query: {prompt[:100]}...")
             
             try:
-                logger.info(f"[SOLA EXPORT] Step 1: Creating query embedding...")
-                embedding = create_embedding_with_dimensions(prompt)
+                if embedding is None:
+                    logger.info(f"[SOLA EXPORT] Step 1: Creating query embedding...")
+                    embedding = create_embedding_with_dimensions(prompt)
                 
                 vector_query = VectorizedQuery(
                     vector=embedding,
@@ -2950,23 +3184,42 @@ def export_sola_to_excel(
                     fields="content_vector",
                 )
                 
-                logger.info(f"[SOLA EXPORT] Step 1: Performing vector search...")
-                results = search_client.search(
-                    search_text=None,
-                    vector_queries=[vector_query],
-                    select=[
-                        "row_index", "identifier", "status", "name_fr", "name_en",
-                        "category", "tags_fr", "tags_en", "unit_fr", "unit_en",
-                        "contributor", "other_contributors", "programme", "source",
-                        "url", "location", "created_at", "modified_at", "validity",
-                        "comments_fr", "comments_en", "total", "co2f", "ch4f", "ch4b", "n2o", "extra_gases"
-                    ],
-                    top=30,  # Retrieve 30 for reranking
-                )
+                # Hybrid: keyword and vector queries in one request; the search service fuses both
+                # rankings with RRF, so exact factor names are found without a second keyword round trip
+                logger.info(f"[SOLA EXPORT] Step 1: Performing {'hybrid' if RAG_HYBRID_SEARCH else 'vector'} search...")
+                if RAG_HYBRID_SEARCH:
+                    results = search_client.search(
+                        search_text=prompt,
+                        vector_queries=[vector_query],
+                        select=candidate_fields,
+                        top=30,  # Retrieve 30 for reranking
+                        debug="vector",  # per-subquery scores
+                    )
+                else:
+                    results = search_client.search(
+                        search_text=None,
+                        vector_queries=[vector_query],
+                        select=candidate_fields,
+                        top=30,  # Retrieve 30 for reranking
+                    )
                 
                 search_results_list = list(results)
+                if RAG_HYBRID_SEARCH:
+                    # RRF only orders the hits; the similarity (candidate logs, "Selected similarity",
+                    # enhanced_factor_search blend) is the hit's cosine score, as in vector search
+                    search_results_list = [
+                        {
+                            **{key: value for key, value in r.items() if key != "@search.document_debug_info"},
+                            "@search.score": score,
+                        }
+                        for r, score in zip(search_results_list, _hybrid_vector_scores(embedding, search_results_list))
+                    ]
                 logger.info(f"[SOLA EXPORT] Step 1: ✅ Fast Retrieval completed - Retrieved {len(search_results_list)} candidate factors")
-                logger.info(f"[SOLA EXPORT] Step 1: Method: Cosine similarity (no cross-attention)")
+                logger.info(f"[SOLA EXPORT] Step 1: Method: {retrieval_method} (no cross-attention)")
+                if RAG_HYBRID_SEARCH and not search_results_list:
+                    # The keyword query already ran inside the hybrid request: nothing to fall back to
+                    logger.info(f"[SOLA EXPORT] Step 1: No keyword or vector match")
+                    return []
                 
                 # ============================================================
                 # STEP 2: METADATA / ENTITY FILTERING
@@ -2979,9 +3232,10 @@ def export_sola_to_excel(
                 # Prepare chunks for reranking
                 chunks_for_reranking = []
                 original_results_map = {}  # Map to preserve original result objects
-                for idx, r in enumerate(search_results_list):
+                candidate_fields_list, candidate_factors = _hit_fields(search_results_list)
+                for idx, (r, fields) in enumerate(zip(search_results_list, candidate_fields_list)):
                     # Create a text representation of the factor for reranking
-                    factor_text = f"{r.get('name_fr', '')} {r.get('name_en', '')} {r.get('category', '')} {r.get('tags_fr', '')} {r.get('tags_en', '')}"
+                    factor_text = f"{fields.get('name_fr', '')} {fields.get('name_en', '')} {fields.get('category', '')} {fields.get('tags_fr', '')} {fields.get('tags_en', '')}"
                     chunk_data = {
                         "content": factor_text.strip(),
                         "metadata": dict(r) if hasattr(r, "keys") else {},
@@ -3025,18 +3279,22 @@ def export_sola_to_excel(
                         
                         # Use reranked results - map back to original search results
                         ranked_results = []
+                        ranked_indices = []
                         for chunk in top_chunks:
                             metadata = chunk.get("metadata", {})
                             if metadata:
                                 ranked_results.append(metadata)
+                                ranked_indices.append(chunk.get("original_index"))
                     else:
                         logger.info(f"[SOLA EXPORT] Step 3: ✅ Reranking completed - no chunks returned")
                         ranked_results = search_results_list[:top_k]
+                        ranked_indices = list(range(len(ranked_results)))
                 except Exception as rerank_exc:
                     logger.warning(f"[SOLA EXPORT] Step 3: ⚠️ Reranking failed: {rerank_exc}, using original vector search results")
                     logger.exception(rerank_exc)
                     # Fallback: use original vector search results
                     ranked_results = search_results_list[:top_k]
+                    ranked_indices = list(range(len(ranked_results)))
                 
                 # ============================================================
                 # STEP 4: PROMPT CONSTRUCTION
@@ -3046,58 +3304,17 @@ def export_sola_to_excel(
                 logger.info(f"[SOLA EXPORT] Goal: Prepare factors for matching")
                 logger.info(f"[SOLA EXPORT] Method: Convert reranked results to MatchCandidate objects")
                 
-                matches: List[MatchCandidate] = []
-                for r in ranked_results:
-                    try:
-                        score = r.get("@search.score") or 0.0
-                        extra_raw = r.get("extra_gases") or "[]"
-                        try:
-                            parsed = json.loads(extra_raw) if isinstance(extra_raw, str) else extra_raw
-                            extra_list = []
-                            if isinstance(parsed, list):
-                                for item in parsed:
-                                    if isinstance(item, dict):
-                                        extra_list.append((item.get("code"), item.get("value")))
-                                    elif isinstance(item, (list, tuple)) and len(item) >= 2:
-                                        extra_list.append((item[0], item[1]))
-                            else:
-                                extra_list = []
-                        except Exception:
-                            extra_list = []
-                        
-                        factor = FactorRecord(
-                            row_index=int(r.get("row_index") or 0),
-                            identifier=r.get("identifier"),
-                            status=r.get("status"),
-                            name_fr=r.get("name_fr"),
-                            name_en=r.get("name_en"),
-                            category=r.get("category"),
-                            tags_fr=r.get("tags_fr"),
-                            unit_fr=r.get("unit_fr"),
-                            unit_en=r.get("unit_en"),
-                            contributor=r.get("contributor"),
-                            other_contributors=r.get("other_contributors"),
-                            programme=r.get("programme"),
-                            source=r.get("source"),
-                            url=r.get("url"),
-                            location=r.get("location"),
-                            created_at=r.get("created_at"),
-                            modified_at=r.get("modified_at"),
-                            validity=r.get("validity"),
-                            comments_fr=r.get("comments_fr"),
-                            comments_en=r.get("comments_en"),
-                            total=r.get("total"),
-                            co2f=r.get("co2f"),
-                            ch4f=r.get("ch4f"),
-                            ch4b=r.get("ch4b"),
-                            n2o=r.get("n2o"),
-                            extra_gases=extra_list,
-                            raw=dict(r) if hasattr(r, "keys") else {},
-                        )
-                        matches.append(MatchCandidate(factor=factor, similarity=float(score)))
-                    except Exception as parse_err:
-                        logger.debug(f"Skip factor parse error: {parse_err}")
-                        continue
+                # Phase two: full factor records for the final top-k only (reused when Step 2 already
+                # hydrated the candidates from the factor store)
+                if candidate_factors is not None and all(idx is not None for idx in ranked_indices):
+                    ranked_factors = [candidate_factors[idx] for idx in ranked_indices]
+                else:
+                    ranked_factors = _hydrate_factors(ranked_results)
+                matches: List[MatchCandidate] = [
+                    MatchCandidate(factor=factor, similarity=float(r.get("@search.score") or 0.0))
+                    for r, factor in zip(ranked_results, ranked_factors)
+                    if factor is not None
+                ]
                 
                 # ============================================================
                 # STEP 5: ANSWER GENERATION (CROSS-ATTENTION LEVEL 2)
@@ -3111,7 +3328,7 @@ def export_sola_to_excel(
                 logger.info(f"[SOLA EXPORT] =========================================")
                 logger.info(f"[SOLA EXPORT] ✅ RAG FLOW COMPLETED - All 5 steps executed")
                 logger.info(f"[SOLA EXPORT] Summary:")
-                logger.info(f"[SOLA EXPORT]   Step 1: Fast Retrieval (NO CROSS-ATTENTION) - Cosine similarity")
+                logger.info(f"[SOLA EXPORT]   Step 1: Fast Retrieval (NO CROSS-ATTENTION) - {retrieval_method}")
                 logger.info(f"[SOLA EXPORT]   Step 2: Metadata / Entity Filtering")
                 logger.info(f"[SOLA EXPORT]   Step 3: Re-ranking (CROSS-ATTENTION LEVEL 1) - Cross-Encoder")
                 logger.info(f"[SOLA EXPORT]   Step 4: Prompt Construction (Factor Conversion)")
@@ -3129,76 +3346,201 @@ def export_sola_to_excel(
             logger.warning(f"[SOLA EXPORT] Falling back to keyword search")
             return _keyword_search(prompt, top_k=top_k)
         
+        # Helper: detected category and search prompt for an invoice
+        def _build_factor_query(invoice: InvoiceRecord) -> Tuple[Optional[str], str]:
+            detected_category = detect_invoice_category(invoice)
+            prompt = build_search_query(invoice)
+            
+            # Add category-specific keywords to search query if detected
+            if detected_category and detected_category in CATEGORY_MAPPINGS:
+                category_keywords = " ".join(
+                    CATEGORY_MAPPINGS[detected_category]["keywords"][:3]
+                )
+                prompt = f"{prompt}; catégorie détectée: {category_keywords}"
+            return detected_category, prompt
+        
+        # Helper: batch retrieval - embed all prompts in a few batched requests, then run the
+        # searches concurrently. Returns candidates keyed like `prompts`; keys whose retrieval
+        # raised are left out so the caller can retry them one by one.
+        # on_progress(done, total) is called as the embedding batches and searches complete
+        def _search_factors_batch(
+            prompts: Dict[Any, str],
+            top_k: int = 5,
+            on_progress: Optional[Callable[[int, int], None]] = None,
+        ) -> Dict[Any, List[MatchCandidate]]:
+            unique_prompts = list(dict.fromkeys(prompts.values()))
+            if not unique_prompts:
+                return {}
+            
+            # Each prompt counts once for its embedding and once for its search
+            total_steps = 2 * len(unique_prompts)
+            embeddings: Dict[str, List[float]] = {}
+            try:
+                for start in range(0, len(unique_prompts), EMBEDDING_BATCH_SIZE):
+                    batch = unique_prompts[start:start + EMBEDDING_BATCH_SIZE]
+                    embeddings.update(zip(batch, create_embeddings_with_dimensions(batch)))
+                    if on_progress:
+                        on_progress(start + len(batch), total_steps)
+            except Exception as exc:
+                logger.warning(f"[SOLA EXPORT] Batch embedding failed ({exc}), embedding per query")
+            
+            def _retrieve(prompt: str) -> Optional[List[MatchCandidate]]:
+                try:
+                    return _search_factors(prompt, top_k=top_k, embedding=embeddings.get(prompt))
+                except Exception as exc:
+                    logger.warning(f"[SOLA EXPORT] Batch retrieval failed for query ({exc}), retrying in matching loop")
+                    return None
+            
+            retrieved: Dict[str, Optional[List[MatchCandidate]]] = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(SEARCH_MAX_WORKERS, len(unique_prompts)))) as pool:
+                for prompt, candidates in zip(unique_prompts, pool.map(_retrieve, unique_prompts)):
+                    retrieved[prompt] = candidates
+                    if on_progress:
+                        on_progress(len(unique_prompts) + len(retrieved), total_steps)
+            logger.info(
+                f"[SOLA EXPORT] Batch retrieval: {len(prompts)} queries ({len(unique_prompts)} unique), "
+                f"{len(embeddings)} embedded in {-(-len(unique_prompts) // EMBEDDING_BATCH_SIZE)} requests"
+            )
+            return {key: retrieved[prompt] for key, prompt in prompts.items() if retrieved[prompt] is not None}
+        
         # Step 5: Process each invoice and match to Base Carbone factors
         # Logic matches map_invoices_to_base_carbone.py exactly
         processed = 0
         total_rows = len(invoices)
         logger.info(f"Processing {total_rows} invoices and matching to Base Carbone factors...")
         
-        for invoice in invoices:
-            try:
-                
-                # Check for strict match first
-                strict_match = _find_strict_match(invoice)
-                if strict_match:
-                    logger.info(f"✅ STRICT MATCH: '{invoice.invoice_type}' -> '{strict_match.factor.name_fr}'")
-                    strict_match_count += 1
-                    candidates = [strict_match]
-                    detected_category = None
+        # Resolve strict mappings once: one search per distinct target factor name (run concurrently),
+        # then each strict match is a dict lookup; unresolved mappings are reported here, before matching
+        strict_matches: Dict[str, MatchCandidate] = {}
+        unresolved_strict_mappings: List[str] = []
+        if strict_mappings:
+            strict_targets = {
+                invoice_type: (mapping or {}).get("factor_name") for invoice_type, mapping in strict_mappings.items()
+            }
+            target_names = sorted({name for name in strict_targets.values() if name})
+            
+            def _resolve(factor_name_target: str) -> Optional[MatchCandidate]:
+                try:
+                    return _resolve_strict_factor(factor_name_target)
+                except Exception as exc:
+                    logger.warning(f"Failed to resolve strict mapping factor '{factor_name_target}': {exc}")
+                    return None
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(SEARCH_MAX_WORKERS, len(target_names)))) as pool:
+                resolved_targets = dict(zip(target_names, pool.map(_resolve, target_names)))
+            for invoice_type, factor_name_target in strict_targets.items():
+                candidate = resolved_targets.get(factor_name_target) if factor_name_target else None
+                if candidate:
+                    strict_matches[invoice_type] = candidate
                 else:
-                    # Detect invoice category for enhanced matching
-                    detected_category = detect_invoice_category(invoice)
-                    if detected_category:
-                        logger.info(
-                            f"📋 Detected category: {detected_category} for {invoice.invoice_type}"
-                        )
-                
-                # Only perform semantic search if no strict match was found
-                if not strict_match:
-                    prompt = build_search_query(invoice)
-                    
-                    # Add category-specific keywords to search query if detected
-                    if detected_category and detected_category in CATEGORY_MAPPINGS:
-                        category_keywords = " ".join(
-                            CATEGORY_MAPPINGS[detected_category]["keywords"][:3]
-                        )
-                        prompt = f"{prompt}; catégorie détectée: {category_keywords}"
-                    
-                    # Vector search via Azure Search
-                    try:
+                    unresolved_strict_mappings.append(invoice_type)
+            logger.info(f"Resolved {len(strict_matches)}/{len(strict_mappings)} strict mappings ({len(target_names)} target factors)")
+            if unresolved_strict_mappings:
+                logger.warning(
+                    f"⚠️ {len(unresolved_strict_mappings)} strict mappings did not resolve to a factor "
+                    f"(invoices fall back to search): {', '.join(sorted(unresolved_strict_mappings))}"
+                )
+        
+        # Retrieve candidates for every invoice without a resolved strict mapping up front, in one batch
+        # (progress 25-50%, matching then reports 50-90%)
+        if progress_callback:
+            progress_callback("processing", 25, "Retrieving candidate factors...")
+        # Invoices with the same matching key (recurring subscriptions, monthly passes...) are matched
+        # once; only the first of each group is retrieved here
+        matching_keys = [invoice_matching_key(invoice) for invoice in invoices]
+        key_representatives: Dict[Tuple[Any, ...], int] = {}
+        factor_queries: Dict[int, Tuple[Optional[str], str]] = {}
+        for invoice_index, invoice in enumerate(invoices):
+            if matching_keys[invoice_index] in key_representatives:
+                continue
+            key_representatives[matching_keys[invoice_index]] = invoice_index
+            try:
+                if strict_mapping_key(invoice.invoice_type) not in strict_matches:
+                    factor_queries[invoice_index] = _build_factor_query(invoice)
+            except Exception as e:
+                logger.warning(f"Failed to build search query for invoice {invoice.invoice_type or 'unknown'}: {e}")
+        last_retrieval_progress = 25
+        
+        def _report_retrieval(done: int, total: int) -> None:
+            nonlocal last_retrieval_progress
+            progress = int(25 + (done / total) * 25)  # 25-50%
+            if progress > last_retrieval_progress or done == total:
+                last_retrieval_progress = progress
+                if progress_callback:
+                    progress_callback("processing", progress, f"Retrieving candidate factors... {done * 100 // total}%")
+        
+        prefetched_candidates = _search_factors_batch(
+            {invoice_index: prompt for invoice_index, (_, prompt) in factor_queries.items()},
+            top_k=5,
+            on_progress=_report_retrieval,
+        )
+        
+        # Helper: select a factor for one invoice (strict match -> candidates -> LLM decision -> selection).
+        # Runs on worker threads; returns (selected, candidates, llm_decision, detected_category, is_strict_match)
+        # or None when there are no candidates. Shared LLM / warning state is only touched under match_state_lock.
+        match_state_lock = threading.Lock()
+        
+        def _select_factor(invoice_index: int, invoice: InvoiceRecord) -> Optional[Tuple[MatchCandidate, List[MatchCandidate], Optional[LLMDecision], Optional[str], bool]]:
+            nonlocal embedding_failure_logged, llm_disabled, llm_disable_notified
+            
+            # Check for strict match first
+            strict_match = None if invoice_index in factor_queries else _find_strict_match(invoice)
+            if strict_match:
+                logger.info(f"✅ STRICT MATCH: '{invoice.invoice_type}' -> '{strict_match.factor.name_fr}'")
+                candidates = [strict_match]
+                detected_category = None
+            else:
+                # Detect invoice category for enhanced matching
+                detected_category, prompt = factor_queries.get(invoice_index) or _build_factor_query(invoice)
+                if detected_category:
+                    logger.info(
+                        f"📋 Detected category: {detected_category} for {invoice.invoice_type}"
+                    )
+            
+            # Only perform semantic search if no strict match was found
+            if not strict_match:
+                # Vector search via Azure Search (already retrieved in the batch for most invoices)
+                try:
+                    if invoice_index in prefetched_candidates:
+                        candidates = prefetched_candidates[invoice_index]
+                    else:
                         candidates = _search_factors(prompt, top_k=5)
-                    except Exception as exc:
+                except Exception as exc:
+                    with match_state_lock:
                         if not embedding_failure_logged:
                             logger.warning(
                                 f"⚠️ Embedding request failed ({exc}). Falling back to keyword search."
                             )
                             embedding_failure_logged = True
-                        candidates = _keyword_search(prompt, top_k=5)
-                    
-                    # Fallback to keyword search if no candidates
-                    if not candidates:
-                        candidates = _keyword_search(prompt, top_k=5)
-                    
-                    # Raise error if still no candidates
-                    if not candidates:
-                        logger.error(
-                            f"⚠️ No factor candidates for invoice: {invoice.invoice_type} - skipping"
-                        )
-                        continue
-                    
-                    # Apply enhanced factor search with category-specific matching
-                    if detected_category:
-                        candidates = enhanced_factor_search(invoice, candidates, detected_category)
-                        logger.info(
-                            f"✨ Enhanced matching applied. Top candidate: {candidates[0].factor.name_fr} (score: {candidates[0].similarity:.3f})"
-                        )
+                    candidates = _keyword_search(prompt, top_k=5)
+                
+                # Fallback to keyword search if no candidates (hybrid search already ran the keyword query)
+                if not candidates and not RAG_HYBRID_SEARCH:
+                    candidates = _keyword_search(prompt, top_k=5)
                 
-                # LLM decision
-                llm_decision = None
-                if not llm_disabled and llm_client:
-                    llm_decision, failure_reason, disable_now = call_llm_decision(
-                        llm_client, "gpt-4", invoice, candidates
+                # Raise error if still no candidates
+                if not candidates:
+                    logger.error(
+                        f"⚠️ No factor candidates for invoice: {invoice.invoice_type} - skipping"
                     )
+                    return None
+                
+                # Apply enhanced factor search with category-specific matching
+                if detected_category:
+                    candidates = enhanced_factor_search(invoice, candidates, detected_category)
+                    logger.info(
+                        f"✨ Enhanced matching applied. Top candidate: {candidates[0].factor.name_fr} (score: {candidates[0].similarity:.3f})"
+                    )
+            
+            # LLM decision (the request itself runs outside the lock)
+            llm_decision = None
+            with match_state_lock:
+                use_llm = not llm_disabled and llm_client
+            if use_llm:
+                llm_decision, failure_reason, disable_now = call_llm_decision(
+                    llm_client, "gpt-4", invoice, candidates
+                )
+                with match_state_lock:
                     if failure_reason and failure_reason not in seen_failure_messages:
                         logger.warning(f"⚠️ {failure_reason}")
                         seen_failure_messages.add(failure_reason)
@@ -3221,26 +3563,62 @@ def export_sola_to_excel(
                         llm_decision = None
                     if llm_disabled:
                         llm_decision = None
-                
-                # Choose best factor
-                selected = choose_factor(
-                    candidates, llm_decision.selected_row_index if llm_decision else None
-                )
+            
+            # Choose best factor
+            selected = choose_factor(
+                candidates, llm_decision.selected_row_index if llm_decision else None
+            )
+            return selected, candidates, llm_decision, detected_category, strict_match is not None
+        
+        # Memoized factor selection per matching key (see MatchMemo)
+        match_memo = MatchMemo(
+            lambda invoice_index: _select_factor(invoice_index, invoices[invoice_index]),
+            matching_keys,
+            key_representatives,
+        )
+        
+        # Helper: match one invoice and build its mapping (activity, conversion, emissions, rate are per invoice).
+        # Returns (mapping, is_strict_match) or None when the invoice is skipped.
+        def _match_invoice(invoice_index: int, invoice: InvoiceRecord) -> Optional[Tuple[Any, bool]]:
+            try:
+                selection = match_memo.get(invoice_index)
+                if selection is None:
+                    return None
+                selected, candidates, llm_decision, detected_category, is_strict_match = selection
                 
                 # Build mapping result
                 mapping = build_mapping(
                     invoice, selected, candidates, rate_fetcher, llm_decision, detected_category
                 )
+                return mapping, is_strict_match
                 
-                # Write to Excel
-                writer.append_main(mapping)
-                writer.append_audit(mapping)
+            except Exception as e:
+                logger.warning(f"Failed to process invoice {invoice.invoice_type or 'unknown'}: {e}", exc_info=True)
+                return None
+        
+        match_workers = max(1, int(max_workers or EXPORT_MATCH_MAX_WORKERS))
+        logger.info(f"Matching {total_rows} invoices with {match_workers} workers...")
+        with ThreadPoolExecutor(max_workers=match_workers) as pool:
+            # map() yields results in invoice order, so the (single-threaded) writer keeps the original row order
+            for invoice, match in zip(invoices, pool.map(_match_invoice, range(total_rows), invoices)):
+                if match is None:
+                    continue
+                mapping, is_strict_match = match
+                try:
+                    # Write to Excel
+                    writer.append_main(mapping)
+                    writer.append_audit(mapping)
+                except Exception as e:
+                    logger.warning(f"Failed to process invoice {invoice.invoice_type or 'unknown'}: {e}", exc_info=True)
+                    continue
                 
+                if is_strict_match:
+                    strict_match_count += 1
                 processed += 1
                 
                 # Update progress every 50 rows
                 if processed % 50 == 0 or processed == total_rows:
-                    progress = int(20 + (processed / total_rows) * 70)  # 20-90%
+                    progress = int(50 + (processed / total_rows) * 40)  # 50-90%
                     if progress_callback:
                         progress_callback(
                             "processing",
@@ -3248,10 +3626,6 @@ def export_sola_to_excel(
                             f"Matching invoices to Base Carbone factors... {processed}/{total_rows} completed"
                         )
                     logger.info(f"Processed {processed}/{total_rows} invoices...")
-                
-            except Exception as e:
-                logger.warning(f"Failed to process invoice {invoice.invoice_type or 'unknown'}: {e}", exc_info=True)
-                continue
         
         if processed == 0:
             error_msg = "Failed to process any invoices."
@@ -3278,6 +3652,12 @@ def export_sola_to_excel(
         result["file_path"] = file_path_str
         result["strict_match_count"] = strict_match_count
         result["processed_count"] = processed
+        result["unresolved_strict_mappings"] = sorted(unresolved_strict_mappings)
+        result["match_memo"] = match_memo.stats()
+        logger.info(
+            f"📊 Matching memo: {result['match_memo']['hits']}/{result['match_memo']['hits'] + result['match_memo']['misses']} "
+            f"invoices reused an identical invoice's match"
+        )
         
         if progress_callback:
             progress_callback("completed", 100, summary_msg)
@@ -5,23 +5,42 @@ Uses LangChain with Azure OpenAI and Azure AI Search for RAG
 """
 import os
 import re
+import asyncio
+import codecs
+import contextlib
+import hashlib
+import itertools
 import logging
-from typing import List, Optional, Dict, Any, Tuple
+import queue
+import threading
+import weakref
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable, Iterable, Iterator, Set, Tuple, Union
 from django.conf import settings
 from pathlib import Path
 from openpyxl import load_workbook
 from datetime import datetime
 import json
+import math
 import time
+import atexit
+import unicodedata
+from collections import OrderedDict, deque
+import numpy as np
 import pandas as pd
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from langchain.schema import Document
 from langchain_community.chat_models import AzureChatOpenAI
 from langchain_community.vectorstores.azuresearch import AzureSearch
-from langchain.chains import RetrievalQA
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
 from langchain.prompts import PromptTemplate
 
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock for the embedding cache
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 # ============================================================
@@ -41,6 +60,98 @@ AZURE_SEARCH_KEY = getattr(settings, 'RAG_AZURE_AI_SEARCH_KEY', '')
 EMBEDDING_DEPLOYMENT_ID = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 256
 
+# Ingestion batching
+# The embeddings API accepts a list of inputs per request; Azure AI Search accepts up to 1000 documents per batch
+EMBEDDING_BATCH_SIZE = getattr(settings, 'RAG_EMBEDDING_BATCH_SIZE', 64)
+SEARCH_UPLOAD_BATCH_SIZE = min(getattr(settings, 'RAG_SEARCH_UPLOAD_BATCH_SIZE', 1000), 1000)
+# Concurrent embedding requests in flight during ingestion (bounded by the embedding quota)
+EMBEDDING_MAX_WORKERS = getattr(settings, 'RAG_EMBEDDING_MAX_WORKERS', 4)
+# Concurrent search requests when retrieving candidates for a batch of queries (export)
+SEARCH_MAX_WORKERS = getattr(settings, 'RAG_SEARCH_MAX_WORKERS', 8)
+# Invoices matched concurrently by export_sola_to_excel (strict match, reranking, selection, mapping)
+EXPORT_MATCH_MAX_WORKERS = getattr(settings, 'RAG_EXPORT_MATCH_MAX_WORKERS', 8)
+
+# Shared HTTP connection pool for Azure OpenAI (embeddings and chat)
+RAG_OPENAI_MAX_CONNECTIONS = getattr(settings, 'RAG_OPENAI_MAX_CONNECTIONS', 20)
+RAG_OPENAI_MAX_KEEPALIVE_CONNECTIONS = getattr(settings, 'RAG_OPENAI_MAX_KEEPALIVE_CONNECTIONS', RAG_OPENAI_MAX_CONNECTIONS)
+RAG_OPENAI_KEEPALIVE_EXPIRY = getattr(settings, 'RAG_OPENAI_KEEPALIVE_EXPIRY', 30.0)
+RAG_OPENAI_CONNECT_TIMEOUT = getattr(settings, 'RAG_OPENAI_CONNECT_TIMEOUT', 10.0)
+RAG_OPENAI_TIMEOUT = getattr(settings, 'RAG_OPENAI_TIMEOUT', 60.0)
+RAG_OPENAI_MAX_RETRIES = getattr(settings, 'RAG_OPENAI_MAX_RETRIES', 2)
+
+# Shared HTTP connection pool for Azure AI Search (chat, export and ingestion clients)
+RAG_SEARCH_MAX_CONNECTIONS = getattr(settings, 'RAG_SEARCH_MAX_CONNECTIONS', 20)
+RAG_SEARCH_CONNECT_TIMEOUT = getattr(settings, 'RAG_SEARCH_CONNECT_TIMEOUT', 10)
+RAG_SEARCH_READ_TIMEOUT = getattr(settings, 'RAG_SEARCH_READ_TIMEOUT', 60)
+
+# Rows per chunk when streaming Excel workbooks (openpyxl read-only mode)
+EXCEL_READ_CHUNK_SIZE = getattr(settings, 'RAG_EXCEL_READ_CHUNK_SIZE', 1000)
+
+# CSV uploads are read in chunks; the encoding is detected once from the first bytes of the file
+CSV_READ_CHUNK_SIZE = getattr(settings, 'RAG_CSV_READ_CHUNK_SIZE', 5000)
+CSV_ENCODING_SAMPLE_BYTES = getattr(settings, 'RAG_CSV_ENCODING_SAMPLE_BYTES', 1024 * 1024)
+
+# Persistent embedding cache (disabled when no directory is configured)
+RAG_EMBEDDING_CACHE_DIR = getattr(settings, 'RAG_EMBEDDING_CACHE_DIR', None)
+RAG_EMBEDDING_CACHE_MAX_ENTRIES = getattr(settings, 'RAG_EMBEDDING_CACHE_MAX_ENTRIES', 100_000)
+# Recent single-query embeddings kept in memory (a chat question is embedded for the semantic cache and the search)
+RAG_QUERY_EMBEDDING_MEMO_SIZE = getattr(settings, 'RAG_QUERY_EMBEDDING_MEMO_SIZE', 1024)
+
+# Local state for incremental indexing (content hash manifests) and the index version file the answer caches
+# are keyed on. Ingestion and chat must use the same directory (one path on every host/pod, e.g. a shared volume):
+# a reindex only invalidates the cached answers of processes reading the version file it wrote. Required for
+# the answer caches; the working-directory default is only for deployments without them
+RAG_INDEX_STATE_DIR_CONFIGURED = hasattr(settings, 'RAG_INDEX_STATE_DIR')
+RAG_INDEX_STATE_DIR = Path(getattr(settings, 'RAG_INDEX_STATE_DIR', Path.cwd() / ".rag_index_state"))
+
+# Parsed Base Carbone snapshot (Parquet, requires pyarrow); bump the version when document building changes
+BASE_CARBONE_SNAPSHOT_DIR = Path(getattr(settings, 'RAG_BASE_CARBONE_SNAPSHOT_DIR', RAG_INDEX_STATE_DIR / "snapshots"))
+BASE_CARBONE_SNAPSHOT_VERSION = 1
+
+# Search backend: "azure" (Azure AI Search) or "local" (in-process index memory-mapped from RAG_LOCAL_INDEX_DIR)
+RAG_SEARCH_BACKEND = getattr(settings, 'RAG_SEARCH_BACKEND', 'azure')
+RAG_LOCAL_INDEX_DIR = Path(getattr(settings, 'RAG_LOCAL_INDEX_DIR', RAG_INDEX_STATE_DIR / "local_index"))
+# Approximate nearest-neighbour search for the local index: "ivf" (inverted file over k-means clusters) or None (exact)
+RAG_LOCAL_INDEX_ANN = getattr(settings, 'RAG_LOCAL_INDEX_ANN', None)
+RAG_LOCAL_INDEX_ANN_MIN_DOCS = getattr(settings, 'RAG_LOCAL_INDEX_ANN_MIN_DOCS', 50000)  # exact search below this size
+RAG_LOCAL_INDEX_NLIST = getattr(settings, 'RAG_LOCAL_INDEX_NLIST', None)  # clusters (default: 4 * sqrt(document count))
+RAG_LOCAL_INDEX_NPROBE = getattr(settings, 'RAG_LOCAL_INDEX_NPROBE', 16)  # clusters scanned per query (recall vs latency)
+
+# Hybrid retrieval: keyword + vector queries in one search request, fused with reciprocal rank fusion (RRF).
+# Opt-in: it changes which factors the export retrieves (RRF orders the hits; similarities stay cosine scores)
+RAG_HYBRID_SEARCH = getattr(settings, 'RAG_HYBRID_SEARCH', False)
+RAG_HYBRID_RRF_K = 60  # Azure AI Search RRF constant (score = sum of 1 / (k + rank) over the fused queries, ranks from 1)
+
+# Two-phase retrieval: candidate searches return only keys and the reranking text; full factor documents
+# are fetched afterwards for the final top-k only (from the export's factor store, else from the index)
+RAG_TWO_PHASE_RETRIEVAL = getattr(settings, 'RAG_TWO_PHASE_RETRIEVAL', True)
+
+# Chat answer cache: "memory" (per process), "sqlite" (file shared by the processes of a host) or None (disabled).
+# Entries are keyed on the normalized question, filters, k, prompt version and index version; the answer caches
+# also need RAG_INDEX_STATE_DIR (they stay disabled, with a warning, without it)
+RAG_ANSWER_CACHE_BACKEND = getattr(settings, 'RAG_ANSWER_CACHE_BACKEND', None)
+RAG_ANSWER_CACHE_PATH = Path(getattr(settings, 'RAG_ANSWER_CACHE_PATH', RAG_INDEX_STATE_DIR / "answer_cache.sqlite3"))
+RAG_ANSWER_CACHE_TTL = getattr(settings, 'RAG_ANSWER_CACHE_TTL', 24 * 3600)  # seconds, 0 = no expiry
+RAG_ANSWER_CACHE_MAX_ENTRIES = getattr(settings, 'RAG_ANSWER_CACHE_MAX_ENTRIES', 10_000)
+# Bump when the chat prompt template or answer format changes (LLM_SYSTEM_PROMPT edits are detected by hash)
+RAG_CHAT_PROMPT_VERSION = 1
+
+# Semantic answer cache for near-duplicate questions (same filters, k, prompt and index version):
+# "serve" answers from the most similar cached question above the threshold, "shadow" only records what
+# would have been served (hit rates, review samples) so the threshold can be tuned on real traffic, "off" disables it.
+# Off by default: both modes embed every question and scan the cache; turn on "shadow" to tune the threshold first
+RAG_SEMANTIC_CACHE_MODE = getattr(settings, 'RAG_SEMANTIC_CACHE_MODE', 'off')
+RAG_SEMANTIC_CACHE_THRESHOLD = getattr(settings, 'RAG_SEMANTIC_CACHE_THRESHOLD', 0.95)  # cosine similarity
+RAG_SEMANTIC_CACHE_MAX_ENTRIES = getattr(settings, 'RAG_SEMANTIC_CACHE_MAX_ENTRIES', 5000)
+RAG_SEMANTIC_CACHE_REVIEW_SAMPLES = getattr(settings, 'RAG_SEMANTIC_CACHE_REVIEW_SAMPLES', 200)
+
+# Async chat (SolaRagChat.achat): per-stage timeouts in seconds, None = no limit. A timed-out stage is cancelled;
+# a reranking timeout falls back to the vector ranking, any other timeout ends the request with an error answer
+RAG_CHAT_EMBED_TIMEOUT = getattr(settings, 'RAG_CHAT_EMBED_TIMEOUT', 10.0)
+RAG_CHAT_SEARCH_TIMEOUT = getattr(settings, 'RAG_CHAT_SEARCH_TIMEOUT', 10.0)
+RAG_CHAT_RERANK_TIMEOUT = getattr(settings, 'RAG_CHAT_RERANK_TIMEOUT', 15.0)
+RAG_CHAT_LLM_TIMEOUT = getattr(settings, 'RAG_CHAT_LLM_TIMEOUT', RAG_OPENAI_TIMEOUT)
+
 # Index names
 # Schema matches Base Carbone factors from Base_Carbone_V23.6.xlsx
 SOLA_RAG_INDEX_NAME = getattr(settings, 'SOLA_RAG_AZURE_AI_SEARCH_INDEX_NAME', 'sola-rag-index')
@@ -49,24 +160,487 @@ SOLA_RAG_INDEX_NAME = getattr(settings, 'SOLA_RAG_AZURE_AI_SEARCH_INDEX_NAME', '
 # LANGCHAIN SETUP
 # ============================================================
 
+# Process-wide Azure OpenAI clients. Building a client per call opens a new connection pool
+# (and TLS handshake) every time, so clients are created once and share one keep-alive pool.
+_openai_http_client = None
+_openai_clients: Dict[Tuple[str, str, str], Any] = {}
+_openai_clients_lock = threading.Lock()
+
+
+def get_openai_http_client():
+    """Get the shared httpx client used by every Azure OpenAI client in this process."""
+    global _openai_http_client
+    if _openai_http_client is None:
+        with _openai_clients_lock:
+            if _openai_http_client is None:
+                import httpx
+                _openai_http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=RAG_OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=RAG_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=RAG_OPENAI_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=httpx.Timeout(RAG_OPENAI_TIMEOUT, connect=RAG_OPENAI_CONNECT_TIMEOUT),
+                )
+    return _openai_http_client
+
+
+def get_openai_client(
+    api_base: str = AZURE_OPENAI_API_BASE,
+    api_key: str = AZURE_OPENAI_API_KEY,
+    api_version: str = AZURE_OPENAI_API_VERSION,
+):
+    """
+    Get a shared AzureOpenAI client for an endpoint/key/version (thread-safe).
+    
+    Returns:
+        openai.AzureOpenAI instance backed by the shared connection pool
+    """
+    key = (api_base.rstrip("/"), api_key, api_version)
+    client = _openai_clients.get(key)
+    if client is None:
+        http_client = get_openai_http_client()
+        with _openai_clients_lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                from openai import AzureOpenAI
+                client = AzureOpenAI(
+                    api_key=api_key,
+                    api_version=api_version,
+                    azure_endpoint=key[0],
+                    http_client=http_client,
+                    timeout=RAG_OPENAI_TIMEOUT,
+                    max_retries=RAG_OPENAI_MAX_RETRIES,
+                )
+                _openai_clients[key] = client
+    return client
+
+
+# Async clients (SolaRagChat.achat). An httpx.AsyncClient's connections belong to the event loop that
+# opened them, so each running loop gets its own keep-alive pool and clients (closed by aclose_async_clients).
+_async_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Any, Dict[Tuple[str, str, str], Any]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def aclose_async_clients() -> None:
+    """
+    Close the async OpenAI and search clients of the running event loop (connection pool, aiohttp sessions).
+    
+    Code that runs achat/astream on a loop it later closes (asyncio.run, async_to_sync) awaits this
+    at the end of the loop's work; a long-lived loop (ASGI server) keeps its clients open instead.
+    The next get_async_openai_client / get_async_search_client call on the loop opens new clients.
+    """
+    loop = asyncio.get_running_loop()
+    with _openai_clients_lock:
+        openai_entry = _async_openai_clients.pop(loop, None)
+    with _search_clients_lock:
+        search_clients = _async_search_clients.pop(loop, None) or {}
+    closers = [client.close for client in search_clients.values()]
+    if openai_entry is not None:
+        closers.append(openai_entry[0].aclose)  # the AsyncAzureOpenAI clients share this httpx client
+    for close in closers:
+        try:
+            await close()
+        except Exception as e:
+            logger.warning(f"Failed to close async client: {e}")
+
+
+def get_async_openai_client(
+    api_base: str = AZURE_OPENAI_API_BASE,
+    api_key: str = AZURE_OPENAI_API_KEY,
+    api_version: str = AZURE_OPENAI_API_VERSION,
+):
+    """
+    Get the AsyncAzureOpenAI client of the running event loop for an endpoint/key/version.
+    Must be called from a coroutine.
+    
+    Returns:
+        openai.AsyncAzureOpenAI instance backed by the loop's shared connection pool
+    """
+    loop = asyncio.get_running_loop()
+    key = (api_base.rstrip("/"), api_key, api_version)
+    with _openai_clients_lock:
+        entry = _async_openai_clients.get(loop)
+        if entry is None:
+            import httpx
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=RAG_OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=RAG_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=RAG_OPENAI_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(RAG_OPENAI_TIMEOUT, connect=RAG_OPENAI_CONNECT_TIMEOUT),
+            )
+            entry = _async_openai_clients[loop] = (http_client, {})
+        http_client, clients = entry
+        client = clients.get(key)
+        if client is None:
+            from openai import AsyncAzureOpenAI
+            client = clients[key] = AsyncAzureOpenAI(
+                api_key=api_key,
+                api_version=api_version,
+                azure_endpoint=key[0],
+                http_client=http_client,
+                timeout=RAG_OPENAI_TIMEOUT,
+                max_retries=RAG_OPENAI_MAX_RETRIES,
+            )
+    return client
+
+_query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+
+
+def _recall_query_embedding(text: str) -> Optional[List[float]]:
+    with _query_embeddings_lock:
+        embedding = _query_embeddings.get(text)
+        if embedding is None:
+            return None
+        _query_embeddings.move_to_end(text)
+        return list(embedding)
+
+
+def _remember_query_embedding(text: str, embedding: List[float]) -> None:
+    if not RAG_QUERY_EMBEDDING_MEMO_SIZE:
+        return
+    with _query_embeddings_lock:
+        _query_embeddings[text] = list(embedding)
+        while len(_query_embeddings) > RAG_QUERY_EMBEDDING_MEMO_SIZE:
+            _query_embeddings.popitem(last=False)
+
+
 # Custom embedding function that ensures dimensions=256
 def create_embedding_with_dimensions(text: str) -> List[float]:
     """
     Create embedding with explicit dimensions=256 parameter.
     This ensures compatibility with Azure AI Search index that expects 256 dimensions.
+    The last RAG_QUERY_EMBEDDING_MEMO_SIZE texts are memoized in memory.
     """
-    from openai import AzureOpenAI
-    azure_client = AzureOpenAI(
-        api_key=AZURE_OPENAI_API_KEY,
-        api_version=AZURE_OPENAI_API_VERSION,
-        azure_endpoint=AZURE_OPENAI_API_BASE.rstrip("/"),
-    )
+    embedding = _recall_query_embedding(text)
+    if embedding is None:
+        embedding = create_embeddings_with_dimensions([text])[0]
+        _remember_query_embedding(text, embedding)
+    return embedding
+
+
+def create_embeddings_with_dimensions(texts: List[str]) -> List[List[float]]:
+    """
+    Create embeddings for several texts in a single request (dimensions=256).
+    Returned vectors are in the same order as the input texts.
+    Texts found in the persistent embedding cache are not sent to Azure OpenAI.
+    """
+    if not texts:
+        return []
+    cache = get_embedding_cache()
+    if cache is None:
+        return _request_embeddings(texts)
+    embeddings = cache.get_many(texts)
+    missing = list(dict.fromkeys(texts[i] for i, embedding in enumerate(embeddings) if embedding is None))
+    if missing:
+        fetched = dict(zip(missing, _request_embeddings(missing)))
+        cache.put_many(missing, [fetched[text] for text in missing])
+        embeddings = [embedding if embedding is not None else fetched[text] for text, embedding in zip(texts, embeddings)]
+    return embeddings
+
+
+def _request_embeddings(texts: List[str]) -> List[List[float]]:
+    """Call the Azure OpenAI embeddings API for a list of texts."""
+    azure_client = get_openai_client()
     response = azure_client.embeddings.create(
         model=EMBEDDING_DEPLOYMENT_ID,
-        input=[text],
+        input=list(texts),
         dimensions=EMBEDDING_DIMENSIONS,  # CRITICAL: Specify 256 dimensions
     )
-    return response.data[0].embedding
+    # The API returns one item per input with its position in `index`
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def acreate_embedding_with_dimensions(text: str) -> List[float]:
+    """Async create_embedding_with_dimensions (same in-memory memo)."""
+    embedding = _recall_query_embedding(text)
+    if embedding is None:
+        embedding = (await acreate_embeddings_with_dimensions([text]))[0]
+        _remember_query_embedding(text, embedding)
+    return embedding
+
+
+async def acreate_embeddings_with_dimensions(texts: List[str]) -> List[List[float]]:
+    """Async create_embeddings_with_dimensions (same persistent embedding cache)."""
+    if not texts:
+        return []
+    cache = get_embedding_cache()
+    if cache is None:
+        return await _arequest_embeddings(texts)
+    embeddings = cache.get_many(texts)
+    missing = list(dict.fromkeys(texts[i] for i, embedding in enumerate(embeddings) if embedding is None))
+    if missing:
+        fetched = dict(zip(missing, await _arequest_embeddings(missing)))
+        cache.put_many(missing, [fetched[text] for text in missing])
+        embeddings = [embedding if embedding is not None else fetched[text] for text, embedding in zip(texts, embeddings)]
+    return embeddings
+
+
+async def _arequest_embeddings(texts: List[str]) -> List[List[float]]:
+    """Call the Azure OpenAI embeddings API for a list of texts with the event loop's async client."""
+    response = await get_async_openai_client().embeddings.create(
+        model=EMBEDDING_DEPLOYMENT_ID,
+        input=list(texts),
+        dimensions=EMBEDDING_DIMENSIONS,
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class SolaEmbeddings(Embeddings):
+    """LangChain Embeddings over the functions above, so vector stores get native async embedding (aembed_query)."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return create_embeddings_with_dimensions(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return create_embedding_with_dimensions(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await acreate_embeddings_with_dimensions(list(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await acreate_embedding_with_dimensions(text)
+
+
+sola_embeddings = SolaEmbeddings()
+
+# ============================================================
+# EMBEDDING CACHE
+# ============================================================
+class EmbeddingCache:
+    """
+    Persistent, size-bounded embedding cache for one (model, dimensions) pair.
+
+    Stored as memory-mapped files in `cache_dir`:
+        *.f32   float32 vectors, one row per slot
+        *.keys  16-byte key digest + 8-byte vector checksum per slot (all zeros = empty slot)
+        *.ticks last-use counter per slot, used for LRU eviction
+        *.gen   write generation, incremented by every put_many
+
+    Keys are sha256(model, dimensions, normalized text). A slot's vector is only returned when
+    its stored digest matches and the vector matches its checksum: the files are flushed without
+    an fsync barrier, so after an OS crash or power loss the .keys page may have reached the disk
+    without the matching .f32 page; such a slot is a miss (and is rewritten by the next put).
+
+    Processes may share `cache_dir` (e.g. the workers of a host): slots are allocated under an
+    exclusive lock on the *.lock file, after reloading the key table if another process wrote since
+    (lookups reload it too). The lock needs fcntl: elsewhere, use one directory per process.
+    Opening the cache with another max_entries resizes the files, keeping the most recently used entries;
+    the processes sharing a directory must all use the same max_entries.
+    """
+
+    KEY_BYTES = 16
+    CHECKSUM_BYTES = 8
+    FORMAT = 2
+
+    def __init__(self, cache_dir: Path, model: str, dimensions: int, max_entries: int, flush_every: int = 256) -> None:
+        self.model = model
+        self.dimensions = dimensions
+        self.max_entries = max(1, int(max_entries))
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._tick = 0
+
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        stem = cache_dir / f"{sanitize_key(model)}_{dimensions}"
+        self._lock_file = open(stem.with_suffix(".lock"), "a+b")
+        meta_path = stem.with_suffix(".meta.json")
+        meta = {"model": model, "dimensions": dimensions, "max_entries": self.max_entries, "format": self.FORMAT}
+        with self._file_lock():
+            stored_meta = load_index_state(meta_path)
+            fresh = {k: v for k, v in stored_meta.items() if k != "max_entries"} != {
+                k: v for k, v in meta.items() if k != "max_entries"
+            }
+            if not fresh and stored_meta.get("max_entries") != self.max_entries:
+                try:
+                    self._resize(stem, int(stored_meta["max_entries"]))
+                except Exception as e:
+                    logger.warning(f"Embedding cache: could not resize {stem} to {self.max_entries} entries, starting empty: {e}")
+                    fresh = True
+            mode = "w+" if fresh else "r+"
+            self._vectors = np.memmap(stem.with_suffix(".f32"), dtype=np.float32, mode=mode, shape=(self.max_entries, dimensions))
+            self._keys = np.memmap(stem.with_suffix(".keys"), dtype=np.uint8, mode=mode, shape=(self.max_entries, self._row_bytes()))
+            self._ticks = np.memmap(stem.with_suffix(".ticks"), dtype=np.int64, mode=mode, shape=(self.max_entries,))
+            gen_path = stem.with_suffix(".gen")
+            self._generations = np.memmap(gen_path, dtype=np.int64, mode="r+" if gen_path.exists() else "w+", shape=(1,))
+            if fresh:
+                self._generations[0] += 1  # other processes drop the slots of the previous files
+            if stored_meta != meta:
+                save_index_state(meta_path, meta)
+            self._reload()
+
+    @classmethod
+    def _row_bytes(cls) -> int:
+        return cls.KEY_BYTES + cls.CHECKSUM_BYTES
+
+    @contextlib.contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock shared with the other processes using the cache directory."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _resize(self, stem: Path, old_entries: int) -> None:
+        """Rewrite the files for max_entries slots, keeping the most recently used entries (under the file lock)."""
+        row_bytes = self._row_bytes()
+        old_keys = np.memmap(stem.with_suffix(".keys"), dtype=np.uint8, mode="r", shape=(old_entries, row_bytes))
+        old_vectors = np.memmap(stem.with_suffix(".f32"), dtype=np.float32, mode="r", shape=(old_entries, self.dimensions))
+        old_ticks = np.memmap(stem.with_suffix(".ticks"), dtype=np.int64, mode="r", shape=(old_entries,))
+        used = np.flatnonzero(old_keys[:, :self.KEY_BYTES].any(axis=1))
+        used = used[np.argsort(old_ticks[used], kind="stable")][-self.max_entries:]
+        for suffix, old, dtype, row_shape in (
+            (".f32", old_vectors, np.float32, (self.dimensions,)),
+            (".keys", old_keys, np.uint8, (row_bytes,)),
+            (".ticks", old_ticks, np.int64, ()),
+        ):
+            path = stem.with_suffix(suffix)
+            tmp_path = path.with_name(path.name + ".tmp")
+            resized = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=(self.max_entries,) + row_shape)
+            resized[:len(used)] = old[used]
+            resized.flush()
+            del resized
+            os.replace(tmp_path, path)
+        logger.info(f"Embedding cache: resized {stem} from {old_entries} to {self.max_entries} entries ({len(used)} kept)")
+
+    def _reload(self) -> None:
+        """Rebuild the in-memory key -> slot index (least to most recently used) from the key table."""
+        # Read the generation first: a write that lands during the scan bumps it and triggers another reload
+        self._generation = int(self._generations[0])
+        used = np.flatnonzero(self._keys[:, :self.KEY_BYTES].any(axis=1))
+        used = used[np.argsort(self._ticks[used], kind="stable")]
+        self._slots: "OrderedDict[bytes, int]" = OrderedDict(
+            (bytes(self._keys[slot, :self.KEY_BYTES]), int(slot)) for slot in used
+        )
+        self._tick = max(self._tick, int(self._ticks[used].max()) if len(used) else 0)
+        self._next_free = int(used.max()) + 1 if len(used) else 0
+
+    def _key(self, text: str) -> bytes:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        digest = hashlib.sha256(f"{self.model}\x00{self.dimensions}\x00{normalized}".encode("utf-8"))
+        return digest.digest()[:self.KEY_BYTES]
+
+    def _checksum(self, vector: np.ndarray) -> bytes:
+        return hashlib.blake2b(np.ascontiguousarray(vector, dtype=np.float32).tobytes(), digest_size=self.CHECKSUM_BYTES).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order, None for misses."""
+        keys = [self._key(text) for text in texts]
+        results: List[Optional[List[float]]] = []
+        with self._lock:
+            if self._generations[0] != self._generation:
+                self._reload()
+            for key in keys:
+                slot = self._slots.get(key)
+                if (
+                    slot is not None
+                    and bytes(self._keys[slot]) == key + self._checksum(self._vectors[slot])
+                ):
+                    self._slots.move_to_end(key)
+                    self._tick += 1
+                    self._ticks[slot] = self._tick
+                    results.append(self._vectors[slot].tolist())
+                    self.hits += 1
+                else:
+                    results.append(None)
+                    self.misses += 1
+        return results
+
+    def put_many(self, texts: List[str], embeddings: List[List[float]]) -> None:
+        """Store vectors, evicting the least recently used entries when full."""
+        with self._lock, self._file_lock():
+            if self._generations[0] != self._generation:
+                self._reload()
+            stored = 0
+            for text, embedding in zip(texts, embeddings):
+                if len(embedding) != self.dimensions:
+                    continue
+                key = self._key(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._next_free < self.max_entries:
+                        slot = self._next_free
+                        self._next_free += 1
+                    else:
+                        _, slot = self._slots.popitem(last=False)
+                    self._slots[key] = slot
+                else:
+                    self._slots.move_to_end(key)
+                # Invalidate the slot before overwriting the vector, then publish the key and checksum
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key + self._checksum(vector), dtype=np.uint8)
+                self._tick += 1
+                self._ticks[slot] = self._tick
+                stored += 1
+            if stored:
+                self._generations[0] += 1
+                self._generation = int(self._generations[0])
+                self._unflushed += stored
+            if self._unflushed >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._vectors.flush()
+        self._keys.flush()
+        self._ticks.flush()
+        self._generations.flush()
+        self._unflushed = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self._slots),
+                "max_entries": self.max_entries,
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_disabled = False
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get the process-wide embedding cache, or None when RAG_EMBEDDING_CACHE_DIR is not set."""
+    global _embedding_cache, _embedding_cache_disabled
+    if not RAG_EMBEDDING_CACHE_DIR or _embedding_cache_disabled:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None and not _embedding_cache_disabled:
+                try:
+                    _embedding_cache = EmbeddingCache(
+                        Path(RAG_EMBEDDING_CACHE_DIR),
+                        EMBEDDING_DEPLOYMENT_ID,
+                        EMBEDDING_DIMENSIONS,
+                        RAG_EMBEDDING_CACHE_MAX_ENTRIES,
+                    )
+                    atexit.register(_embedding_cache.flush)
+                except Exception as e:
+                    logger.warning(f"Embedding cache disabled: could not open {RAG_EMBEDDING_CACHE_DIR}: {e}")
+                    _embedding_cache_disabled = True
+    return _embedding_cache
 
 # Initialize LangChain LLM (lazy initialization to avoid conflicts)
 _llm = None
@@ -88,6 +662,8 @@ def get_llm():
                 azure_endpoint=AZURE_OPENAI_API_BASE.rstrip("/"),
                 api_key=AZURE_OPENAI_API_KEY,
                 temperature=0.7,
+                request_timeout=RAG_OPENAI_TIMEOUT,
+                max_retries=RAG_OPENAI_MAX_RETRIES,
             )
         finally:
             # Restore original env vars if they existed (to avoid side effects)
@@ -98,24 +674,42 @@ def get_llm():
     return _llm
 
 # Helper function to get vector store
-def get_vector_store(rag_type: str = "sola") -> AzureSearch:
+_vector_stores: Dict[Tuple[str, str], VectorStore] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def get_vector_store(rag_type: str = "sola") -> VectorStore:
     """
-    Get LangChain AzureSearch vector store for Sola RAG.
+    Get LangChain vector store for Sola RAG.
     
     Args:
         rag_type: "sola"
     
     Returns:
-        AzureSearch vector store instance
+        Shared AzureSearch vector store instance (LocalVectorStore when RAG_SEARCH_BACKEND is "local")
     """
     index_name = SOLA_RAG_INDEX_NAME
     
-    return AzureSearch(
-        azure_search_endpoint=AZURE_SEARCH_ENDPOINT,
-        azure_search_key=AZURE_SEARCH_KEY,
-        index_name=index_name,
-        embedding_function=create_embedding_with_dimensions,  # Use custom function with dimensions=256
-    )
+    # Building AzureSearch checks the index over the network and creates new clients, so one
+    # instance per index is kept for the process (its sync client uses the shared search transport)
+    key = (RAG_SEARCH_BACKEND, index_name)
+    vector_store = _vector_stores.get(key)
+    if vector_store is None:
+        with _vector_stores_lock:
+            vector_store = _vector_stores.get(key)
+            if vector_store is None:
+                if RAG_SEARCH_BACKEND == "local":
+                    vector_store = LocalVectorStore(get_local_vector_index(index_name), sola_embeddings)
+                else:
+                    vector_store = AzureSearch(
+                        azure_search_endpoint=AZURE_SEARCH_ENDPOINT,
+                        azure_search_key=AZURE_SEARCH_KEY,
+                        index_name=index_name,
+                        embedding_function=sola_embeddings,  # dimensions=256, with async embedding for achat
+                        additional_search_client_options={"transport": get_search_transport()},
+                    )
+                _vector_stores[key] = vector_store
+    return vector_store
 
 # ============================================================
 # HELPER FUNCTIONS
@@ -214,6 +808,204 @@ def build_base_carbone_content_text(record: Dict[str, Any]) -> str:
     return ". ".join(parts) + "."
 
 
+def _excel_header(cells: Tuple[Any, ...]) -> List[str]:
+    """Column names as pandas.read_excel builds them (unnamed and duplicate headers included)."""
+    header: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, cell in enumerate(cells):
+        name = str(cell) if cell is not None else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        header.append(name)
+    return header
+
+
+def iter_excel_chunks(
+    path: Any,
+    sheet_name: Optional[str] = None,
+    chunk_size: int = EXCEL_READ_CHUNK_SIZE,
+) -> Iterable[pd.DataFrame]:
+    """
+    Stream an Excel sheet as DataFrame chunks using openpyxl read-only mode.
+    Only one chunk of rows is held in memory; the index continues across chunks (0-based sheet row
+    after the header), so row numbering matches pd.read_excel on the whole sheet.
+    
+    Args:
+        path: Path to the .xlsx file
+        sheet_name: Sheet to read (defaults to the first sheet, like pd.read_excel)
+        chunk_size: Number of rows per chunk
+    
+    Yields:
+        DataFrames with the header row as columns and missing cells as NaN
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        try:
+            header = _excel_header(next(rows))
+        except StopIteration:
+            return
+        width = len(header)
+        chunk: List[Tuple[Any, ...]] = []
+        blank_rows: List[Tuple[Any, ...]] = []
+        start = 0
+        for row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            # Trailing blank rows are dropped (like read_excel); blank rows between data rows are kept
+            if all(cell is None or cell == "" for cell in row):
+                blank_rows.append(row)
+                continue
+            if blank_rows:
+                chunk.extend(blank_rows)
+                blank_rows = []
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield _excel_rows_to_frame(chunk, header, start)
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield _excel_rows_to_frame(chunk, header, start)
+    finally:
+        wb.close()
+
+
+def _excel_rows_to_frame(rows: List[Tuple[Any, ...]], header: List[str], start: int) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=header, index=pd.RangeIndex(start, start + len(rows)))
+    # Missing cells are NaN (not None), as with pd.read_excel
+    return frame.fillna(np.nan)
+
+
+def detect_csv_encoding(path: Any, sample_size: int = CSV_ENCODING_SAMPLE_BYTES) -> str:
+    """
+    Detect a CSV file's encoding from its first `sample_size` bytes.
+    UTF-8 (with or without BOM) when the sample decodes, latin-1 otherwise (latin-1 accepts any byte).
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    # Incremental decoder: a multi-byte character cut at the end of the sample is not an error
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        decoder.decode(sample, final=len(sample) < sample_size)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def iter_csv_chunks(
+    path: Any,
+    chunk_size: int = CSV_READ_CHUNK_SIZE,
+    encoding: Optional[str] = None,
+) -> Iterable[pd.DataFrame]:
+    """
+    Stream a CSV file as DataFrame chunks (pd.read_csv chunksize); the index continues across chunks.
+    If bytes that are not UTF-8 appear after the detection sample, reading switches to latin-1
+    and continues after the rows already yielded.
+    
+    Args:
+        path: Path to the .csv file
+        chunk_size: Number of rows per chunk
+        encoding: Encoding to use (detected with detect_csv_encoding when not given)
+    
+    Yields:
+        DataFrames of up to chunk_size rows
+    """
+    encoding = encoding or detect_csv_encoding(path)
+    rows_done = 0
+    while True:
+        try:
+            with pd.read_csv(path, encoding=encoding, chunksize=chunk_size) as reader:
+                for chunk in reader:
+                    if rows_done:
+                        chunk = chunk[chunk.index >= rows_done]
+                        if chunk.empty:
+                            continue
+                    rows_done = int(chunk.index[-1]) + 1
+                    yield chunk
+            return
+        except UnicodeDecodeError as e:
+            if encoding == "latin-1":
+                raise
+            logger.warning(f"CSV {path} is not valid {encoding} after row {rows_done} ({e}), continuing as latin-1")
+            encoding = "latin-1"
+
+
+# Columns of uploaded CSV/XLSX files that map to index fields
+SOLA_CSV_SCHEMA_COLUMNS = [
+    "identifier", "status", "name_fr", "name_en", "category", "tags_fr", "tags_en",
+    "unit_fr", "unit_en", "contributor", "programme", "source", "url", "location",
+    "total", "co2f", "ch4f", "ch4b", "n2o",
+]
+SOLA_CSV_NUMERIC_COLUMNS = ["total", "co2f", "ch4f", "ch4b", "n2o"]
+
+
+def _csv_metadata_value(column: str, value: Any) -> Any:
+    """Convert a non-null cell of a schema column to its index field value."""
+    if column == "identifier":
+        try:
+            return int(value) if value else 0
+        except (ValueError, TypeError):
+            return str(value)
+    if column in SOLA_CSV_NUMERIC_COLUMNS:
+        try:
+            return float(value) if value else None
+        except (ValueError, TypeError):
+            return str(value)
+    return str(value) if value else ""
+
+
+def build_csv_documents(chunk: pd.DataFrame, filename: str) -> List[Dict[str, Any]]:
+    """
+    Build search documents (without content_vector) for a chunk of an uploaded CSV/XLSX file.
+    Content is "column: value" for every non-empty cell, built column-wise; schema columns
+    are also copied to index fields. Column names must already be normalized (lowercase, stripped).
+    
+    Args:
+        chunk: DataFrame chunk (index = 0-based row number in the file)
+        filename: Original file name, stored on each document
+    
+    Returns:
+        List of search documents in row order
+    """
+    content_parts = []
+    for col in chunk.columns:
+        values = chunk[col]
+        text = values.astype(str)
+        keep = values.notna() & text.str.strip().ne("")
+        content_parts.append((f"{col}: " + text).where(keep).tolist())
+    # Dropped cells are NaN after where(), so only str parts are joined
+    contents = [". ".join(part for part in parts if isinstance(part, str)) + "." for parts in zip(*content_parts)]
+
+    metadata_columns = {}
+    for col in SOLA_CSV_SCHEMA_COLUMNS:
+        if col in chunk.columns:
+            values = chunk[col]
+            present = values.notna().tolist()
+            metadata_columns[col] = [
+                _csv_metadata_value(col, value) if is_present else None
+                for value, is_present in zip(values.tolist(), present)
+            ], present
+
+    documents: List[Dict[str, Any]] = []
+    for i, idx in enumerate(chunk.index):
+        row_index = int(idx) + 1  # 1-based
+        search_doc = {
+            "id": f"sola_{sanitize_key(str(row_index))}",
+            "content": contents[i],
+            "row_index": row_index,
+            "filename": filename,
+        }
+        for col, (values, present) in metadata_columns.items():
+            if present[i]:
+                search_doc[col] = values[i]
+        documents.append(search_doc)
+    return documents
+
+
 def sanitize_key(value: str) -> str:
     """
     Sanitize a string to be used as Azure Search document key:
@@ -270,288 +1062,1887 @@ def clean_for_json(value: Any) -> Any:
     return value
 
 
-# ============================================================
-# BASE CARBONE EXCEL PROCESSOR
-# ============================================================
-class BaseCarboneExcelProcessor:
-    """Process Base Carbone Excel file: Parse → Embedding → Indexing to Azure AI Search"""
+# Base Carbone "All_Records" columns → search document fields
+BASE_CARBONE_TEXT_COLUMNS = {
+    "status": "Statut de l'élément",
+    "name_fr": "Nom base français",
+    "name_en": "Nom base anglais",
+    "category": "Code de la catégorie",
+    "tags_fr": "Tags français",
+    "tags_en": "Tags anglais",
+    "unit_fr": "Unité français",
+    "unit_en": "Unité anglais",
+    "contributor": "Contributeur",
+    "other_contributors": "Autres Contributeurs",
+    "programme": "Programme",
+    "source": "Source",
+    "url": "Url du programme",
+    "location": "Localisation géographique",
+    "validity": "Période de validité",
+    "comments_fr": "Commentaire français",
+    "comments_en": "Commentaire anglais",
+}
+BASE_CARBONE_DATE_COLUMNS = {
+    "created_at": "Date de création",
+    "modified_at": "Date de modification",
+}
+BASE_CARBONE_NUMERIC_COLUMNS = {
+    "total": "Total poste non décomposé",
+    "co2f": "CO2f",
+    "ch4f": "CH4f",
+    "ch4b": "CH4b",
+    "n2o": "N2O",
+}
+BASE_CARBONE_IDENTIFIER_COLUMN = "Identifiant de l'élément"
+BASE_CARBONE_EXTRA_GAS_COUNT = 5
+
+# Labels of build_base_carbone_content_text, in order
+BASE_CARBONE_CONTENT_LABELS = [
+    ("name_fr", "Nom français"),
+    ("name_en", "Nom anglais"),
+    ("category", "Catégorie"),
+    ("tags_fr", "Tags français"),
+    ("tags_en", "Tags anglais"),
+    ("unit_fr", "Unité français"),
+    ("unit_en", "Unité anglais"),
+    ("location", "Localisation"),
+    ("programme", "Programme"),
+    ("source", "Source"),
+    ("comments_fr", "Commentaire français"),
+    ("comments_en", "Commentaire anglais"),
+]
+
+
+def _get_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """Return a DataFrame column, or an all-missing column if the sheet doesn't have it."""
+    if column in df.columns:
+        return df[column]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _is_text_column(series: pd.Series) -> bool:
+    return pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty")
+
+
+def _clean_text_column(series: pd.Series) -> List[Optional[str]]:
+    """Column-wise clean_text: stripped strings, None for empty/NaN."""
+    if not _is_text_column(series):
+        return [clean_text(value) for value in series.tolist()]
+    text = series.astype("string").str.strip()
+    text = text.mask(text.eq("") | text.str.lower().eq("nan"))
+    return text.astype(object).where(text.notna(), None).tolist()
+
+
+def _safe_float_column(series: pd.Series) -> List[Optional[float]]:
+    """Column-wise safe_float: French decimal commas accepted, None when the text is not numeric."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype("float64").tolist()
+    if not _is_text_column(series):
+        return [safe_float(value) for value in series.tolist()]
+    text = series.astype("string").str.replace(",", ".", regex=False)
+    floats = pd.to_numeric(text, errors="coerce").astype("float64")
+    # to_numeric turns both "nan" and unparseable text into NaN; safe_float returns None for the latter
+    unparseable = (floats.isna() & series.notna() & ~text.str.strip().str.lower().isin(["nan", "+nan", "-nan"])).tolist()
+    missing = series.isna().tolist()
+    return [
+        None if bad else (safe_float(original) if is_missing else value)
+        for value, bad, is_missing, original in zip(floats.tolist(), unparseable, missing, series.tolist())
+    ]
+
+
+def _datetime_column(series: pd.Series) -> List[Optional[datetime]]:
+    """Column-wise parse_excel_datetime (same formats, tried in the same order)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = series
+    elif _is_text_column(series) and series.notna().any():
+        text = series.astype("string")
+        parsed = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+        for fmt in ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"]:
+            parsed = parsed.fillna(pd.to_datetime(text, format=fmt, errors="coerce"))
+    else:
+        return [parse_excel_datetime(value) for value in series.tolist()]
+    values = parsed.dt.to_pydatetime()
+    return [value if isinstance(value, datetime) and not pd.isna(value) else None for value in values]
+
+
+def _identifier_column(series: pd.Series) -> List[Optional[int]]:
+    """Element identifiers as int (truncating floats), None when missing or not numeric."""
+    if pd.api.types.is_integer_dtype(series) and not series.isna().any():
+        return series.astype("int64").tolist()
+    values = pd.to_numeric(series, errors="coerce").astype("float64")
+    values = values.where(np.isfinite(values))
+    return [None if pd.isna(value) else int(value) for value in values.tolist()]
+
+
+def _json_safe_text(values: List[Optional[str]]) -> List[str]:
+    """Mirror clean_for_json(text) or "": NaN/null-like strings become empty."""
+    return ["" if value is None or value.lower() in ("nan", "nat", "none", "null") else value for value in values]
+
+
+def build_base_carbone_documents(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Build Azure AI Search documents (without content_vector) from the Base Carbone "All_Records" sheet.
+    Each column is cleaned once (renames, NaN cleanup, identifier casting, numeric coercion, extra gases)
+    and the documents are then assembled in a single pass; rows keep their 1-based row_index.
+    The vector is attached by index_documents_in_batches once the embedding batch returns.
     
-    def upload_base_carbone_excel(
-        self,
-        excel_file_path: str,
-        filename: Optional[str] = None,
-    ) -> Dict[str, Any]:
-        """
-        Ingest Base_Carbone_V23.6.xlsx and index into Azure AI Search.
-        Logic follows map_invoices_to_base_carbone.py but uses Azure AI Search instead of local files.
-        
-        Args:
-            excel_file_path: Path to Base_Carbone_V23.6.xlsx file
-            filename: Optional filename (defaults to excel_file_path basename)
-        
-        Returns:
-            Dict with status, file info, and indexing results
-        """
+    Args:
+        df: DataFrame read from the All_Records sheet (original French column names)
+    
+    Returns:
+        List of search documents in sheet order
+    """
+    row_indexes = [int(idx) + 1 for idx in df.index]
+    identifiers = _identifier_column(_get_column(df, BASE_CARBONE_IDENTIFIER_COLUMN))
+    texts = {field: _clean_text_column(_get_column(df, column)) for field, column in BASE_CARBONE_TEXT_COLUMNS.items()}
+    dates = {field: _datetime_column(_get_column(df, column)) for field, column in BASE_CARBONE_DATE_COLUMNS.items()}
+    numbers = {field: _safe_float_column(_get_column(df, column)) for field, column in BASE_CARBONE_NUMERIC_COLUMNS.items()}
+
+    # Searchable content (same text as build_base_carbone_content_text)
+    content_parts = [
+        [f"{label}: {value}" if value else None for value in texts[field]]
+        for field, label in BASE_CARBONE_CONTENT_LABELS
+    ]
+    content_parts.append([f"Total CO2e: {value}" if value is not None else None for value in numbers["total"]])
+    contents = [". ".join(part for part in parts if part) + "." for parts in zip(*content_parts)]
+
+    # extra_gases JSON: five {"code", "value"} pairs per row
+    gas_codes = [
+        _clean_text_column(_get_column(df, f"Code gaz supplémentaire {n}"))
+        for n in range(1, BASE_CARBONE_EXTRA_GAS_COUNT + 1)
+    ]
+    gas_values = [
+        _safe_float_column(_get_column(df, f"Valeur gaz supplémentaire {n}"))
+        for n in range(1, BASE_CARBONE_EXTRA_GAS_COUNT + 1)
+    ]
+    extra_gases = [
+        json.dumps([{"code": code, "value": value} for code, value in zip(codes, values)])
+        for codes, values in zip(zip(*gas_codes), zip(*gas_values))
+    ]
+
+    # Field values as stored in the index: text "" instead of None, no NaN/Inf for Edm.Double
+    text_fields = {field: _json_safe_text(values) for field, values in texts.items()}
+    numeric_fields = {
+        field: [value if value is not None and math.isfinite(value) else None for value in values]
+        for field, values in numbers.items()
+    }
+
+    documents: List[Dict[str, Any]] = []
+    for i, row_index in enumerate(row_indexes):
+        search_doc = {
+            "id": f"base_carbone_{row_index}",
+            "content": contents[i],
+            "row_index": row_index,
+            "identifier": identifiers[i],
+        }
+        for field in BASE_CARBONE_TEXT_COLUMNS:
+            search_doc[field] = text_fields[field][i]
+        for field in BASE_CARBONE_DATE_COLUMNS:
+            search_doc[field] = dates[field][i]
+        # Azure Search doesn't accept None for Edm.Double, so missing numbers are omitted
+        for field in BASE_CARBONE_NUMERIC_COLUMNS:
+            value = numeric_fields[field][i]
+            if value is not None:
+                search_doc[field] = value
+        search_doc["extra_gases"] = extra_gases[i]
+        documents.append(search_doc)
+    return documents
+
+
+def index_documents_in_batches(
+    search_client: Any,
+    documents: Iterable[Dict[str, Any]],
+    embedding_batch_size: int = EMBEDDING_BATCH_SIZE,
+    upload_batch_size: int = SEARCH_UPLOAD_BATCH_SIZE,
+    max_workers: int = EMBEDDING_MAX_WORKERS,
+    log_prefix: str = "Base Carbone",
+    on_batch_done: Optional[Callable[[List[Dict[str, Any]], List[str]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Embed and upload search documents through a bounded producer/consumer pipeline.
+
+    Each document must contain "id" and "content"; "content_vector" is added here.
+
+        caller (parse) → embed queue → `max_workers` embedding threads → upload queue → upload thread
+
+    Both queues are bounded, so at most `max_workers` embedding requests and one upload
+    are in flight and parsing never runs far ahead of the embedding quota. Embeddings are
+    requested `embedding_batch_size` texts at a time and documents are uploaded in chunks
+    of up to `upload_batch_size` (Azure AI Search limit: 1000) while embedding continues.
+
+    `on_batch_done(batch_docs, failed_ids)` is called once per finished batch (uploaded or
+    failed) and is used to persist progress checkpoints.
+
+    Returns:
+        Dict with total documents seen, indexed count, failed count and failed document ids
+    """
+    embedding_batch_size = max(1, int(embedding_batch_size))
+    upload_batch_size = max(1, min(int(upload_batch_size), 1000))
+    max_workers = max(1, int(max_workers))
+
+    embed_queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=max_workers * 2)
+    upload_queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=max_workers * 2)
+    lock = threading.Lock()
+    stats = {"total": 0, "indexed": 0}
+    failed_ids: List[str] = []
+
+    def _embed_worker() -> None:
+        while True:
+            chunk = embed_queue.get()
+            if chunk is None:
+                return
+            try:
+                embeddings = list(create_embeddings_with_dimensions([d["content"] for d in chunk]))
+            except Exception as embed_error:
+                logger.error(f"{log_prefix}: Error embedding batch {chunk[0]['id']}..{chunk[-1]['id']}: {embed_error}", exc_info=True)
+                _fail(chunk)
+                continue
+            if len(embeddings) < len(chunk):
+                # Documents without a vector would be neither indexed nor failed: the checkpoint could never pass them
+                logger.error(f"{log_prefix}: Embedding batch {chunk[0]['id']}..{chunk[-1]['id']} returned {len(embeddings)} vectors for {len(chunk)} texts")
+                _fail(chunk[len(embeddings):])
+                chunk = chunk[:len(embeddings)]
+                if not chunk:
+                    continue
+            upload_queue.put([{**doc, "content_vector": embedding} for doc, embedding in zip(chunk, embeddings)])
+
+    def _notify(batch: List[Dict[str, Any]], batch_failed_ids: List[str]) -> None:
+        if on_batch_done is None:
+            return
         try:
-            excel_path = Path(excel_file_path)
-            
-            # Check for fallback paths (similar to map_invoices_to_base_carbone.py lines 1715-1743)
-            if not excel_path.exists():
-                    error_msg = f"Base Carbone Excel file not found at {excel_file_path} and no fallback available"
-                    print(f"[Base Carbone] ERROR: {error_msg}")
-                    logger.error(error_msg)
-                    return {
-                        "status": "error",
-                        "error": error_msg,
-                    }
-            
-            print(f"[Base Carbone] Starting upload for file {excel_path}")
-            logger.info(f"Base Carbone: Starting upload for file {excel_path}")
-            
-            # Load Excel file using pandas
-            df = pd.read_excel(excel_path, engine='openpyxl', sheet_name='All_Records')
-            
-            if df.empty:
-                error_msg = f"Excel file is empty or sheet 'All_Records' not found in {excel_path}"
-                print(f"[Base Carbone] ERROR: {error_msg}")
-                logger.error(error_msg)
-                return {
-                    "status": "error",
-                    "error": error_msg,
-                }
-            
-            print(f"[Base Carbone] Loaded Excel file with {len(df.columns)} columns, {len(df)} rows")
-            logger.info(f"Base Carbone: Loaded Excel file with {len(df.columns)} columns, {len(df)} rows")
-            
-            # Parse rows and build documents
-            documents: List[Dict[str, Any]] = []
-            count = 0
+            on_batch_done(batch, batch_failed_ids)
+        except Exception as callback_error:
+            logger.error(f"{log_prefix}: Batch progress callback failed: {callback_error}", exc_info=True)
 
-            
-            for idx, row in df.iterrows():
-                # Build payload from row (pandas Series to dict)
-                # Note: Column names are in original case (not lowercased) for mapping
-                payload = row.to_dict()
-                print(f"[Base Carbone] Row {idx+1} - Payload keys: {list(payload.keys())[:5]}...")
-                
-                # Extract fields (matching FactorRecord structure)
-                # Handle identifier separately (can be int or NaN)
-                identifier_val = payload.get("Identifiant de l'élément")
-                if identifier_val is not None:
-                    try:
-                        if pd.notna(identifier_val):
-                            identifier_val = int(float(identifier_val)) if not pd.isna(identifier_val) else None
-                        else:
-                            identifier_val = None
-                    except (ValueError, TypeError):
-                        identifier_val = None
+    def _fail(batch: List[Dict[str, Any]]) -> None:
+        batch_failed_ids = [d["id"] for d in batch]
+        with lock:
+            failed_ids.extend(batch_failed_ids)
+        _notify(batch, batch_failed_ids)
+
+    def _upload(batch: List[Dict[str, Any]]) -> None:
+        # Reading the results can fail too (paged results, transport errors): the whole batch is one unit
+        try:
+            succeeded_ids: Set[str] = set()
+            for item in search_client.upload_documents(documents=batch):
+                if item.succeeded:
+                    succeeded_ids.add(item.key)
                 else:
-                    identifier_val = None
-                
-                record = {
-                    "row_index": int(idx) + 1,  # 1-based (pandas idx is 0-based), matching Base Carbone logic
-                    "identifier": identifier_val,
-                    "status": clean_text(payload.get("Statut de l'élément")),
-                    "name_fr": clean_text(payload.get("Nom base français")),
-                    "name_en": clean_text(payload.get("Nom base anglais")),
-                    "category": clean_text(payload.get("Code de la catégorie")),
-                    "tags_fr": clean_text(payload.get("Tags français")),
-                    "tags_en": clean_text(payload.get("Tags anglais")),
-                    "unit_fr": clean_text(payload.get("Unité français")),
-                    "unit_en": clean_text(payload.get("Unité anglais")),
-                    "contributor": clean_text(payload.get("Contributeur")),
-                    "other_contributors": clean_text(payload.get("Autres Contributeurs")),
-                    "programme": clean_text(payload.get("Programme")),
-                    "source": clean_text(payload.get("Source")),
-                    "url": clean_text(payload.get("Url du programme")),
-                    "location": clean_text(payload.get("Localisation géographique")),
-                    "created_at": parse_excel_datetime(payload.get("Date de création")),
-                    "modified_at": parse_excel_datetime(payload.get("Date de modification")),
-                    "validity": clean_text(payload.get("Période de validité")),
-                    "comments_fr": clean_text(payload.get("Commentaire français")),
-                    "comments_en": clean_text(payload.get("Commentaire anglais")),
-                    "total": safe_float(payload.get("Total poste non décomposé")),
-                    "co2f": safe_float(payload.get("CO2f")),
-                    "ch4f": safe_float(payload.get("CH4f")),
-                    "ch4b": safe_float(payload.get("CH4b")),
-                    "n2o": safe_float(payload.get("N2O")),
-                    "extra_gases": json.dumps([
-                        {
-                            "code": clean_text(payload.get("Code gaz supplémentaire 1")),
-                            "value": safe_float(payload.get("Valeur gaz supplémentaire 1")),
-                        },
-                        {
-                            "code": clean_text(payload.get("Code gaz supplémentaire 2")),
-                            "value": safe_float(payload.get("Valeur gaz supplémentaire 2")),
-                        },
-                        {
-                            "code": clean_text(payload.get("Code gaz supplémentaire 3")),
-                            "value": safe_float(payload.get("Valeur gaz supplémentaire 3")),
-                        },
-                        {
-                            "code": clean_text(payload.get("Code gaz supplémentaire 4")),
-                            "value": safe_float(payload.get("Valeur gaz supplémentaire 4")),
-                        },
-                        {
-                            "code": clean_text(payload.get("Code gaz supplémentaire 5")),
-                            "value": safe_float(payload.get("Valeur gaz supplémentaire 5")),
-                        },
-                    ]),
-                }
+                    logger.warning(f"{log_prefix}: Failed to index document {item.key}: {item.error_message}")
+        except Exception as upload_error:
+            logger.error(f"{log_prefix}: Error uploading batch of {len(batch)} documents: {upload_error}", exc_info=True)
+            _fail(batch)
+            return
+        # Documents without a successful per-document status count as failed
+        batch_failed_ids = [d["id"] for d in batch if d["id"] not in succeeded_ids]
+        with lock:
+            stats["indexed"] += len(batch) - len(batch_failed_ids)
+            failed_ids.extend(batch_failed_ids)
+            indexed = stats["indexed"]
+        logger.info(f"{log_prefix}: Indexed {indexed} documents")
+        _notify(batch, batch_failed_ids)
 
-                # print(f"[Base Carbone] Record: {record}") 
-                # logger.info(f"Base Carbone: Record: {record}")
-                # Build content text for search
-                content_text = build_base_carbone_content_text(record)
-                
-                # Build document for indexing
-                # Keep datetime objects (don't convert to ISO string) - Azure Search SDK will handle serialization
-                doc = {
-                    "content": content_text,
-                    "row_index": record["row_index"],
-                    "identifier": record["identifier"],
-                    "status": record["status"] or "",
-                    "name_fr": record["name_fr"] or "",
-                    "name_en": record["name_en"] or "",
-                    "category": record["category"] or "",
-                    "tags_fr": record["tags_fr"] or "",
-                    "tags_en": record["tags_en"] or "",
-                    "unit_fr": record["unit_fr"] or "",
-                    "unit_en": record["unit_en"] or "",
-                    "contributor": record["contributor"] or "",
-                    "other_contributors": record["other_contributors"] or "",
-                    "programme": record["programme"] or "",
-                    "source": record["source"] or "",
-                    "url": record["url"] or "",
-                    "location": record["location"] or "",
-                    "created_at": record["created_at"],  # Keep as datetime object
-                    "modified_at": record["modified_at"],  # Keep as datetime object
-                    "validity": record["validity"] or "",
-                    "comments_fr": record["comments_fr"] or "",
-                    "comments_en": record["comments_en"] or "",
-                    "total": record["total"],
-                    "co2f": record["co2f"],
-                    "ch4f": record["ch4f"],
-                    "ch4b": record["ch4b"],
-                    "n2o": record["n2o"],
-                    "extra_gases": record["extra_gases"],
-                }
-                
-                # print(f"[Base Carbone] Document: {doc}")
-                # logger.info(f"Base Carbone: Document: {doc}")
+    def _upload_worker() -> None:
+        pending: List[Dict[str, Any]] = []
+        done = False
+        while not done:
+            item = upload_queue.get()
+            if item is None:
+                done = True
+            else:
+                pending.extend(item)
+            while len(pending) >= upload_batch_size or (done and pending):
+                batch = pending[:upload_batch_size]
+                del pending[:upload_batch_size]
+                try:
+                    _upload(batch)
+                except Exception as upload_error:
+                    # Keep draining the queue until None, or the embedding workers block on put()
+                    logger.error(f"{log_prefix}: Upload worker error: {upload_error}", exc_info=True)
+                    _fail(batch)
 
-                documents.append(doc)
-                count += 1
-                
-                if count % 1000 == 0:
-                    print(f"[Base Carbone] Processed {count} factors...")
-                    logger.info(f"Base Carbone: Processed {count} factors")
+    embed_threads = [
+        threading.Thread(target=_embed_worker, name=f"embed-worker-{i}", daemon=True)
+        for i in range(max_workers)
+    ]
+    upload_thread = threading.Thread(target=_upload_worker, name="upload-worker", daemon=True)
+    for thread in embed_threads:
+        thread.start()
+    upload_thread.start()
+
+    try:
+        chunk: List[Dict[str, Any]] = []
+        for doc in documents:
+            stats["total"] += 1
+            chunk.append(doc)
+            if len(chunk) >= embedding_batch_size:
+                embed_queue.put(chunk)
+                chunk = []
+        if chunk:
+            embed_queue.put(chunk)
+    finally:
+        # Drain the pipeline even if parsing failed, so no worker is left blocked
+        for _ in embed_threads:
+            embed_queue.put(None)
+        for thread in embed_threads:
+            thread.join()
+        upload_queue.put(None)
+        upload_thread.join()
+
+    return {
+        "total": stats["total"],
+        "indexed": stats["indexed"],
+        "failed": len(failed_ids),
+        "failed_ids": failed_ids,
+    }
+
+
+def delete_documents_in_batches(
+    search_client: Any,
+    doc_ids: List[str],
+    batch_size: int = SEARCH_UPLOAD_BATCH_SIZE,
+    log_prefix: str = "Base Carbone",
+) -> Tuple[int, List[str]]:
+    """Delete documents by id in chunks of up to 1000. Returns (deleted count, failed ids)."""
+    batch_size = max(1, min(int(batch_size), 1000))
+    deleted = 0
+    failed_ids: List[str] = []
+    for start in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[start:start + batch_size]
+        try:
+            results = search_client.delete_documents(documents=[{"id": doc_id} for doc_id in batch])
+        except Exception as delete_error:
+            failed_ids.extend(batch)
+            logger.error(f"{log_prefix}: Error deleting batch of {len(batch)} documents: {delete_error}", exc_info=True)
+            continue
+        for item in results:
+            if item.succeeded:
+                deleted += 1
+            elif item.status_code == 404:
+                # Already gone from the index: nothing to retry
+                logger.info(f"{log_prefix}: Document {item.key} to delete was not in the index")
+            else:
+                failed_ids.append(item.key)
+                logger.warning(f"{log_prefix}: Failed to delete document {item.key}: {item.error_message}")
+    return deleted, failed_ids
+
+
+# ============================================================
+# INDEX STATE (incremental indexing)
+# ============================================================
+def compute_document_hash(search_doc: Dict[str, Any]) -> str:
+    """
+    Hash the content text and metadata fields of a search document.
+    The id and content_vector are excluded so the hash only changes when the source row does.
+    """
+    payload = {k: v for k, v in search_doc.items() if k not in ("id", "content_vector")}
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def get_index_state_path(index_name: str, kind: str) -> Path:
+    """Path of a local state file for an index, e.g. <state_dir>/sola-rag-index.base_carbone.hashes.json"""
+    return RAG_INDEX_STATE_DIR / f"{sanitize_key(index_name)}.{kind}.json"
+
+
+def load_index_state(path: Path) -> Dict[str, Any]:
+    """Load a JSON state file, returning an empty dict when missing or unreadable."""
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load index state {path}: {e}")
+        return {}
+
+
+def save_index_state(path: Path, data: Dict[str, Any]) -> None:
+    """Write a JSON state file atomically (temp file + rename) so a crash never leaves it truncated."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+_index_versions: Dict[str, Tuple[int, str]] = {}
+
+
+def bump_index_version(index_name: str) -> str:
+    """
+    Record that an index's contents changed (documents uploaded or deleted).
+    Answers cached for the previous version are no longer served (see get_index_version).
+    """
+    version = f"{time.time_ns():x}-{os.getpid():x}"
+    save_index_state(get_index_state_path(index_name, "version"), {
+        "version": version,
+        "updated_at": datetime.now().isoformat(),
+    })
+    if index_name == SOLA_RAG_INDEX_NAME:
+        prune_semantic_answer_cache(version)
+    return version
+
+
+def get_index_version(index_name: str) -> str:
+    """
+    Current content version of an index ("0" if it was never written from this state directory).
+    The version file is only re-read when its mtime changes, so this is a stat() per call; it is only
+    shared with ingestion runs that write to the same RAG_INDEX_STATE_DIR.
+    """
+    path = get_index_state_path(index_name, "version")
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return "0"
+    cached = _index_versions.get(index_name)
+    if cached is None or cached[0] != mtime_ns:
+        cached = (mtime_ns, str(load_index_state(path).get("version", mtime_ns)))
+        _index_versions[index_name] = cached
+        # Another process may have re-indexed: answers of the previous version are not served anymore
+        if index_name == SOLA_RAG_INDEX_NAME:
+            prune_semantic_answer_cache(cached[1])
+    return cached[1]
+
+
+def compute_file_checksum(path: Path) -> str:
+    """sha256 of a file's bytes, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionCheckpoint:
+    """
+    Durable progress of a long indexing run, stored as a local sidecar JSON file.
+
+    Tracks the last committed row index (every row up to it has been uploaded or recorded
+    as failed) and the ids of failed documents. Batches finish out of order when embedding
+    runs concurrently, so the committed row only advances over a contiguous prefix.
+    A resumed run skips committed rows and retries only the failed ones.
+    """
+
+    def __init__(self, path: Path, source_checksum: str, last_committed_row: int = 0,
+                 failed_ids: Optional[Dict[str, int]] = None) -> None:
+        self.path = path
+        self.source_checksum = source_checksum
+        self.last_committed_row = last_committed_row
+        self.failed_ids: Dict[str, int] = dict(failed_ids or {})  # doc_id -> row_index
+        self._done_rows: set = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(
+        cls,
+        index_name: str,
+        source_name: str,
+        source_path: Path,
+        resume: bool,
+        source_checksum: Optional[str] = None,
+    ) -> "IngestionCheckpoint":
+        """
+        Load the checkpoint for this source when resuming (and the source is unchanged), else start fresh.
+        
+        Args:
+            source_checksum: Precomputed compute_file_checksum(source_path), if available
+        """
+        path = get_index_state_path(index_name, f"checkpoint.{sanitize_key(source_name)}")
+        source_checksum = source_checksum or compute_file_checksum(source_path)
+        if resume:
+            state = load_index_state(path)
+            if state and state.get("source_checksum") == source_checksum:
+                return cls(
+                    path,
+                    source_checksum,
+                    last_committed_row=int(state.get("last_committed_row") or 0),
+                    failed_ids={k: int(v) for k, v in (state.get("failed_ids") or {}).items()},
+                )
+            if state:
+                logger.warning(f"Checkpoint {path} belongs to a different version of {source_name}; starting from row 1")
+            else:
+                logger.info(f"No checkpoint found at {path}; starting from row 1")
+        return cls(path, source_checksum)
+
+    def should_process(self, row_index: int, doc_id: str) -> bool:
+        """Rows past the committed row are processed; committed rows only when they failed before."""
+        return row_index > self.last_committed_row or doc_id in self.failed_ids
+
+    def mark_done(self, rows: Iterable[Tuple[int, str]], failed: Iterable[str] = ()) -> None:
+        """Record finished rows as (row_index, doc_id) pairs, with the subset of doc ids that failed."""
+        failed = set(failed)
+        with self._lock:
+            for row_index, doc_id in rows:
+                if doc_id in failed:
+                    self.failed_ids[doc_id] = row_index
+                else:
+                    self.failed_ids.pop(doc_id, None)
+                if row_index > self.last_committed_row:
+                    self._done_rows.add(row_index)
+            while self.last_committed_row + 1 in self._done_rows:
+                self.last_committed_row += 1
+                self._done_rows.discard(self.last_committed_row)
+
+    def save(self) -> None:
+        # Hold the lock while writing: batches complete on several worker threads
+        with self._lock:
+            save_index_state(self.path, {
+                "source_checksum": self.source_checksum,
+                "last_committed_row": self.last_committed_row,
+                "failed_ids": dict(self.failed_ids),
+                "updated_at": datetime.now().isoformat(),
+            })
+
+    def finish(self) -> None:
+        """Remove the checkpoint after a clean run; keep it (failed ids only) when rows still need a retry."""
+        if self.failed_ids:
+            self.save()
+        elif self.path.exists():
+            self.path.unlink()
+
+
+# ============================================================
+# BASE CARBONE SNAPSHOT (Parquet)
+# ============================================================
+def _base_carbone_snapshot_schema():
+    import pyarrow as pa
+    fields = [
+        pa.field("id", pa.string()),
+        pa.field("content", pa.string()),
+        pa.field("row_index", pa.int64()),
+        pa.field("identifier", pa.int64()),
+    ]
+    fields += [pa.field(field, pa.string()) for field in BASE_CARBONE_TEXT_COLUMNS]
+    fields += [pa.field(field, pa.timestamp("us")) for field in BASE_CARBONE_DATE_COLUMNS]
+    fields += [pa.field(field, pa.float64()) for field in BASE_CARBONE_NUMERIC_COLUMNS]
+    fields.append(pa.field("extra_gases", pa.string()))
+    return pa.schema(fields, metadata={"snapshot_version": str(BASE_CARBONE_SNAPSHOT_VERSION)})
+
+
+def get_base_carbone_snapshot_manifest_path() -> Path:
+    return BASE_CARBONE_SNAPSHOT_DIR / "base_carbone.snapshot.json"
+
+
+def open_base_carbone_snapshot(
+    source_checksum: str,
+    chunk_size: int = EXCEL_READ_CHUNK_SIZE,
+) -> Optional[Iterable[List[Dict[str, Any]]]]:
+    """
+    Open the Parquet snapshot of parsed Base Carbone documents if it matches the source file.
+    
+    Args:
+        source_checksum: sha256 of the Base Carbone Excel file (compute_file_checksum)
+        chunk_size: Documents per yielded chunk
+    
+    Returns:
+        Iterator of document chunks (same documents as build_base_carbone_documents),
+        or None if there is no valid snapshot for this source or pyarrow is not installed
+    """
+    manifest = load_index_state(get_base_carbone_snapshot_manifest_path())
+    if (
+        manifest.get("version") != BASE_CARBONE_SNAPSHOT_VERSION
+        or manifest.get("source_checksum") != source_checksum
+    ):
+        return None
+    snapshot_path = BASE_CARBONE_SNAPSHOT_DIR / manifest.get("file", "")
+    if not snapshot_path.is_file() or compute_file_checksum(snapshot_path) != manifest.get("sha256"):
+        logger.warning(f"Base Carbone: Snapshot {snapshot_path} is missing or corrupted, re-parsing Excel")
+        return None
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        logger.info(f"Base Carbone: pyarrow not available ({e}), reading Excel instead of snapshot")
+        return None
+
+    def _iter_chunks():
+        parquet_file = pq.ParquetFile(snapshot_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            documents = batch.to_pylist()
+            # Missing numbers are omitted from documents (Edm.Double doesn't accept None)
+            for doc in documents:
+                for field in BASE_CARBONE_NUMERIC_COLUMNS:
+                    if doc[field] is None:
+                        del doc[field]
+            yield documents
+
+    return _iter_chunks()
+
+
+def write_base_carbone_snapshot(
+    document_chunks: Iterable[List[Dict[str, Any]]],
+    source_checksum: str,
+    source_name: str,
+) -> Iterable[List[Dict[str, Any]]]:
+    """
+    Pass document chunks through while writing them to a new Parquet snapshot.
+    The snapshot and its manifest are only published once every chunk has been consumed;
+    if iteration stops early the partial file is discarded. Without pyarrow chunks pass through unchanged.
+    
+    Args:
+        document_chunks: Chunks of documents from build_base_carbone_documents
+        source_checksum: sha256 of the Excel file the documents were parsed from
+        source_name: Excel file name (informational)
+    
+    Yields:
+        The input chunks, unchanged
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        logger.info(f"Base Carbone: pyarrow not available ({e}), snapshot not written")
+        yield from document_chunks
+        return
+
+    BASE_CARBONE_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    file_name = f"base_carbone.v{BASE_CARBONE_SNAPSHOT_VERSION}.{source_checksum[:16]}.parquet"
+    snapshot_path = BASE_CARBONE_SNAPSHOT_DIR / file_name
+    tmp_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+    schema = _base_carbone_snapshot_schema()
+    rows = 0
+    completed = False
+    writer = pq.ParquetWriter(tmp_path, schema)
+    try:
+        for documents in document_chunks:
+            writer.write_table(pa.Table.from_pylist(documents, schema=schema))
+            rows += len(documents)
+            yield documents
+        completed = True
+    finally:
+        writer.close()
+        if not completed or rows == 0:
+            tmp_path.unlink(missing_ok=True)
+    if rows == 0:
+        return
+
+    os.replace(tmp_path, snapshot_path)
+    save_index_state(get_base_carbone_snapshot_manifest_path(), {
+        "version": BASE_CARBONE_SNAPSHOT_VERSION,
+        "source_checksum": source_checksum,
+        "source_file": source_name,
+        "file": file_name,
+        "sha256": compute_file_checksum(snapshot_path),
+        "rows": rows,
+        "created_at": datetime.now().isoformat(),
+    })
+    # Snapshots of older source files / versions are no longer referenced
+    for old_snapshot in BASE_CARBONE_SNAPSHOT_DIR.glob("base_carbone.v*.parquet"):
+        if old_snapshot != snapshot_path:
+            old_snapshot.unlink(missing_ok=True)
+    logger.info(f"Base Carbone: Wrote snapshot {snapshot_path} ({rows} documents)")
+
+
+def iter_base_carbone_document_chunks(
+    excel_path: Path,
+    streaming: bool = True,
+    chunk_size: int = EXCEL_READ_CHUNK_SIZE,
+    use_snapshot: bool = True,
+    source_checksum: Optional[str] = None,
+) -> Iterable[List[Dict[str, Any]]]:
+    """
+    Yield parsed Base Carbone documents in chunks, from the Parquet snapshot when it matches
+    the Excel file's checksum, otherwise from the Excel file (refreshing the snapshot on the way).
+    
+    Args:
+        excel_path: Path to Base_Carbone_V23.6.xlsx
+        streaming: Read Excel in chunks (openpyxl read-only) instead of one pd.read_excel
+        chunk_size: Rows per chunk
+        use_snapshot: Read/write the Parquet snapshot
+        source_checksum: Precomputed compute_file_checksum(excel_path), if available
+    
+    Yields:
+        Lists of documents (without content_vector)
+    """
+    excel_path = Path(excel_path)
+    if use_snapshot:
+        source_checksum = source_checksum or compute_file_checksum(excel_path)
+        snapshot_chunks = open_base_carbone_snapshot(source_checksum, chunk_size)
+        if snapshot_chunks is not None:
+            logger.info(f"Base Carbone: Loading parsed factors from snapshot (source checksum {source_checksum[:12]})")
+            yield from snapshot_chunks
+            return
+
+    if streaming:
+        frames = iter_excel_chunks(excel_path, sheet_name='All_Records', chunk_size=chunk_size)
+    else:
+        frames = [pd.read_excel(excel_path, engine='openpyxl', sheet_name='All_Records')]
+    document_chunks = (build_base_carbone_documents(frame) for frame in frames if not frame.empty)
+    if use_snapshot:
+        document_chunks = write_base_carbone_snapshot(document_chunks, source_checksum, excel_path.name)
+    yield from document_chunks
+
+
+def load_base_carbone_documents(excel_path: Path, use_snapshot: bool = True) -> List[Dict[str, Any]]:
+    """
+    Load all parsed Base Carbone documents (for local factor lookups and evaluation).
+    Uses the Parquet snapshot when it is current, so the Excel file is only parsed after it changes.
+    """
+    return [doc for chunk in iter_base_carbone_document_chunks(excel_path, use_snapshot=use_snapshot) for doc in chunk]
+
+
+def load_latest_base_carbone_snapshot() -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Load the documents of the most recent Parquet snapshot, without the Excel source file
+    (the snapshot is written by the same ingestion run that fills the index).
+
+    Returns:
+        (manifest, documents), or None if there is no valid snapshot or pyarrow is not installed
+    """
+    manifest = load_index_state(get_base_carbone_snapshot_manifest_path())
+    if not manifest.get("source_checksum"):
+        return None
+    snapshot_chunks = open_base_carbone_snapshot(manifest["source_checksum"])
+    if snapshot_chunks is None:
+        return None
+    return manifest, [doc for chunk in snapshot_chunks for doc in chunk]
+
+
+# ============================================================
+# LOCAL VECTOR INDEX (in-process stand-in for Azure AI Search)
+# ============================================================
+class LocalIndexingResult:
+    """Mirrors azure.search.documents.models.IndexingResult for LocalVectorIndex writes."""
+
+    def __init__(self, key: str, succeeded: bool = True, error_message: Optional[str] = None, status_code: Optional[int] = None) -> None:
+        self.key = key
+        self.succeeded = succeeded
+        self.error_message = error_message
+        self.status_code = status_code or (200 if succeeded else 400)
+
+
+_ODATA_TOKEN_RE = re.compile(r"\s*(?:(\()|(\))|(,)|'((?:[^']|'')*)'|(-?\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z0-9_/.]*))")
+
+
+def _tokenize_odata(expression: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _ODATA_TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Invalid filter expression near: {expression[pos:pos + 20]!r}")
+        lparen, rparen, comma, string, number, word = match.groups()
+        if lparen:
+            tokens.append(("(", None))
+        elif rparen:
+            tokens.append((")", None))
+        elif comma:
+            tokens.append((",", None))
+        elif string is not None:
+            tokens.append(("value", string.replace("''", "'")))
+        elif number is not None:
+            tokens.append(("value", float(number) if "." in number else int(number)))
+        elif word.lower() in ("true", "false"):
+            tokens.append(("value", word.lower() == "true"))
+        elif word.lower() == "null":
+            tokens.append(("value", None))
+        elif word.lower() in ("and", "or", "not", "eq", "ne", "gt", "ge", "lt", "le"):
+            tokens.append((word.lower(), None))
+        else:
+            tokens.append(("field", word))
+        pos = match.end()
+    return tokens
+
+
+class LocalVectorIndex:
+    """
+    In-process replacement for an Azure AI Search index (same subset of the SearchClient API used here:
+    search, upload_documents, merge_or_upload_documents, delete_documents, get_document, get_document_count).
+    
+    Storage (RAG_LOCAL_INDEX_DIR/<index_name>/):
+        vectors.f32     float32 matrix of L2-normalized content_vector rows, memory-mapped read-only
+        documents.json  retrievable fields of each document (row order matches vectors.f32)
+        documents.log   uploads since documents.json was written, one JSON [row, fields] line each
+        meta.json       document count and vector dimensions
+    
+    Uploads write only what changed: new vectors are appended to vectors.f32, replaced ones are
+    overwritten in place and the documents are appended to documents.log, which is folded back into
+    documents.json once it holds more lines than the index has documents (so indexing N documents
+    in batches costs O(N) writes, not O(N^2)). Deletes rewrite the files.
+    
+    Search supports vector k-NN (cosine), keyword search (BM25 over `content`), hybrid search
+    (both, fused with RRF) and OData filters with eq/ne/gt/ge/lt/le combined by and/or/not.
+    Scores follow Azure conventions (vector: 1 / (1 + cosine distance), hybrid: RRF score).
+    
+    Vector search is exact unless an IVF index has been built (build_ann_index, stored as ivf.npz):
+    rows are clustered with spherical k-means and a query only scores the rows of its `nprobe`
+    closest clusters. New or updated rows are assigned to their nearest cluster on write;
+    the clusters are retrained by maybe_build_ann_index once the index has doubled in size.
+    """
+
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+    def __init__(self, path: Path, dimensions: int = EMBEDDING_DIMENSIONS) -> None:
+        self.path = Path(path)
+        self.dimensions = dimensions
+        self.nprobe = RAG_LOCAL_INDEX_NPROBE
+        self._lock = threading.RLock()
+        self._load()
+
+    # ---------- storage ----------
+    def _load(self) -> None:
+        meta = load_index_state(self.path / "meta.json")
+        count = int(meta.get("count", 0))
+        self.dimensions = int(meta.get("dimensions", self.dimensions))
+        documents: List[Dict[str, Any]] = []
+        log_lines = 0
+        log_is_clean = True
+        if count:
+            if (self.path / "documents.json").exists():
+                with open(self.path / "documents.json", "r", encoding="utf-8") as f:
+                    documents = json.load(f)
+            log_path = self.path / "documents.log"
+            if log_path.exists():
+                with open(log_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            position, fields = json.loads(line)
+                        except ValueError:
+                            log_is_clean = False  # Torn last line of an interrupted upload
+                            break
+                        if position < len(documents):
+                            documents[position] = fields
+                        elif position == len(documents):
+                            documents.append(fields)
+                        log_lines += 1
+            # Rows written by an upload that did not get to update meta.json are not part of the index
+            log_is_clean = log_is_clean and len(documents) == count
+            count = min(count, len(documents))
+            del documents[count:]
+        if count:
+            vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r", shape=(count, self.dimensions))
+        else:
+            vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        ivf = None
+        ivf_path = self.path / "ivf.npz"
+        if ivf_path.exists():
+            with np.load(ivf_path) as data:
+                ivf = {key: data[key] for key in data.files}
+            if len(ivf["assignments"]) != count:
+                logger.warning(f"Local index: ignoring stale IVF index at {ivf_path} ({len(ivf['assignments'])} rows, index has {count})")
+                ivf = None
+        self._set_contents(documents, vectors, ivf)
+        self._log_lines = log_lines
+        if not log_is_clean:
+            self._write_documents(documents)
+
+    def _set_contents(self, documents: List[Dict[str, Any]], vectors: np.ndarray, ivf: Optional[Dict[str, np.ndarray]] = None) -> None:
+        self._documents = documents
+        self._positions = {doc["id"]: i for i, doc in enumerate(documents)}
+        self._log_lines = 0
+        self._set_vectors(vectors, ivf)
+
+    def _set_vectors(self, vectors: np.ndarray, ivf: Optional[Dict[str, np.ndarray]] = None) -> None:
+        # Plain ndarray view over the memmap: same pages, without np.memmap's per-operation overhead
+        self._vectors = np.asarray(vectors)
+        self._field_values: Dict[str, np.ndarray] = {}
+        self._filter_masks: Dict[str, np.ndarray] = {}
+        self._keyword_index = None
+        self._ivf = ivf
+        if ivf is not None:
+            # Rows grouped by cluster: rows of cluster c are _ivf_rows[_ivf_offsets[c]:_ivf_offsets[c + 1]]
+            self._ivf_rows = np.argsort(ivf["assignments"], kind="stable")
+            self._ivf_offsets = np.searchsorted(ivf["assignments"][self._ivf_rows], np.arange(len(ivf["centroids"]) + 1))
+
+    @staticmethod
+    def _dump_json(data: Any, f: Any) -> None:
+        json.dump(data, f, ensure_ascii=False, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+    def _write_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """Rewrite documents.json with every document and drop documents.log."""
+        documents_tmp = self.path / "documents.json.tmp"
+        with open(documents_tmp, "w", encoding="utf-8") as f:
+            self._dump_json(documents, f)
+        os.replace(documents_tmp, self.path / "documents.json")
+        (self.path / "documents.log").unlink(missing_ok=True)
+        self._log_lines = 0
+
+    def _save(self, documents: List[Dict[str, Any]], vectors: np.ndarray, assignments: Optional[np.ndarray] = None) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        vectors_tmp = self.path / "vectors.f32.tmp"
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(vectors_tmp)
+        os.replace(vectors_tmp, self.path / "vectors.f32")
+        self._write_documents(documents)
+        ivf = self._ivf_with(assignments)
+        save_index_state(self.path / "meta.json", {"count": len(documents), "dimensions": self.dimensions})
+        if documents:
+            vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r", shape=(len(documents), self.dimensions))
+        self._set_contents(documents, vectors, ivf)
+
+    def _ivf_with(self, assignments: Optional[np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+        """Save the IVF index with new row assignments (or drop it when there are none); returns the new IVF index."""
+        if self._ivf is None:
+            return None
+        if assignments is None:
+            (self.path / "ivf.npz").unlink(missing_ok=True)
+            return None
+        ivf = dict(self._ivf, assignments=assignments.astype(np.int32))
+        self._save_ivf(ivf)
+        return ivf
+
+    def _save_ivf(self, ivf: Dict[str, np.ndarray]) -> None:
+        ivf_tmp = self.path / "ivf.tmp.npz"
+        np.savez(ivf_tmp, **ivf)
+        os.replace(ivf_tmp, self.path / "ivf.npz")
+
+    def reload(self) -> None:
+        """Re-read the index files (after another process rebuilt the index)."""
+        with self._lock:
+            self._load()
+
+    # ---------- writes (SearchClient-compatible) ----------
+    def upload_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[LocalIndexingResult]:
+        """Insert or replace documents (by id); content_vector is required."""
+        with self._lock:
+            count = len(self._documents)
+            rows: Dict[int, np.ndarray] = {}
+            fields_by_row: Dict[int, Dict[str, Any]] = {}
+            new_ids: Dict[str, int] = {}
+            results: List[LocalIndexingResult] = []
+            for doc in documents:
+                doc_id = doc.get("id")
+                vector = doc.get("content_vector")
+                if not doc_id or vector is None or len(vector) != self.dimensions:
+                    results.append(LocalIndexingResult(str(doc_id), False, f"Document needs an id and a {self.dimensions}-d content_vector"))
+                    continue
+                row = np.asarray(vector, dtype=np.float32)
+                norm = float(np.linalg.norm(row))
+                position = self._positions.get(doc_id, new_ids.get(doc_id))
+                if position is None:
+                    position = new_ids[doc_id] = count + len(new_ids)
+                rows[position] = row / norm if norm else row
+                fields_by_row[position] = {key: value for key, value in doc.items() if key != "content_vector"}
+                results.append(LocalIndexingResult(doc_id))
+            if not rows:
+                return results
+            new_count = count + len(new_ids)
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            # Vectors: overwrite replaced rows in place, append new rows after the last indexed row
+            vectors_path = self.path / "vectors.f32"
+            row_bytes = self.dimensions * np.dtype(np.float32).itemsize
+            with open(vectors_path, "r+b" if vectors_path.exists() else "w+b") as f:
+                for position in sorted(rows):
+                    if position < count:
+                        f.seek(position * row_bytes)
+                        f.write(rows[position].tobytes())
+                if new_ids:
+                    f.seek(count * row_bytes)
+                    f.write(np.stack([rows[position] for position in range(count, new_count)]).tobytes())
+                    f.truncate()
+
+            vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(new_count, self.dimensions))
+            assignments = None
+            if self._ivf is not None:
+                assignments = np.zeros(new_count, dtype=np.int32)
+                assignments[:count] = self._ivf["assignments"]
+                touched_rows = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+                assignments[touched_rows] = self._assign_clusters(np.stack([rows[i] for i in touched_rows]), self._ivf["centroids"])
+            ivf = self._ivf_with(assignments)
+            for position, fields in fields_by_row.items():
+                if position < count:
+                    self._documents[position] = fields
+            self._documents.extend(fields_by_row[position] for position in range(count, new_count))
+            self._positions.update(new_ids)
+            self._set_vectors(vectors, ivf)
+
+            # Documents: append to the log, or fold everything into documents.json once the log outgrows it
+            if not count or self._log_lines + len(fields_by_row) > new_count:
+                self._write_documents(self._documents)
+            else:
+                with open(self.path / "documents.log", "a", encoding="utf-8") as f:
+                    for position in sorted(fields_by_row):
+                        self._dump_json([position, fields_by_row[position]], f)
+                        f.write("\n")
+                self._log_lines += len(fields_by_row)
+            save_index_state(self.path / "meta.json", {"count": new_count, "dimensions": self.dimensions})
+            return results
+
+    merge_or_upload_documents = upload_documents
+
+    def delete_documents(self, documents: List[Dict[str, Any]], **kwargs: Any) -> List[LocalIndexingResult]:
+        """Delete documents by id; unknown ids get a failed result with status code 404."""
+        with self._lock:
+            results: List[LocalIndexingResult] = []
+            delete_rows: List[int] = []
+            for doc in documents:
+                position = self._positions.get(doc["id"])
+                if position is None:
+                    results.append(LocalIndexingResult(doc["id"], False, f"Document {doc['id']} not found", 404))
+                    continue
+                delete_rows.append(position)
+                results.append(LocalIndexingResult(doc["id"]))
+            if not delete_rows:
+                return results
+            keep = np.ones(len(self._documents), dtype=bool)
+            keep[delete_rows] = False
+            assignments = self._ivf["assignments"][keep] if self._ivf is not None else None
+            self._save([doc for doc, kept in zip(self._documents, keep) if kept], self._vectors[keep], assignments)
+            return results
+
+    # ---------- reads ----------
+    def get_document_count(self) -> int:
+        return len(self._documents)
+
+    def get_document(self, key: str, selected_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        position = self._positions.get(key)
+        if position is None:
+            raise KeyError(f"Document {key} not found")
+        return self._project(position, selected_fields)
+
+    def search(
+        self,
+        search_text: Optional[str] = None,
+        *,
+        vector_queries: Optional[List[Any]] = None,
+        filter: Optional[str] = None,
+        select: Optional[List[str]] = None,
+        top: Optional[int] = None,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search like SearchClient.search: vector k-NN when vector_queries are given, keyword (BM25) search
+        when search_text is given ("*" or empty text = all documents), hybrid search (RRF) when both are.
+        With debug="vector" (or "all"), hybrid hits carry "@search.document_debug_info" with the keyword
+        and vector subscores, as Azure AI Search returns them.
+        
+        Returns:
+            List of result dicts (selected fields + "@search.score"), best first
+        """
+        documents = self._documents
+        mask = self._filter_mask(filter) if filter else None
+        text = (search_text or "").strip()
+        if text == "*":
+            text = ""
+
+        if vector_queries:
+            query = vector_queries[0]
+            k = int(getattr(query, "k_nearest_neighbors", None) or top or 50)
+            limit = min(k, top) if top else k
+            hits = self._vector_hits(
+                query.vector,
+                k if text else limit,
+                mask,
+                exhaustive=bool(getattr(query, "exhaustive", False)),
+                nprobe=kwargs.get("nprobe"),
+            )
+            if not text:
+                # Azure cosine scoring: 1 / (1 + distance), distance = 1 - cosine similarity
+                return [self._project(i, select, 1.0 / (2.0 - similarity)) for i, similarity in hits]
+            # Hybrid: fuse keyword and vector rankings with RRF, as Azure AI Search does
+            keyword_hits = self._keyword_hits(text, max(k, top or 50), mask)
+            fused: Dict[int, float] = {}
+            for ranking in (keyword_hits, hits):
+                for rank, (i, _) in enumerate(ranking, start=1):
+                    fused[i] = fused.get(i, 0.0) + 1.0 / (RAG_HYBRID_RRF_K + rank)
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top or 50]
+            results = [self._project(i, select, score) for i, score in ranked]
+            if kwargs.get("debug") in ("vector", "all"):
+                keyword_scores, vector_scores = dict(keyword_hits), dict(hits)
+                for (i, _), result in zip(ranked, results):
+                    result["@search.document_debug_info"] = self._debug_info(
+                        keyword_scores.get(i), vector_scores.get(i), getattr(query, "fields", None) or "content_vector"
+                    )
+            return results
+
+        limit = top or 50
+        if not text:
+            positions = np.flatnonzero(mask) if mask is not None else np.arange(len(documents))
+            return [self._project(i, select, 1.0) for i in positions[:limit]]
+        return [self._project(i, select, score) for i, score in self._keyword_hits(text, limit, mask)]
+
+    def _keyword_hits(self, text: str, limit: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top `limit` (row position, BM25 score) pairs for a text query, best first."""
+        scores = self._bm25_scores(text)
+        if mask is not None:
+            scores = np.where(mask, scores, 0.0)
+        return [(i, float(scores[i])) for i in self._top_positions(scores, limit) if scores[i] > 0]
+
+    def _vector_hits(
+        self,
+        vector: List[float],
+        limit: int,
+        mask: Optional[np.ndarray] = None,
+        exhaustive: bool = False,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[int, float]]:
+        """Top `limit` (row position, cosine similarity) pairs for a query vector, best first."""
+        query_vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query_vector))
+        if norm:
+            query_vector = query_vector / norm
+        vectors = self._vectors
+        candidates = None
+        if self._ivf is not None and not exhaustive:
+            candidates = self._probe_clusters(query_vector, nprobe or self.nprobe)
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+                if len(candidates) < limit:
+                    # Selective filter: the probed clusters hold too few matches, scan all matching rows
+                    candidates = np.flatnonzero(mask)
+        elif mask is not None:
+            # Score only the rows that pass the filter
+            candidates = np.flatnonzero(mask)
+        if candidates is None:
+            scores = vectors @ query_vector if len(vectors) else np.zeros(0, dtype=np.float32)
+            return [(i, float(scores[i])) for i in self._top_positions(scores, limit)]
+        scores = vectors[candidates] @ query_vector
+        return [(int(candidates[i]), float(scores[i])) for i in self._top_positions(scores, limit)]
+
+    # ---------- IVF (approximate nearest neighbours) ----------
+    def _probe_clusters(self, query_vector: np.ndarray, nprobe: int) -> np.ndarray:
+        centroid_scores = self._ivf["centroids"] @ query_vector
+        clusters = self._top_positions(centroid_scores, min(nprobe, len(centroid_scores)))
+        offsets, rows = self._ivf_offsets, self._ivf_rows
+        return np.concatenate([rows[offsets[c]:offsets[c + 1]] for c in clusters])
+
+    @staticmethod
+    def _assign_clusters(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            assignments[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        return assignments
+
+    def build_ann_index(self, nlist: Optional[int] = None, iterations: int = 10, sample_size: Optional[int] = None, seed: int = 0) -> Dict[str, Any]:
+        """
+        Build (or rebuild) the IVF index: spherical k-means over a sample of the vectors, then assign every row.
+        
+        Args:
+            nlist: Number of clusters (default: RAG_LOCAL_INDEX_NLIST or 4 * sqrt(document count))
+            iterations: k-means iterations
+            sample_size: Training rows (default: 64 per cluster)
+            seed: Random seed (same data + seed = same index)
+        
+        Returns:
+            Dict with nlist, count, training rows, cluster size stats, build seconds
+        """
+        with self._lock:
+            start = time.time()
+            vectors = self._vectors
+            count = len(vectors)
+            if not count:
+                raise ValueError("Cannot build an IVF index over an empty index")
+            nlist = int(nlist or RAG_LOCAL_INDEX_NLIST or max(1, round(4 * math.sqrt(count))))
+            nlist = min(nlist, count)
+            rng = np.random.default_rng(seed)
+            sample_size = min(count, sample_size or 64 * nlist)
+            sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))], dtype=np.float32)
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = self._assign_clusters(sample, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                sizes = np.bincount(labels, minlength=nlist)
+                empty = np.flatnonzero(sizes == 0)
+                # Re-seed empty clusters with random training rows
+                sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)] if len(empty) else sums[empty]
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                centroids = (sums / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+            assignments = self._assign_clusters(vectors, centroids)
+            ivf = {"centroids": centroids, "assignments": assignments, "trained_count": np.array(count)}
+            self._save_ivf(ivf)
+            self._set_vectors(vectors, ivf)
+            sizes = np.bincount(assignments, minlength=nlist)
+            stats = {
+                "nlist": nlist,
+                "count": count,
+                "training_rows": sample_size,
+                "largest_cluster": int(sizes.max()),
+                "empty_clusters": int((sizes == 0).sum()),
+                "seconds": round(time.time() - start, 2),
+            }
+            logger.info(f"SOLA RAG: Built IVF index for {self.path.name}: {stats}")
+            return stats
+
+    def maybe_build_ann_index(self) -> Optional[Dict[str, Any]]:
+        """Build the IVF index when RAG_LOCAL_INDEX_ANN is "ivf" and it is missing or trained on less than half the rows."""
+        if RAG_LOCAL_INDEX_ANN != "ivf" or self.get_document_count() < RAG_LOCAL_INDEX_ANN_MIN_DOCS:
+            return None
+        if self._ivf is not None and 2 * int(self._ivf["trained_count"]) >= self.get_document_count():
+            return None
+        return self.build_ann_index()
+
+    def ann_recall_report(self, k: int = 30, nprobe_values: Iterable[int] = (1, 2, 4, 8, 16, 32, 64), queries: int = 200, seed: int = 0) -> Dict[str, Any]:
+        """
+        Measure recall@k and latency of IVF search against exact search.
+        
+        Queries are stored vectors (sampled with `seed`); recall@k is the fraction of the exact top-k found.
+        
+        Returns:
+            Dict with exact_ms (median exact query latency) and rows: [{nprobe, recall, ms, scanned}]
+        """
+        if self._ivf is None:
+            raise ValueError("No IVF index: call build_ann_index() first")
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(self._vectors[rng.choice(len(self._vectors), min(queries, len(self._vectors)), replace=False)])
+        exact, exact_times = [], []
+        for query_vector in sample:
+            start = time.perf_counter()
+            exact.append({i for i, _ in self._vector_hits(query_vector, k, exhaustive=True)})
+            exact_times.append(time.perf_counter() - start)
+        report: Dict[str, Any] = {"k": k, "count": len(self._vectors), "nlist": len(self._ivf["centroids"]), "exact_ms": round(float(np.median(exact_times)) * 1000, 3), "rows": []}
+        for nprobe in nprobe_values:
+            recalls, times, scanned = [], [], []
+            for query_vector, expected in zip(sample, exact):
+                start = time.perf_counter()
+                found = {i for i, _ in self._vector_hits(query_vector, k, nprobe=nprobe)}
+                times.append(time.perf_counter() - start)
+                recalls.append(len(found & expected) / len(expected))
+                scanned.append(len(self._probe_clusters(query_vector, nprobe)))
+            row = {
+                "nprobe": nprobe,
+                "recall": round(float(np.mean(recalls)), 4),
+                "ms": round(float(np.median(times)) * 1000, 3),
+                "scanned": int(np.mean(scanned)),
+            }
+            report["rows"].append(row)
+        logger.info(f"SOLA RAG: IVF recall report for {self.path.name}: {report}")
+        return report
+
+    @staticmethod
+    def _top_positions(scores: np.ndarray, limit: int) -> List[int]:
+        if limit <= 0:
+            return []
+        if len(scores) > limit:
+            candidates = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")].tolist()
+
+    @staticmethod
+    def _debug_info(keyword_score: Optional[float], similarity: Optional[float], vector_field: str) -> Any:
+        """Hybrid hit subscores as an Azure DocumentDebugInfo (a subquery that didn't return the hit has none)"""
+        from azure.search.documents.models import DocumentDebugInfo
+        subscores: Dict[str, Any] = {}
+        if keyword_score is not None:
+            subscores["text"] = {"searchScore": keyword_score}
+        if similarity is not None:
+            subscores["vectors"] = [{vector_field: {"searchScore": 1.0 / (2.0 - similarity), "vectorSimilarity": similarity}}]
+        return DocumentDebugInfo({"vectors": {"subscores": subscores}})
+
+    def _project(self, position: int, select: Optional[List[str]], score: Optional[float] = None) -> Dict[str, Any]:
+        doc = self._documents[position]
+        result = {field: doc.get(field) for field in select} if select else dict(doc)
+        if select and "content_vector" in select:
+            # Only when selected, as for Azure's retrievable vector field (stored L2-normalized here)
+            result["content_vector"] = self._vectors[position].tolist()
+        if score is not None:
+            result["@search.score"] = score
+        return result
+
+    # ---------- keyword search ----------
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        return re.findall(r"\w+", text.lower())
+
+    def _bm25_scores(self, text: str) -> np.ndarray:
+        with self._lock:
+            if self._keyword_index is None:
+                self._keyword_index = self._build_keyword_index()
+            postings = self._keyword_index
+        scores = np.zeros(len(self._documents), dtype=np.float64)
+        for token in set(self._tokenize(text)):
+            if token in postings:
+                doc_ids, weights = postings[token]
+                scores[doc_ids] += weights
+        return scores
+
+    def _build_keyword_index(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Postings per token: (document positions, BM25 term weights), precomputed since they do not depend on the query."""
+        token_docs: Dict[str, List[int]] = {}
+        token_tfs: Dict[str, List[int]] = {}
+        doc_lengths = np.zeros(len(self._documents), dtype=np.float64)
+        for i, doc in enumerate(self._documents):
+            tokens = self._tokenize(doc.get("content") or "")
+            doc_lengths[i] = len(tokens)
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                token_docs.setdefault(token, []).append(i)
+                token_tfs.setdefault(token, []).append(count)
+        average_length = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        length_norm = self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * doc_lengths / (average_length or 1.0))
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for token, doc_ids in token_docs.items():
+            doc_ids = np.asarray(doc_ids, dtype=np.int64)
+            tf = np.asarray(token_tfs[token], dtype=np.float64)
+            idf = math.log(1 + (len(doc_lengths) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            postings[token] = (doc_ids, idf * tf * (self.BM25_K1 + 1) / (tf + length_norm[doc_ids]))
+        return postings
+
+    # ---------- OData filters ----------
+    def _filter_mask(self, expression: str) -> np.ndarray:
+        mask = self._filter_masks.get(expression)
+        if mask is None:
+            tokens = _tokenize_odata(expression)
+            mask, pos = self._parse_or(tokens, 0)
+            if pos != len(tokens):
+                raise ValueError(f"Invalid filter expression: {expression!r}")
+            # search.in lists are usually document keys of one lookup: not worth caching
+            if "search.in" not in expression:
+                with self._lock:
+                    self._filter_masks[expression] = mask
+        return mask
+
+    def _parse_or(self, tokens: List[Tuple[str, Any]], pos: int) -> Tuple[np.ndarray, int]:
+        mask, pos = self._parse_and(tokens, pos)
+        while pos < len(tokens) and tokens[pos][0] == "or":
+            right, pos = self._parse_and(tokens, pos + 1)
+            mask = mask | right
+        return mask, pos
+
+    def _parse_and(self, tokens: List[Tuple[str, Any]], pos: int) -> Tuple[np.ndarray, int]:
+        mask, pos = self._parse_not(tokens, pos)
+        while pos < len(tokens) and tokens[pos][0] == "and":
+            right, pos = self._parse_not(tokens, pos + 1)
+            mask = mask & right
+        return mask, pos
+
+    def _parse_not(self, tokens: List[Tuple[str, Any]], pos: int) -> Tuple[np.ndarray, int]:
+        if pos < len(tokens) and tokens[pos][0] == "not":
+            mask, pos = self._parse_not(tokens, pos + 1)
+            return ~mask, pos
+        if pos < len(tokens) and tokens[pos][0] == "(":
+            mask, pos = self._parse_or(tokens, pos + 1)
+            if pos >= len(tokens) or tokens[pos][0] != ")":
+                raise ValueError("Unbalanced parentheses in filter expression")
+            return mask, pos + 1
+        if pos < len(tokens) and tokens[pos] == ("field", "search.in"):
+            return self._parse_search_in(tokens, pos + 1)
+        if pos + 2 < len(tokens) and tokens[pos][0] == "field" and tokens[pos + 2][0] == "value":
+            field, op, value = tokens[pos][1], tokens[pos + 1][0], tokens[pos + 2][1]
+            return self._compare(field, op, value), pos + 3
+        raise ValueError("Expected a comparison like \"field eq 'value'\" in filter expression")
+
+    def _parse_search_in(self, tokens: List[Tuple[str, Any]], pos: int) -> Tuple[np.ndarray, int]:
+        """search.in(field, 'v1,v2,...'[, 'delimiters']): field equals one of the listed strings."""
+        arguments: List[Tuple[str, Any]] = []
+        if pos >= len(tokens) or tokens[pos][0] != "(":
+            raise ValueError("Expected \"(\" after search.in")
+        pos += 1
+        while pos < len(tokens) and tokens[pos][0] != ")":
+            if tokens[pos][0] != ",":
+                arguments.append(tokens[pos])
+            pos += 1
+        if pos >= len(tokens) or len(arguments) not in (2, 3) or arguments[0][0] != "field":
+            raise ValueError("Expected search.in(field, 'values'[, 'delimiters']) in filter expression")
+        field, values = arguments[0][1], str(arguments[1][1])
+        delimiters = str(arguments[2][1]) if len(arguments) == 3 else " ,"
+        wanted = {value for value in re.split("[" + re.escape(delimiters) + "]", values) if value}
+        if field == "id":
+            mask = np.zeros(len(self._documents), dtype=bool)
+            mask[[self._positions[key] for key in wanted if key in self._positions]] = True
+        else:
+            mask = np.array([value in wanted for value in self._field_column(field)], dtype=bool)
+        return mask, pos + 1
+
+    def _field_column(self, field: str) -> np.ndarray:
+        values = self._field_values.get(field)
+        if values is None:
+            values = np.empty(len(self._documents), dtype=object)
+            values[:] = [doc.get(field) for doc in self._documents]
+            self._field_values[field] = values
+        return values
+
+    def _compare(self, field: str, op: str, value: Any) -> np.ndarray:
+        values = self._field_column(field)
+        if op == "eq":
+            return np.array([v == value for v in values], dtype=bool)
+        if op == "ne":
+            return np.array([v != value for v in values], dtype=bool)
+        compare = {
+            "gt": lambda a, b: a > b,
+            "ge": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b,
+            "le": lambda a, b: a <= b,
+        }.get(op)
+        if compare is None or value is None:
+            raise ValueError(f"Unsupported filter comparison: {field} {op} {value!r}")
+        return np.array([v is not None and compare(v, value) for v in values], dtype=bool)
+
+
+_local_indexes: Dict[str, LocalVectorIndex] = {}
+_local_indexes_lock = threading.Lock()
+
+
+def get_local_vector_index(index_name: str = SOLA_RAG_INDEX_NAME) -> LocalVectorIndex:
+    """Get the process-wide LocalVectorIndex for an index name (loaded once, then shared)."""
+    with _local_indexes_lock:
+        index = _local_indexes.get(index_name)
+        if index is None:
+            index = LocalVectorIndex(RAG_LOCAL_INDEX_DIR / sanitize_key(index_name))
+            _local_indexes[index_name] = index
+        return index
+
+
+# Process-wide Azure AI Search clients, one per endpoint and index. SearchClient is safe for concurrent
+# use, and every client sends through one pooled keep-alive session, so chat requests, export workers
+# and ingestion reuse warm connections instead of opening a connection pool (and TLS handshake) each time.
+_search_transport = None
+_search_clients: Dict[Tuple[str, str], SearchClient] = {}
+_search_clients_lock = threading.Lock()
+
+
+def get_search_transport():
+    """Get the shared azure-core transport (pooled requests session) used by every SearchClient in this process."""
+    global _search_transport
+    if _search_transport is None:
+        with _search_clients_lock:
+            if _search_transport is None:
+                import requests
+                from azure.core.pipeline.transport import RequestsTransport
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=RAG_SEARCH_MAX_CONNECTIONS,
+                    pool_maxsize=RAG_SEARCH_MAX_CONNECTIONS,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                # session_owner=False: closing one client must not close the session the others use
+                _search_transport = RequestsTransport(
+                    session=session,
+                    session_owner=False,
+                    connection_timeout=RAG_SEARCH_CONNECT_TIMEOUT,
+                    read_timeout=RAG_SEARCH_READ_TIMEOUT,
+                )
+    return _search_transport
+
+
+def get_search_client(
+    index_name: str = SOLA_RAG_INDEX_NAME,
+    endpoint: str = AZURE_SEARCH_ENDPOINT,
+    api_key: str = AZURE_SEARCH_KEY,
+) -> Any:
+    """
+    Get the shared search client for an index according to RAG_SEARCH_BACKEND (thread-safe).
+    
+    Returns:
+        azure.search.documents.SearchClient ("azure") or LocalVectorIndex ("local")
+    """
+    if RAG_SEARCH_BACKEND == "local":
+        return get_local_vector_index(index_name)
+    key = (endpoint.rstrip("/"), index_name)
+    client = _search_clients.get(key)
+    if client is None:
+        transport = get_search_transport()
+        with _search_clients_lock:
+            client = _search_clients.get(key)
+            if client is None:
+                client = SearchClient(
+                    endpoint=key[0],
+                    index_name=index_name,
+                    credential=AzureKeyCredential(api_key),
+                    transport=transport,
+                )
+                _search_clients[key] = client
+    return client
+
+
+# Async search clients (SolaRagChat.achat). An aio SearchClient's aiohttp session belongs to the event loop
+# that opened it, so AzureSearch's single async_client breaks on the next loop ("attached to a different
+# loop", "Event loop is closed"): each running loop gets its own clients instead (closed by aclose_async_clients).
+_async_search_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_search_client(
+    index_name: str = SOLA_RAG_INDEX_NAME,
+    endpoint: str = AZURE_SEARCH_ENDPOINT,
+    api_key: str = AZURE_SEARCH_KEY,
+) -> Any:
+    """
+    Get the async search client of the running event loop for an index.
+    Must be called from a coroutine.
+    
+    Returns:
+        azure.search.documents.aio.SearchClient instance
+    """
+    loop = asyncio.get_running_loop()
+    key = (endpoint.rstrip("/"), index_name)
+    with _search_clients_lock:
+        clients = _async_search_clients.get(loop)
+        if clients is None:
+            clients = _async_search_clients[loop] = {}
+        client = clients.get(key)
+        if client is None:
+            from azure.search.documents.aio import SearchClient as AsyncSearchClient
+            client = clients[key] = AsyncSearchClient(
+                endpoint=key[0],
+                index_name=index_name,
+                credential=AzureKeyCredential(api_key),
+            )
+    return client
+
+
+def search_result_to_document(result: Dict[str, Any]) -> Document:
+    """
+    Document for an Azure AI Search hit of an AzureSearch index, as AzureSearch builds it: the metadata
+    field (JSON string or dict) plus the id, or every other non-vector field when there is no metadata field.
+    """
+    metadata = result.get("metadata")
+    if metadata is None:
+        metadata = {key: value for key, value in result.items() if key not in ("content", "content_vector")}
+    elif isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    if "id" in result:
+        metadata = {"id": result["id"], **metadata}
+    return Document(page_content=result.get("content") or "", metadata=metadata)
+
+
+async def asearch_vector_store(
+    vector_store: VectorStore,
+    query: str,
+    k: int,
+    filters: Optional[str] = None,
+    index_name: str = SOLA_RAG_INDEX_NAME,
+) -> List[Tuple[Document, float]]:
+    """
+    asimilarity_search_with_score that is safe across event loops.
+    
+    AzureSearch vector and hybrid searches go through get_async_search_client (same query, Documents
+    and scores as AzureSearch); other stores use their own asimilarity_search_with_score.
+    
+    Returns:
+        List of (Document, score) tuples
+    """
+    search_type = getattr(vector_store, "search_type", None)
+    if not isinstance(vector_store, AzureSearch) or search_type not in ("similarity", "hybrid"):
+        return await vector_store.asimilarity_search_with_score(query, k=k, filters=filters)
+    from azure.search.documents.models import VectorizedQuery
+    if vector_store.embeddings:
+        vector = await vector_store.embeddings.aembed_query(query)
+    else:
+        vector = await asyncio.to_thread(vector_store.embedding_function, query)
+    results = await get_async_search_client(index_name).search(
+        search_text=query if search_type == "hybrid" else "",
+        vector_queries=[VectorizedQuery(vector=vector, k_nearest_neighbors=k, fields="content_vector")],
+        filter=filters,
+        top=k,
+    )
+    return [(search_result_to_document(result), float(result["@search.score"])) async for result in results]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain VectorStore over LocalVectorIndex (same Documents and scores as AzureSearch).
+    
+    Like AzureSearch, searches are hybrid (keyword + vector, RRF scores) unless search_type is
+    "similarity" (vector only, cosine scores), set on the store or passed per search.
+    """
+
+    SEARCH_TYPES = ("similarity", "hybrid")
+
+    def __init__(
+        self,
+        index: LocalVectorIndex,
+        embedding_function: Union[Embeddings, Callable[[str], List[float]]],
+        search_type: str = "hybrid",
+    ) -> None:
+        if search_type not in self.SEARCH_TYPES:
+            raise ValueError(f"search_type of {search_type} not allowed.")
+        self.index = index
+        self.embedding_function = embedding_function
+        self.search_type = search_type
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function if isinstance(self.embedding_function, Embeddings) else None
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = ids or [sanitize_key(hashlib.sha256(text.encode("utf-8")).hexdigest()) for text in texts]
+        vectors = create_embeddings_with_dimensions(texts)
+        documents = [
+            {"id": doc_id, "content": text, "content_vector": vector, **((metadatas or [{}] * len(texts))[i] or {})}
+            for i, (doc_id, text, vector) in enumerate(zip(ids, texts, vectors))
+        ]
+        self.index.upload_documents(documents)
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Any,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        index_name: str = SOLA_RAG_INDEX_NAME,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(get_local_vector_index(index_name), embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filters: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        # AzureSearch accepts the filter as `filters` or `filter`
+        filter_expression = kwargs.pop("filter", None) or filters
+        search_text = self._search_text(query, kwargs.get("search_type"))
+        vector = self.embeddings.embed_query(query) if self.embeddings else self.embedding_function(query)
+        return self._search_by_vector(vector, k, filter_expression, search_text)
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filters: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Embed with the async client, then search the in-process index in a worker thread."""
+        filter_expression = kwargs.pop("filter", None) or filters
+        search_text = self._search_text(query, kwargs.get("search_type"))
+        if self.embeddings:
+            vector = await self.embeddings.aembed_query(query)
+        else:
+            vector = await asyncio.to_thread(self.embedding_function, query)
+        return await asyncio.to_thread(self._search_by_vector, vector, k, filter_expression, search_text)
+
+    def _search_text(self, query: str, search_type: Optional[str]) -> Optional[str]:
+        """Keyword half of the search: the query for hybrid search, None for vector-only search."""
+        search_type = search_type or self.search_type
+        if search_type not in self.SEARCH_TYPES:
+            raise ValueError(f"search_type of {search_type} not allowed.")
+        return query if search_type == "hybrid" else None
+
+    def _search_by_vector(
+        self,
+        vector: List[float],
+        k: int,
+        filter_expression: Optional[str],
+        search_text: Optional[str] = None,
+    ) -> List[Tuple[Document, float]]:
+        from azure.search.documents.models import VectorizedQuery
+        vector_query = VectorizedQuery(vector=vector, k_nearest_neighbors=k, fields="content_vector")
+        results = self.index.search(search_text=search_text, vector_queries=[vector_query], filter=filter_expression, top=k)
+        return [
+            (Document(page_content=result.get("content") or "", metadata=result), float(result["@search.score"]))
+            for result in results
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda score: score
+
+
+# ============================================================
+# BASE CARBONE EXCEL PROCESSOR
+# ============================================================
+class BaseCarboneExcelProcessor:
+    """Process Base Carbone Excel file: Parse → Embedding → Indexing to Azure AI Search"""
+    
+    def upload_base_carbone_excel(
+        self,
+        excel_file_path: str,
+        filename: Optional[str] = None,
+        embedding_batch_size: int = EMBEDDING_BATCH_SIZE,
+        upload_batch_size: int = SEARCH_UPLOAD_BATCH_SIZE,
+        max_workers: int = EMBEDDING_MAX_WORKERS,
+        incremental: bool = False,
+        resume: bool = False,
+        streaming: bool = True,
+        chunk_size: int = EXCEL_READ_CHUNK_SIZE,
+        use_snapshot: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Ingest Base_Carbone_V23.6.xlsx and index into Azure AI Search.
+        Logic follows map_invoices_to_base_carbone.py but uses Azure AI Search instead of local files.
+        
+        Args:
+            excel_file_path: Path to Base_Carbone_V23.6.xlsx file
+            filename: Optional filename (defaults to excel_file_path basename)
+            embedding_batch_size: Number of texts sent per embeddings request
+            upload_batch_size: Number of documents per Azure AI Search upload (max 1000)
+            max_workers: Number of concurrent embedding requests in flight
+            incremental: Only re-embed and upsert rows whose content hash changed since the
+                last run, and delete documents for rows that disappeared
+            resume: Continue from the last checkpoint of an interrupted run on the same file,
+                retrying only rows that failed
+            streaming: Read the sheet in chunks (openpyxl read-only) so embedding starts on the
+                first chunk; False loads the whole sheet with pandas first
+            chunk_size: Rows per chunk in streaming mode
+            use_snapshot: Load parsed factors from the Parquet snapshot when the Excel checksum
+                matches (and refresh the snapshot when it doesn't)
+        
+        Returns:
+            Dict with status, file info, and indexing results
+        """
+        try:
+            excel_path = Path(excel_file_path)
             
-            print(f"[Base Carbone] Created {len(documents)} documents for indexing")
-            logger.info(f"Base Carbone: Created {len(documents)} documents for indexing")
+            # Check for fallback paths (similar to map_invoices_to_base_carbone.py lines 1715-1743)
+            if not excel_path.exists():
+                    error_msg = f"Base Carbone Excel file not found at {excel_file_path} and no fallback available"
+                    print(f"[Base Carbone] ERROR: {error_msg}")
+                    logger.error(error_msg)
+                    return {
+                        "status": "error",
+                        "error": error_msg,
+                    }
             
-            # Validate minimum count (similar to map_invoices_to_base_carbone.py line 1730)
-            if len(documents) < 50:
-                warning_msg = f"⚠️ Only {len(documents)} factors loaded. Expected ~11,216 factors from Base Carbone v23.6."
-                print(f"[Base Carbone] WARNING: {warning_msg}")
-                logger.warning(warning_msg)
+            print(f"[Base Carbone] Starting upload for file {excel_path}")
+            logger.info(f"Base Carbone: Starting upload for file {excel_path}")
+            
+            # Parsed documents in chunks: from the Parquet snapshot, or from Excel (streamed or full read)
+            source_checksum = compute_file_checksum(excel_path)
+            document_chunks = iter(iter_base_carbone_document_chunks(
+                excel_path,
+                streaming=streaming,
+                chunk_size=chunk_size,
+                use_snapshot=use_snapshot,
+                source_checksum=source_checksum,
+            ))
+            parse_start = time.perf_counter()
+            first_chunk = next(document_chunks, None)
+            parse_seconds = time.perf_counter() - parse_start
+            
+            if not first_chunk:
+                error_msg = f"Excel file is empty or sheet 'All_Records' not found in {excel_path}"
+                print(f"[Base Carbone] ERROR: {error_msg}")
+                logger.error(error_msg)
+                return {
+                    "status": "error",
+                    "error": error_msg,
+                }
+            
+            # Each chunk feeds the pipeline as soon as it is loaded
+            def _iter_documents():
+                nonlocal parse_seconds
+                yield from first_chunk
+                while True:
+                    parse_start = time.perf_counter()
+                    chunk_documents = next(document_chunks, None)
+                    parse_seconds += time.perf_counter() - parse_start
+                    if chunk_documents is None:
+                        return
+                    yield from chunk_documents
             
-            # Process từng row: Build document → Generate embedding → Index
-            print(f"[Base Carbone] Processing {len(documents)} rows sequentially (row → embedding → index)...")
-            logger.info(f"Base Carbone: Processing {len(documents)} rows sequentially")
+            # Pipelined indexing: Documents → Embedding workers (batched) → Upload stage (batched)
+            print(f"[Base Carbone] Processing rows through ingestion pipeline (embedding batch={embedding_batch_size}, upload batch={upload_batch_size}, workers={max_workers})...")
+            logger.info(f"Base Carbone: Processing rows through ingestion pipeline (embedding batch={embedding_batch_size}, upload batch={upload_batch_size}, workers={max_workers})")
             
             index_name = SOLA_RAG_INDEX_NAME
-            total_indexed = 0
-            total_failed = 0
             
-            # Initialize search client
-            from azure.core.credentials import AzureKeyCredential
-            from azure.search.documents import SearchClient
+            # Initialize search client (Azure AI Search or local index, per RAG_SEARCH_BACKEND)
+            search_client = get_search_client(index_name)
             
-            search_client = SearchClient(
-                endpoint=AZURE_SEARCH_ENDPOINT,
-                index_name=index_name,
-                credential=AzureKeyCredential(AZURE_SEARCH_KEY),
+            # Content hashes of what is currently in the index (from the previous run)
+            hashes_path = get_index_state_path(index_name, "base_carbone.hashes")
+            previous_hashes: Dict[str, str] = load_index_state(hashes_path)
+            current_hashes: Dict[str, str] = {}
+            skipped_unchanged = 0
+            
+            # Progress checkpoint (last committed row + failed ids) for crash/resume
+            checkpoint = IngestionCheckpoint.open(
+                index_name, filename or excel_path.name, excel_path, resume, source_checksum=source_checksum
             )
+            resumed_from_row = checkpoint.last_committed_row
+            if resume and resumed_from_row:
+                print(f"[Base Carbone] Resuming after row {resumed_from_row} ({len(checkpoint.failed_ids)} failed rows to retry)")
+                logger.info(f"Base Carbone: Resuming after row {resumed_from_row} ({len(checkpoint.failed_ids)} failed rows to retry)")
             
-            try:
-                for doc in documents:
-                    try:
-                        # Generate embedding for this document
-                        embedding = create_embedding_with_dimensions(doc["content"])
-                        
-                        # Build search document with cleaned values
-                        doc_id = f"base_carbone_{doc.get('row_index', total_indexed)}"
-                        search_doc = {
-                            "id": doc_id,
-                            "content": doc["content"],
-                            "content_vector": embedding,
-                            "row_index": clean_for_json(doc.get("row_index")),
-                            "identifier": clean_for_json(doc.get("identifier")),
-                            "status": clean_for_json(doc.get("status")) or "",
-                            "name_fr": clean_for_json(doc.get("name_fr")) or "",
-                            "name_en": clean_for_json(doc.get("name_en")) or "",
-                            "category": clean_for_json(doc.get("category")) or "",
-                            "tags_fr": clean_for_json(doc.get("tags_fr")) or "",
-                            "tags_en": clean_for_json(doc.get("tags_en")) or "",
-                            "unit_fr": clean_for_json(doc.get("unit_fr")) or "",
-                            "unit_en": clean_for_json(doc.get("unit_en")) or "",
-                            "contributor": clean_for_json(doc.get("contributor")) or "",
-                            "other_contributors": clean_for_json(doc.get("other_contributors")) or "",
-                            "programme": clean_for_json(doc.get("programme")) or "",
-                            "source": clean_for_json(doc.get("source")) or "",
-                            "url": clean_for_json(doc.get("url")) or "",
-                            "location": clean_for_json(doc.get("location")) or "",
-                            "created_at": clean_for_json(doc.get("created_at")),
-                            "modified_at": clean_for_json(doc.get("modified_at")),
-                            "validity": clean_for_json(doc.get("validity")) or "",
-                            "comments_fr": clean_for_json(doc.get("comments_fr")) or "",
-                            "comments_en": clean_for_json(doc.get("comments_en")) or "",
-                            "total": clean_for_json(doc.get("total")),
-                            "co2f": clean_for_json(doc.get("co2f")),
-                            "ch4f": clean_for_json(doc.get("ch4f")),
-                            "ch4b": clean_for_json(doc.get("ch4b")),
-                            "n2o": clean_for_json(doc.get("n2o")),
-                            "extra_gases": doc.get("extra_gases") or "[]",
-                        }
-                        
-                        # Remove None values for numeric fields (Azure Search doesn't accept None for Edm.Double)
-                        # But keep None for DateTimeOffset and Int32 fields (they accept None)
-                        for key in ["total", "co2f", "ch4f", "ch4b", "n2o"]:
-                            if search_doc.get(key) is None:
-                                search_doc.pop(key, None)
-                        
-                        # Note: Don't validate JSON with json.dumps() because datetime objects
-                        # are not JSON-serializable, but Azure Search SDK will handle them correctly
-                        
-                        # Index document to Azure AI Search
-                        # TODO: Index document to Azure AI Search with batching
-                        print(f"[Base Carbone] Indexing doc_id={doc_id} row_index={doc.get('row_index')} identifier={doc.get('identifier')} name_fr={doc.get('name_fr')} category={doc.get('category')}")
-                        result = search_client.upload_documents(documents=[search_doc])
-                        if result[0].succeeded:
-                            total_indexed += 1
-                            if total_indexed % 1000 == 0:
-                                print(f"[Base Carbone] Indexed {total_indexed} factors...")
-                                logger.info(f"Base Carbone: Indexed {total_indexed} factors")
-                        else:
-                            total_failed += 1
-                            logger.warning(f"Base Carbone: Failed to index row {doc.get('row_index')}: {result[0].error_message}")
-                            
-                    except Exception as doc_error:
-                        total_failed += 1
-                        print(f"[Base Carbone] ERROR doc_id={doc_id if 'doc_id' in locals() else 'unknown'} row_index={doc.get('row_index')} err={doc_error}")
-                        logger.error(f"Base Carbone: Error processing document row {doc.get('row_index')}: {doc_error}", exc_info=True)
+            def _iter_changed_documents():
+                nonlocal skipped_unchanged
+                for search_doc in _iter_documents():
+                    doc_hash = compute_document_hash(search_doc)
+                    current_hashes[search_doc["id"]] = doc_hash
+                    if not checkpoint.should_process(search_doc["row_index"], search_doc["id"]):
+                        continue
+                    if incremental and previous_hashes.get(search_doc["id"]) == doc_hash:
+                        skipped_unchanged += 1
+                        checkpoint.mark_done([(search_doc["row_index"], search_doc["id"])])
                         continue
+                    yield search_doc
+            
+            def _on_batch_done(batch: List[Dict[str, Any]], batch_failed_ids: List[str]) -> None:
+                checkpoint.mark_done([(d["row_index"], d["id"]) for d in batch], batch_failed_ids)
+                checkpoint.save()
+                if len(batch_failed_ids) < len(batch):
+                    bump_index_version(index_name)
+            
+            try:
+                batch_result = index_documents_in_batches(
+                    search_client,
+                    _iter_changed_documents(),
+                    embedding_batch_size=embedding_batch_size,
+                    upload_batch_size=upload_batch_size,
+                    max_workers=max_workers,
+                    log_prefix="Base Carbone",
+                    on_batch_done=_on_batch_done,
+                )
+                checkpoint.finish()
+                total_docs = len(current_hashes)
+                total_indexed = batch_result["indexed"]
+                total_failed = batch_result["failed"]
+                print(f"[Base Carbone] Loaded {total_docs} factors in {parse_seconds:.2f}s")
+                logger.info(f"Base Carbone: Loaded {total_docs} factors in {parse_seconds:.2f}s")
+                
+                # Validate minimum count (similar to map_invoices_to_base_carbone.py line 1730)
+                if total_docs < 50:
+                    warning_msg = f"⚠️ Only {total_docs} factors loaded. Expected ~11,216 factors from Base Carbone v23.6."
+                    print(f"[Base Carbone] WARNING: {warning_msg}")
+                    logger.warning(warning_msg)
+                
+                # Rows that disappeared from the source file
+                deleted = 0
+                failed_ids = set(batch_result["failed_ids"])
+                if incremental:
+                    removed_ids = [doc_id for doc_id in previous_hashes if doc_id not in current_hashes]
+                    if removed_ids:
+                        deleted, delete_failed = delete_documents_in_batches(search_client, removed_ids, log_prefix="Base Carbone")
+                        if deleted:
+                            bump_index_version(index_name)
+                        failed_ids.update(delete_failed)
+                        total_failed += len(delete_failed)
+                
+                # Record hashes only for documents the index now holds; failed rows keep their old
+                # hash (or none) so the next incremental run retries them
+                new_hashes = dict(previous_hashes)
+                for doc_id, doc_hash in current_hashes.items():
+                    if doc_id not in failed_ids:
+                        new_hashes[doc_id] = doc_hash
+                if incremental:
+                    for doc_id in previous_hashes:
+                        if doc_id not in current_hashes and doc_id not in failed_ids:
+                            new_hashes.pop(doc_id, None)
+                save_index_state(hashes_path, new_hashes)
                 
-                print(f"[Base Carbone] SUCCESS: Indexed {total_indexed}/{len(documents)} documents to index '{index_name}' (failed: {total_failed})")
-                logger.info(f"Base Carbone: Successfully indexed {total_indexed}/{len(documents)} documents to index '{index_name}' (failed: {total_failed})")
+                # Local backend: (re)train the ANN clusters once the index is large enough or has doubled
+                if isinstance(search_client, LocalVectorIndex):
+                    search_client.maybe_build_ann_index()
+                
+                embedding_cache = get_embedding_cache()
+                if embedding_cache:
+                    embedding_cache.flush()
+                    print(f"[Base Carbone] Embedding cache: {embedding_cache.stats()}")
+                print(f"[Base Carbone] SUCCESS: Indexed {total_indexed}/{total_docs} documents to index '{index_name}' (failed: {total_failed}, unchanged: {skipped_unchanged}, deleted: {deleted})")
+                logger.info(f"Base Carbone: Successfully indexed {total_indexed}/{total_docs} documents to index '{index_name}' (failed: {total_failed}, unchanged: {skipped_unchanged}, deleted: {deleted})")
                 
                 return {
                     "status": "success",
                     "file": filename or excel_path.name,
                     "docs_indexed": total_indexed,
-                    "total_docs": len(documents),
+                    "total_docs": total_docs,
                     "failed": total_failed,
+                    "unchanged": skipped_unchanged,
+                    "deleted": deleted,
+                    "resumed_from_row": resumed_from_row if resume else None,
+                    "embedding_cache": embedding_cache.stats() if embedding_cache else None,
                     "index_name": index_name,
                 }
                 
@@ -574,11 +2965,733 @@ class BaseCarboneExcelProcessor:
             }
 
 
+# ============================================================
+# ANSWER CACHE (SolaRagChat)
+# ============================================================
+def normalize_question(question: str) -> str:
+    """Normalize a chat question for exact-match caching: Unicode NFC, case, whitespace, trailing punctuation."""
+    return " ".join(unicodedata.normalize("NFC", question).casefold().split()).rstrip(" ?!.")
+
+
+def answer_cache_partition(
+    filter_category: Optional[str],
+    filter_location: Optional[str],
+    k: int,
+    prompt_version: str,
+    index_version: str,
+) -> str:
+    """Everything but the question that an answer depends on; cached answers are only reused within a partition."""
+    return json.dumps([filter_category, filter_location, k, prompt_version, index_version], ensure_ascii=False)
+
+
+def answer_cache_key(question: str, partition: str) -> str:
+    payload = f"{normalize_question(question)}\x00{partition}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryAnswerCache:
+    """In-process answer cache with TTL and LRU eviction (thread-safe)."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and now - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+class SqliteAnswerCache:
+    """
+    Answer cache in a SQLite file (WAL mode), shared by the processes of one host, with TTL and LRU eviction.
+    Values are stored as JSON.
+    """
+
+    def __init__(self, path: Path, max_entries: int, ttl: float) -> None:
+        import sqlite3
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_used_at ON answers (used_at)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        serialized = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, value, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, serialized, now, now),
+            )
+            # Least recently used entries beyond max_entries
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
+
+
+class SemanticAnswerCache:
+    """
+    In-process answer cache for near-duplicate questions: a question is answered from the cached question
+    with the highest cosine similarity of their embeddings, if it reaches `threshold` and was asked in the
+    same partition (filters, k, prompt and index version). LRU eviction and TTL like MemoryAnswerCache;
+    partitions that can no longer be served (older index versions) are dropped with retain_partitions.
+
+    For tuning, the best similarity of recent lookups is kept (threshold_report) and each hit is recorded
+    as a review sample (question, cached question, similarity, cached answer; in shadow mode also the
+    freshly generated answer) so false hits can be inspected.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries: int,
+        ttl: float,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        review_samples: int = 200,
+    ) -> None:
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # One row per slot; a slot's partition id and creation time mask the similarity scan
+        self._vectors = np.zeros((self.max_entries, dimensions), dtype=np.float32)
+        self._slot_partitions = np.full(self.max_entries, -1, dtype=np.int64)
+        self._slot_created = np.zeros(self.max_entries, dtype=np.float64)
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._partition_ids: Dict[str, int] = {}
+        self._next_partition_id = 0
+        self._next_free = 0
+        self._free_slots: List[int] = []
+        self._best_similarities: "deque[float]" = deque(maxlen=5000)
+        self._reviews: "deque[Dict[str, Any]]" = deque(maxlen=max(1, int(review_samples)))
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: List[float], partition: str) -> Optional[Dict[str, Any]]:
+        """
+        Most similar cached question in the partition.
+        
+        Returns:
+            Dict with question, similarity, value (the cached answer) when similarity >= threshold, else None
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            best_slot, best_similarity = None, 0.0
+            partition_id = self._partition_ids.get(partition)
+            if partition_id is not None:
+                used = self._next_free
+                mask = self._slot_partitions[:used] == partition_id
+                if self.ttl:
+                    mask &= self._slot_created[:used] >= now - self.ttl
+                if mask.any():
+                    similarities = np.where(mask, self._vectors[:used] @ query, -np.inf)
+                    best_slot = int(np.argmax(similarities))
+                    best_similarity = float(similarities[best_slot])
+            self._best_similarities.append(best_similarity)
+            if best_slot is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._lru.move_to_end(best_slot)
+            entry = self._entries[best_slot]
+            return {"question": entry["question"], "similarity": best_similarity, "value": entry["value"]}
+
+    def add(self, question: str, embedding: List[float], partition: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            elif self._next_free < self.max_entries:
+                slot = self._next_free
+                self._next_free += 1
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                del self._entries[slot]
+            partition_id = self._partition_ids.get(partition)
+            if partition_id is None:
+                partition_id = self._partition_ids[partition] = self._next_partition_id
+                self._next_partition_id += 1
+            self._vectors[slot] = self._normalize(embedding)
+            self._slot_partitions[slot] = partition_id
+            self._slot_created[slot] = time.time()
+            self._entries[slot] = {"question": question, "value": value}
+            self._lru[slot] = None
+
+    def retain_partitions(self, keep: Callable[[str], bool]) -> int:
+        """
+        Drop the partitions for which keep(partition) is False, with their entries (their slots are reused first).
+        
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            dropped = {partition: partition_id for partition, partition_id in self._partition_ids.items() if not keep(partition)}
+            if not dropped:
+                return 0
+            for partition in dropped:
+                del self._partition_ids[partition]
+            slots = np.flatnonzero(np.isin(self._slot_partitions[:self._next_free], list(dropped.values())))
+            self._slot_partitions[slots] = -1
+            for slot in slots.tolist():
+                self._entries.pop(slot, None)
+                self._lru.pop(slot, None)
+                self._free_slots.append(slot)
+            return len(slots)
+
+    def record_review(
+        self,
+        question: str,
+        match: Dict[str, Any],
+        served: bool,
+        fresh_answer: Optional[str] = None,
+    ) -> None:
+        """Keep a hit for false-hit review (bounded, most recent first out)."""
+        with self._lock:
+            self._reviews.append({
+                "question": question,
+                "cached_question": match["question"],
+                "similarity": round(match["similarity"], 4),
+                "served": served,
+                "cached_answer": match["value"].get("answer"),
+                "fresh_answer": fresh_answer,
+                "at": datetime.now().isoformat(),
+            })
+
+    def review_samples(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recent hits, lowest similarity first (the likeliest false hits)."""
+        with self._lock:
+            samples = sorted(self._reviews, key=lambda sample: sample["similarity"])
+        return samples[:limit] if limit else samples
+
+    def threshold_report(self, thresholds: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Hit rate each threshold would have had over recent lookups (best similarity per lookup)."""
+        with self._lock:
+            similarities = np.asarray(self._best_similarities, dtype=np.float32)
+        thresholds = thresholds or [0.85, 0.88, 0.9, 0.92, 0.94, 0.95, 0.96, 0.98]
+        return [
+            {
+                "threshold": threshold,
+                "hit_rate": float((similarities >= threshold).mean()) if len(similarities) else 0.0,
+            }
+            for threshold in thresholds
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._lru.clear()
+            self._partition_ids.clear()
+            self._slot_partitions[:] = -1
+            self._next_free = 0
+            self._free_slots.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "review_samples": len(self._reviews),
+            }
+
+
+_answer_cache_state_dir_warned = False
+
+
+def answer_cache_state_dir_configured() -> bool:
+    """
+    Whether the answer caches can be used: they are invalidated through the index version file that ingestion
+    writes under RAG_INDEX_STATE_DIR, so without an explicit directory shared with ingestion a reindex run from
+    another directory, worker or pod would never reach them. Logs a single warning when they are turned off.
+    """
+    global _answer_cache_state_dir_warned
+    if RAG_INDEX_STATE_DIR_CONFIGURED:
+        return True
+    if not _answer_cache_state_dir_warned:
+        _answer_cache_state_dir_warned = True
+        logger.warning(
+            "Answer caches disabled: RAG_INDEX_STATE_DIR must be set to a directory shared by ingestion and chat "
+            "when RAG_ANSWER_CACHE_BACKEND or RAG_SEMANTIC_CACHE_MODE enables a cache"
+        )
+    return False
+
+
+_answer_cache: Optional[Any] = None
+_answer_cache_disabled = False
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[Any]:
+    """Get the process-wide chat answer cache (MemoryAnswerCache or SqliteAnswerCache), or None when disabled."""
+    global _answer_cache, _answer_cache_disabled
+    if not RAG_ANSWER_CACHE_BACKEND or _answer_cache_disabled or not answer_cache_state_dir_configured():
+        return None
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None and not _answer_cache_disabled:
+                try:
+                    if RAG_ANSWER_CACHE_BACKEND == "sqlite":
+                        _answer_cache = SqliteAnswerCache(RAG_ANSWER_CACHE_PATH, RAG_ANSWER_CACHE_MAX_ENTRIES, RAG_ANSWER_CACHE_TTL)
+                    elif RAG_ANSWER_CACHE_BACKEND == "memory":
+                        _answer_cache = MemoryAnswerCache(RAG_ANSWER_CACHE_MAX_ENTRIES, RAG_ANSWER_CACHE_TTL)
+                    else:
+                        raise ValueError(f"unknown backend {RAG_ANSWER_CACHE_BACKEND!r}")
+                except Exception as e:
+                    logger.warning(f"Answer cache disabled: {e}")
+                    _answer_cache_disabled = True
+    return _answer_cache
+
+
+_semantic_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def prune_semantic_answer_cache(index_version: str) -> None:
+    """Drop the semantic cache partitions of other Sola RAG index versions: their answers can no longer be served."""
+    semantic_cache = _semantic_answer_cache
+    if semantic_cache is None:
+        return
+    # The index version is the last element of answer_cache_partition
+    dropped = semantic_cache.retain_partitions(lambda partition: json.loads(partition)[-1] == index_version)
+    if dropped:
+        logger.info(f"[SOLA RAG] Semantic answer cache: dropped {dropped} answers of previous index versions")
+
+
+def get_semantic_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Get the process-wide semantic answer cache, or None when RAG_SEMANTIC_CACHE_MODE is "off"."""
+    global _semantic_answer_cache
+    if RAG_SEMANTIC_CACHE_MODE not in ("serve", "shadow") or not answer_cache_state_dir_configured():
+        return None
+    if _semantic_answer_cache is None:
+        with _answer_cache_lock:
+            if _semantic_answer_cache is None:
+                _semantic_answer_cache = SemanticAnswerCache(
+                    RAG_SEMANTIC_CACHE_THRESHOLD,
+                    RAG_SEMANTIC_CACHE_MAX_ENTRIES,
+                    RAG_ANSWER_CACHE_TTL,
+                    review_samples=RAG_SEMANTIC_CACHE_REVIEW_SAMPLES,
+                )
+    return _semantic_answer_cache
+
+
+_chat_prompt_versions: Dict[str, str] = {}
+
+
+def get_chat_prompt_version(system_prompt: str) -> str:
+    """Prompt part of the answer cache key: RAG_CHAT_PROMPT_VERSION, chat deployment and system prompt hash."""
+    version = _chat_prompt_versions.get(system_prompt)
+    if version is None:
+        digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        version = f"{RAG_CHAT_PROMPT_VERSION}:{AZURE_OPENAI_DEPLOYMENT_ID}:{digest}"
+        _chat_prompt_versions[system_prompt] = version
+    return version
+
+
 # ============================================================
 # SOLA RAG CHAT (LangChain)
 # ============================================================
+# Returned (and never cached) when the LLM produces an empty answer
+CHAT_EMPTY_ANSWER = "I apologize, but I couldn't generate a response. Please try again."
+
+_chat_prompts: Dict[str, PromptTemplate] = {}
+
+
+def get_chat_prompt(system_prompt: str) -> PromptTemplate:
+    """
+    Get the chat PromptTemplate ({context}, {question}) built around a system prompt, compiled once per prompt.
+    
+    Args:
+        system_prompt: LLM_SYSTEM_PROMPT from sola_export.py
+    
+    Returns:
+        PromptTemplate shared by chat(), achat(), stream() and astream()
+    """
+    prompt = _chat_prompts.get(system_prompt)
+    if prompt is None:
+        # Escape every curly brace of the system prompt except the {context} and {question} placeholders
+        escaped_system_prompt = system_prompt.replace("{", "{{").replace("}", "}}")
+        escaped_system_prompt = escaped_system_prompt.replace("{{context}}", "{context}").replace("{{question}}", "{question}")
+        
+        prompt_template = f"""{escaped_system_prompt}
+
+                Use the following pieces of context from ADEME Base Carbone v23.6 to answer the question.
+                If you don't know the answer based on the context, say that you don't know.
+
+                Context:
+                {{context}}
+
+                Question: {{question}}
+
+                Answer:
+            """
+        
+        prompt = PromptTemplate(
+            template=prompt_template,
+            input_variables=["context", "question"]
+        )
+        _chat_prompts[system_prompt] = prompt
+    return prompt
+
+
+def format_chat_context(documents: List[Document]) -> str:
+    """Fill the {context} block: document contents separated by blank lines."""
+    return "\n\n".join(doc.page_content for doc in documents)
+
+
+class ChatStageTimeout(Exception):
+    """A SolaRagChat.achat/astream stage exceeded its RAG_CHAT_*_TIMEOUT."""
+
+    def __init__(self, stage: str, timeout: float) -> None:
+        super().__init__(f"the {stage} step timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+async def _with_timeout(awaitable: Any, timeout: Optional[float], stage: str) -> Any:
+    """Await with a stage timeout; the awaitable is cancelled and ChatStageTimeout raised when it expires."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise ChatStageTimeout(stage, timeout) from None
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """
+    Format a SolaRagChat.stream/astream event as a Server-Sent Events message.
+    
+    Example:
+        StreamingHttpResponse((format_sse(event) for event in chat.stream(question)), content_type="text/event-stream")
+    """
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False, default=str)}\n\n"
+
+
 class SolaRagChat:
-    """Chat agent for Sola RAG using LangChain RetrievalQA with Azure OpenAI and Azure AI Search"""
+    """Chat agent for Sola RAG: Azure AI Search retrieval, cross-encoder reranking and Azure OpenAI generation"""
+    
+    @staticmethod
+    def _search_filter(filter_category: Optional[str], filter_location: Optional[str]) -> Optional[str]:
+        """OData filter for the category/location filters, None when neither is set."""
+        filter_parts = []
+        if filter_category:
+            filter_parts.append(f"category eq '{filter_category}'")
+        if filter_location:
+            filter_parts.append(f"location eq '{filter_location}'")
+        return " and ".join(filter_parts) or None
+    
+    @staticmethod
+    def _exact_cache_lookup(
+        question: str,
+        k: int,
+        filter_category: Optional[str],
+        filter_location: Optional[str],
+        system_prompt: str,
+    ) -> Tuple[Optional[str], Optional[str], Optional[Tuple[str, List[Dict], str]]]:
+        """
+        Look a question up in the exact-match answer cache.
+        
+        Returns:
+            Tuple of (cache_partition, cache_key, cached chat result or None);
+            partition and key are None when the corresponding caches are disabled
+        """
+        answer_cache = get_answer_cache()
+        cache_partition = None
+        cache_key = None
+        if answer_cache is not None or get_semantic_answer_cache() is not None:
+            # The index version changes whenever documents are (re)indexed
+            cache_partition = answer_cache_partition(
+                filter_category,
+                filter_location,
+                k,
+                get_chat_prompt_version(system_prompt),
+                get_index_version(SOLA_RAG_INDEX_NAME),
+            )
+        if answer_cache is not None:
+            cache_key = answer_cache_key(question, cache_partition)
+            cached = answer_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"[SOLA RAG] Answer cache hit ({len(cached['references'])} references)")
+                return cache_partition, cache_key, (cached["answer"], [dict(ref) for ref in cached["references"]], cached["index_name"])
+        return cache_partition, cache_key, None
+    
+    @staticmethod
+    def _semantic_cache_lookup(
+        question: str,
+        question_embedding: List[float],
+        cache_partition: str,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[str, List[Dict], str]]]:
+        """
+        Look a question up in the semantic answer cache.
+        
+        Returns:
+            Tuple of (match or None, served chat result or None); a result is only served in "serve" mode
+        """
+        semantic_cache = get_semantic_answer_cache()
+        try:
+            semantic_match = semantic_cache.lookup(question_embedding, cache_partition)
+        except Exception as cache_exc:
+            logger.warning(f"[SOLA RAG] Semantic cache lookup failed: {cache_exc}")
+            return None, None
+        if semantic_match is None:
+            return None, None
+        logger.info(
+            f"[SOLA RAG] Semantic cache {'hit' if RAG_SEMANTIC_CACHE_MODE == 'serve' else 'shadow hit'} "
+            f"(similarity {semantic_match['similarity']:.4f}): {semantic_match['question'][:80]!r}"
+        )
+        if RAG_SEMANTIC_CACHE_MODE != "serve":
+            return semantic_match, None
+        semantic_cache.record_review(question, semantic_match, served=True)
+        cached = semantic_match["value"]
+        return semantic_match, (cached["answer"], [dict(ref) for ref in cached["references"]], cached["index_name"])
+    
+    @staticmethod
+    def _store_answer(
+        question: str,
+        cache_key: Optional[str],
+        cache_partition: Optional[str],
+        question_embedding: Optional[List[float]],
+        semantic_match: Optional[Dict[str, Any]],
+        answer: str,
+        references: List[Dict],
+        index_name: str,
+    ) -> None:
+        """Store a generated answer in the exact and semantic answer caches."""
+        cached_value = {
+            "answer": answer,
+            "references": [dict(ref) for ref in references],
+            "index_name": index_name,
+        }
+        if cache_key is not None:
+            get_answer_cache().put(cache_key, cached_value)
+        semantic_cache = get_semantic_answer_cache()
+        if question_embedding is not None and semantic_cache is not None:
+            if semantic_match is not None:
+                # Shadow mode: keep what would have been served next to the fresh answer
+                semantic_cache.record_review(question, semantic_match, served=False, fresh_answer=answer)
+            else:
+                semantic_cache.add(question, question_embedding, cache_partition, cached_value)
+    
+    @staticmethod
+    def _references(documents: List[Document]) -> List[Dict]:
+        """Source references (one per Base Carbone identifier) for the documents an answer was generated from."""
+        references = []
+        seen_identifiers = set()
+        
+        for doc in documents:
+            meta = doc.metadata or {}
+            identifier = meta.get("identifier")
+            
+            # Skip duplicates
+            if identifier and identifier in seen_identifiers:
+                continue
+            if identifier:
+                seen_identifiers.add(identifier)
+            
+            # Build source reference
+            references.append({
+                "row_index": meta.get("row_index"),
+                "identifier": identifier,
+                "name_fr": meta.get("name_fr", ""),
+                "name_en": meta.get("name_en", ""),
+                "category": meta.get("category", ""),
+                "unit_fr": meta.get("unit_fr", ""),
+                "unit_en": meta.get("unit_en", ""),
+                "total": meta.get("total"),
+                "location": meta.get("location", ""),
+            })
+        return references
+    
+    @staticmethod
+    def _rerank(question: str, retrieved_docs_with_scores: List[Tuple[Document, float]], top_k: int) -> List[Document]:
+        """Cross-encoder reranking of the retrieved candidates (CPU-bound); returns the top_k documents."""
+        from companies.sdk.rag_reranker import rerank_chunks
+        
+        chunks_for_reranking = [
+            {
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "vector_score": float(score) if score else 0.0,
+            }
+            for doc, score in retrieved_docs_with_scores
+        ]
+        top_chunks, _ = rerank_chunks(
+            query=question,
+            chunks=chunks_for_reranking,
+            top_k=top_k,
+            content_field="content",
+        )
+        if top_chunks:
+            logger.info(
+                f"[SOLA RAG] Reranked {len(chunks_for_reranking)} candidates, "
+                f"top score {top_chunks[0].get('rerank_score', 0.0):.4f}"
+            )
+        return [
+            Document(page_content=chunk["content"], metadata=chunk.get("metadata", {}))
+            for chunk in top_chunks[:top_k]
+        ]
+    
+    def _retrieve_documents(self, question: str, k: int, search_filter: Optional[str], rag_type: str) -> List[Document]:
+        """Vector search for 30 candidates, reranked to the top k (vector ranking if reranking fails)."""
+        vector_store = get_vector_store(rag_type.lower())
+        retrieved_docs_with_scores = vector_store.similarity_search_with_score(question, k=30, filters=search_filter)
+        documents = [doc for doc, _ in retrieved_docs_with_scores[:k]]
+        if retrieved_docs_with_scores:
+            try:
+                documents = self._rerank(question, retrieved_docs_with_scores, k)
+            except Exception as rerank_exc:
+                logger.warning(f"[SOLA RAG] Reranking failed: {rerank_exc!r}, using the vector search ranking")
+        return documents
+    
+    async def _aretrieve_documents(
+        self,
+        question: str,
+        k: int,
+        search_filter: Optional[str],
+        rag_type: str,
+        timings: Dict[str, float],
+    ) -> List[Document]:
+        """Async _retrieve_documents with the search and rerank stage timeouts; stage durations go to `timings`."""
+        started = time.perf_counter()
+        vector_store = _vector_stores.get((RAG_SEARCH_BACKEND, SOLA_RAG_INDEX_NAME))
+        if vector_store is None:
+            # Building the store checks the index over the network: keep it off the event loop
+            vector_store = await asyncio.to_thread(get_vector_store, rag_type.lower())
+        retrieved_docs_with_scores = await _with_timeout(
+            asearch_vector_store(vector_store, question, k=30, filters=search_filter),
+            RAG_CHAT_SEARCH_TIMEOUT,
+            "search",
+        )
+        timings["search"] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        documents = [doc for doc, _ in retrieved_docs_with_scores[:k]]
+        if retrieved_docs_with_scores:
+            try:
+                # A timed-out worker thread cannot be interrupted; it finishes in the background
+                documents = await _with_timeout(
+                    asyncio.to_thread(self._rerank, question, retrieved_docs_with_scores, k),
+                    RAG_CHAT_RERANK_TIMEOUT,
+                    "rerank",
+                )
+            except Exception as rerank_exc:
+                logger.warning(f"[SOLA RAG] Reranking failed: {rerank_exc!r}, using the vector search ranking")
+        timings["rerank"] = time.perf_counter() - started
+        return documents
+    
+    @staticmethod
+    def _prompt_messages(system_prompt: str, question: str, documents: List[Document]) -> List[Any]:
+        """Chat messages for the LLM: the compiled prompt filled with the documents and the question."""
+        return get_chat_prompt(system_prompt).format_prompt(
+            context=format_chat_context(documents),
+            question=question,
+        ).to_messages()
+    
+    @staticmethod
+    def _done_event(answer: str, cached: bool, started: float, ttft: Optional[float]) -> Dict[str, Any]:
+        total = time.perf_counter() - started
+        if ttft is None:
+            ttft = total
+        logger.info(f"[SOLA RAG] Stream {'(cached) ' if cached else ''}done: first token {ttft * 1000:.0f}ms, total {total * 1000:.0f}ms")
+        return {
+            "event": "done",
+            "data": {"answer": answer, "cached": cached, "ttft_ms": round(ttft * 1000, 1), "total_ms": round(total * 1000, 1)},
+        }
+    
+    def _cached_events(self, cached: Tuple[str, List[Dict], str], started: float) -> Iterator[Dict[str, Any]]:
+        """Stream events for a cached answer: references, the whole answer as one token, done."""
+        answer, references, index_name = cached
+        yield {"event": "references", "data": {"references": references, "index_name": index_name}}
+        ttft = time.perf_counter() - started
+        yield {"event": "token", "data": answer}
+        yield self._done_event(answer, True, started, ttft)
     
     def chat(
         self,
@@ -589,13 +3702,13 @@ class SolaRagChat:
         filter_location: Optional[str] = None,
     ) -> Tuple[str, List[Dict], str]:
         """
-        Perform retrieval + generation using LangChain RetrievalQA.
+        Perform retrieval + reranking + generation with Azure OpenAI (LangChain AzureChatOpenAI).
         Uses LLM_SYSTEM_PROMPT from sola_export.py for expert Base Carbone guidance.
         
         Args:
             question: User's question
             rag_type: "sola"
-            k: top-k chunks to retrieve
+            k: number of reranked chunks given to the LLM
             filter_category: Optional metadata filter by category
             filter_location: Optional metadata filter by location
         
@@ -616,260 +3729,355 @@ class SolaRagChat:
                     "",
                 )
             
-            # Get vector store
-            vector_store = get_vector_store(rag_type.lower())
-            index_name = SOLA_RAG_INDEX_NAME
-            
-            # Build search kwargs (exclude k - it's passed separately to as_retriever)
-            search_kwargs: Dict[str, Any] = {}
+            # Exact-match answer cache
+            cache_partition, cache_key, cached = self._exact_cache_lookup(
+                question, k, filter_category, filter_location, LLM_SYSTEM_PROMPT
+            )
+            if cached is not None:
+                return cached
             
-            # Build OData filter string for Azure Search
-            filter_parts = []
-            if filter_category:
-                filter_parts.append(f"category eq '{filter_category}'")
-            if filter_location:
-                filter_parts.append(f"location eq '{filter_location}'")
+            # Semantic cache for rephrased questions. The question embedding is memoized, so the
+            # vector search below reuses it instead of embedding the question a second time
+            question_embedding = None
+            semantic_match = None
+            if get_semantic_answer_cache() is not None:
+                try:
+                    question_embedding = create_embedding_with_dimensions(question)
+                except Exception as cache_exc:
+                    logger.warning(f"[SOLA RAG] Semantic cache lookup failed: {cache_exc}")
+                if question_embedding is not None:
+                    semantic_match, cached = self._semantic_cache_lookup(question, question_embedding, cache_partition)
+                    if cached is not None:
+                        return cached
             
-            if filter_parts:
-                search_kwargs["filter"] = " and ".join(filter_parts)
+            index_name = SOLA_RAG_INDEX_NAME
+            search_filter = self._search_filter(filter_category, filter_location)
             
-            # STEP 1: Fast Retrieval (NO CROSS-ATTENTION)
-            # Retrieve many candidate chunks quickly (top 20-50)
-            # This is fast but not deeply accurate - uses cosine similarity only
-            try:
-                from companies.sdk.rag_reranker import rerank_chunks
-                from langchain.schema import Document
-                from langchain.schema.retriever import BaseRetriever
-                from pydantic import Field
-                from typing import List
-                
-                # ============================================================
-                # STEP 1: FAST RETRIEVAL (NO CROSS-ATTENTION)
-                # ============================================================
-                logger.info(f"[SOLA RAG] =========================================")
-                logger.info(f"[SOLA RAG] STEP 1: FAST RETRIEVAL (NO CROSS-ATTENTION)")
-                logger.info(f"[SOLA RAG] Goal: Retrieve many candidate chunks quickly")
-                logger.info(f"[SOLA RAG] Method: Cosine similarity (vector search)")
-                logger.info(f"[SOLA RAG] Target: Top 30 candidates (range: 20-50)")
-                
-                logger.info(f"[SOLA RAG] Step 1: Retrieving documents for reranking...")
-                # Use similarity_search_with_score to get more candidates
-                # IMPORTANT: Do NOT pass filter as explicit keyword argument
-                # LangChain's similarity_search_with_score internally passes kwargs to search(),
-                # and if filter is both explicit and in kwargs, we get "multiple values for keyword argument 'filter'"
-                # Solution: Pass filter ONLY through search_kwargs, not as explicit parameter
-                retrieved_docs_with_scores = vector_store.similarity_search_with_score(
-                    question,
-                    k=30,  # Retrieve top 30-50 for reranking (as per RAG flow)
-                    **(search_kwargs if search_kwargs else {}),  # Pass all kwargs including filter
-                )
-                logger.info(f"[SOLA RAG] Step 1: ✅ Fast Retrieval completed - Retrieved {len(retrieved_docs_with_scores)} candidate chunks")
-                logger.info(f"[SOLA RAG] Step 1: Method: Cosine similarity (no cross-attention)")
-                
-                if retrieved_docs_with_scores:
-                    # Prepare chunks for reranking
-                    chunks_for_reranking = []
-                    for doc, score in retrieved_docs_with_scores:
-                        chunk_data = {
-                            "content": doc.page_content,
-                            "metadata": doc.metadata,
-                            "vector_score": float(score) if score else 0.0,
-                        }
-                        chunks_for_reranking.append(chunk_data)
-                    
-                    # ============================================================
-                    # STEP 2: METADATA / ENTITY FILTERING
-                    # ============================================================
-                    logger.info(f"[SOLA RAG] =========================================")
-                    logger.info(f"[SOLA RAG] STEP 2: METADATA / ENTITY FILTERING")
-                    logger.info(f"[SOLA RAG] Goal: Reduce noise before expensive models")
-                    logger.info(f"[SOLA RAG] Filter: category, location (via search_kwargs)")
-                    logger.info(f"[SOLA RAG] Step 2: ✅ Metadata filtering completed - {len(chunks_for_reranking)} chunks remaining")
-                    
-                    # ============================================================
-                    # STEP 3: RE-RANKING (CROSS-ATTENTION LEVEL 1)
-                    # ============================================================
-                    logger.info(f"[SOLA RAG] =========================================")
-                    logger.info(f"[SOLA RAG] STEP 3: RE-RANKING (CROSS-ATTENTION LEVEL 1)")
-                    logger.info(f"[SOLA RAG] Goal: Let the query read each chunk and score relevance")
-                    logger.info(f"[SOLA RAG] Method: Cross-Encoder (sentence-transformers)")
-                    logger.info(f"[SOLA RAG] Input: {len(chunks_for_reranking)} chunks to rerank")
-                    logger.info(f"[SOLA RAG] Output: Top 5 chunks (range: 3-5)")
-                    
-                    logger.info(f"[SOLA RAG] Step 3: Starting Cross-Encoder reranking...")
-                    top_chunks, all_ranked_chunks = rerank_chunks(
-                        query=question,
-                        chunks=chunks_for_reranking,
-                        top_k=5,  # Get top 3-5 as per RAG flow
-                        content_field="content",
-                    )
-                    
-                    # Log reranking results safely
-                    if top_chunks:
-                        top1_score = top_chunks[0].get('rerank_score', 0.0) if top_chunks else 0.0
-                        top3_score = top_chunks[2].get('rerank_score', 0.0) if len(top_chunks) > 2 else 0.0
-                        top5_score = top_chunks[4].get('rerank_score', 0.0) if len(top_chunks) > 4 else 0.0
-                        logger.info(f"[SOLA RAG] Step 3: ✅ Cross-Attention Level 1 completed")
-                        logger.info(f"[SOLA RAG] Step 3: Top 1 score: {top1_score:.4f}, Top 3 score: {top3_score:.4f}, Top 5 score: {top5_score:.4f}")
-                        logger.info(f"[SOLA RAG] Step 3: Selected {len(top_chunks)} chunks for prompt construction")
-                    else:
-                        logger.info(f"[SOLA RAG] Step 3: ✅ Reranking completed - no chunks returned")
-                    
-                    # Convert reranked chunks back to LangChain Documents
-                    reranked_docs = []
-                    for chunk in top_chunks[:5]:  # Top 3-5 as per RAG flow
-                        doc = Document(
-                            page_content=chunk["content"],
-                            metadata=chunk.get("metadata", {})
-                        )
-                        reranked_docs.append(doc)
-                    
-                    # Create custom retriever that returns only top reranked documents
-                    # BaseRetriever is a Pydantic model, so we need to properly define fields
-                    from pydantic import Field, ConfigDict
-                    
-                    class RerankedRetriever(BaseRetriever):
-                        """Custom retriever that returns pre-reranked documents"""
-                        # Use model_config to allow arbitrary types for Document
-                        model_config = ConfigDict(arbitrary_types_allowed=True)
-                        top_docs: List[Document] = Field(default_factory=list, description="Pre-reranked documents to return")
-                        
-                        def __init__(self, top_docs: List[Document], **kwargs):
-                            # Use super().__init__ to properly initialize Pydantic model
-                            super().__init__(top_docs=top_docs, **kwargs)
-                        
-                        def get_relevant_documents(self, query: str):
-                            return self.top_docs
-                        
-                        async def aget_relevant_documents(self, query: str):
-                            return self.top_docs
-                    
-                    # Use reranked retriever
-                    retriever = RerankedRetriever(reranked_docs)
-                    logger.info(f"[SOLA RAG] Using reranked retriever with {len(reranked_docs)} documents (top 3-5 as per RAG flow)")
-                else:
-                    logger.warning(f"[SOLA RAG] No documents retrieved, using original retriever")
-                    retriever = vector_store.as_retriever(search_kwargs=search_kwargs, k=k)
-            except Exception as rerank_exc:
-                logger.warning(f"[SOLA RAG] Step 3: ⚠️ Reranking failed: {rerank_exc}, using original retriever")
-                logger.exception(rerank_exc)
-                # Fallback: use original retriever with k=5
-            retriever = vector_store.as_retriever(search_kwargs=search_kwargs, k=k)
+            # ============================================================
+            # STEPS 1-3: FAST RETRIEVAL, METADATA FILTERING, RE-RANKING
+            # ============================================================
+            # One vector search for 30 candidates (category/location filter applied by the index),
+            # reranked by the cross-encoder to the top k; the vector ranking is kept if reranking fails
+            logger.info(f"[SOLA RAG] Steps 1-3: Retrieving 30 candidates (filter: {search_filter}) and reranking to top {k}")
+            documents = self._retrieve_documents(question, k, search_filter, rag_type)
+            logger.info(f"[SOLA RAG] Steps 1-3: ✅ {len(documents)} documents selected for the prompt")
             
             # ============================================================
             # STEP 4: PROMPT CONSTRUCTION
             # ============================================================
-            logger.info(f"[SOLA RAG] =========================================")
-            logger.info(f"[SOLA RAG] STEP 4: PROMPT CONSTRUCTION")
-            logger.info(f"[SOLA RAG] Goal: Force the LLM to answer using only provided context")
-            logger.info(f"[SOLA RAG] Method: LangChain PromptTemplate + Retrieved context")
-            
-            # Build prompt template with LLM_SYSTEM_PROMPT
-            # LangChain RetrievalQA uses {context} and {question} placeholders
-            # Need to escape all curly braces in LLM_SYSTEM_PROMPT except {context} and {question}
-            # Replace { with {{ and } with }}, then restore {context} and {question}
-            escaped_system_prompt = LLM_SYSTEM_PROMPT.replace("{", "{{").replace("}", "}}")
-            # Restore the actual placeholders we need
-            escaped_system_prompt = escaped_system_prompt.replace("{{context}}", "{context}").replace("{{question}}", "{question}")
-            
-            prompt_template = f"""{escaped_system_prompt}
-
-                Use the following pieces of context from ADEME Base Carbone v23.6 to answer the question.
-                If you don't know the answer based on the context, say that you don't know.
-
-                Context:
-                {{context}}
-
-                Question: {{question}}
-
-                Answer:
-            """
-            
-            prompt = PromptTemplate(
-                template=prompt_template,
-                input_variables=["context", "question"]
-            )
-            
-            logger.info(f"[SOLA RAG] Step 4: Prompt template constructed with system prompt")
-            logger.info(f"[SOLA RAG] Step 4: ✅ Prompt construction completed")
+            # The prompt template is compiled once per process; the documents go straight into the messages
+            messages = self._prompt_messages(LLM_SYSTEM_PROMPT, question, documents)
             
             # ============================================================
             # STEP 5: ANSWER GENERATION (CROSS-ATTENTION LEVEL 2)
             # ============================================================
-            logger.info(f"[SOLA RAG] =========================================")
-            logger.info(f"[SOLA RAG] STEP 5: ANSWER GENERATION (CROSS-ATTENTION LEVEL 2)")
-            logger.info(f"[SOLA RAG] Goal: Generate answer grounded in retrieved documents")
-            logger.info(f"[SOLA RAG] Method: LangChain LLM with cross-attention to context")
-            logger.info(f"[SOLA RAG] Step 5: Starting LLM generation with cross-attention...")
+            logger.info(f"[SOLA RAG] Step 5: Starting LLM generation...")
+            response = get_llm().invoke(messages)
+            answer = response.content or CHAT_EMPTY_ANSWER
+            references = self._references(documents)
+            logger.info(f"[SOLA RAG] Step 5: ✅ Answer ready: {len(answer)} characters, {len(references)} references")
+            
+            if response.content:
+                self._store_answer(
+                    question, cache_key, cache_partition, question_embedding, semantic_match,
+                    answer, references, index_name,
+                )
+            
+            return answer, references, index_name
             
-            # Build RAG chain (retriever + llm) with custom prompt
-            # Use lazy-initialized LLM to avoid base_url/azure_endpoint conflict
-            qa_chain = RetrievalQA.from_chain_type(
-                llm=get_llm(),
-                retriever=retriever,
-                return_source_documents=True,
-                chain_type_kwargs={"prompt": prompt},  # Use custom prompt with LLM_SYSTEM_PROMPT
+        except Exception as e:
+            logger.error(f"Error in Sola RAG chat: {e}", exc_info=True)
+            return (
+                f"I encountered an error: {str(e)}",
+                [],
+                "",
             )
+    
+    async def achat(
+        self,
+        question: str,
+        rag_type: str = "sola",
+        k: int = 5,
+        filter_category: Optional[str] = None,
+        filter_location: Optional[str] = None,
+    ) -> Tuple[str, List[Dict], str]:
+        """
+        Async chat(): same answer caches, retrieval, reranking and prompt, without blocking the event loop.
+        Embedding, search and generation use async clients; the cross-encoder reranking (and the local
+        index backend) run in worker threads. Each stage is bounded by its RAG_CHAT_*_TIMEOUT setting.
+        Cancelling the calling task cancels the request in flight (asyncio.CancelledError propagates).
+        On a short-lived event loop, await aclose_async_clients() before the loop ends, e.g.:
+        
+            async def answer(question):
+                try:
+                    return await SolaRagChat().achat(question)
+                finally:
+                    await aclose_async_clients()
             
-            # Execute using invoke (recommended) instead of deprecated __call__
-            result = qa_chain.invoke({"query": question})
+            async_to_sync(answer)(question)
+        
+        Args:
+            question: User's question
+            rag_type: "sola"
+            k: number of reranked chunks given to the LLM
+            filter_category: Optional metadata filter by category
+            filter_location: Optional metadata filter by location
+        
+        Returns:
+            Tuple of (answer, sources, index_name), as chat()
+        """
+        timings: Dict[str, float] = {}
+        try:
+            from companies.sdk.sola_export import LLM_SYSTEM_PROMPT
             
-            logger.info(f"[SOLA RAG] Step 5: LLM response received")
+            if rag_type.lower() not in ["sola"]:
+                logger.error(f"Invalid rag_type: {rag_type}")
+                return (
+                    f"Error: rag_type must be 'sola'",
+                    [],
+                    "",
+                )
             
-            # result["result"] = final answer
-            # result["source_documents"] = list[Document] used as evidence
-            # Convert sources to references format
-            references = []
-            seen_identifiers = set()
+            cache_partition, cache_key, cached = self._exact_cache_lookup(
+                question, k, filter_category, filter_location, LLM_SYSTEM_PROMPT
+            )
+            if cached is not None:
+                return cached
             
-            for doc in result.get("source_documents", []):
-                meta = doc.metadata or {}
-                identifier = meta.get("identifier")
-                
-                # Skip duplicates
-                if identifier and identifier in seen_identifiers:
-                    continue
-                if identifier:
-                    seen_identifiers.add(identifier)
-                
-                # Build source reference
-                references.append({
-                    "row_index": meta.get("row_index"),
-                    "identifier": identifier,
-                    "name_fr": meta.get("name_fr", ""),
-                    "name_en": meta.get("name_en", ""),
-                    "category": meta.get("category", ""),
-                    "unit_fr": meta.get("unit_fr", ""),
-                    "unit_en": meta.get("unit_en", ""),
-                    "total": meta.get("total"),
-                    "location": meta.get("location", ""),
-                })
+            # The question is embedded once: the semantic cache uses the vector and the
+            # search gets it from the query embedding memo
+            started = time.perf_counter()
+            question_embedding = await _with_timeout(acreate_embedding_with_dimensions(question), RAG_CHAT_EMBED_TIMEOUT, "embedding")
+            timings["embedding"] = time.perf_counter() - started
+            semantic_match = None
+            if get_semantic_answer_cache() is not None:
+                semantic_match, cached = self._semantic_cache_lookup(question, question_embedding, cache_partition)
+                if cached is not None:
+                    return cached
             
-            answer = result.get("result", "I apologize, but I couldn't generate a response. Please try again.")
+            index_name = SOLA_RAG_INDEX_NAME
+            documents = await self._aretrieve_documents(
+                question, k, self._search_filter(filter_category, filter_location), rag_type, timings
+            )
             
-            logger.info(f"[SOLA RAG] Step 5: ✅ Cross-Attention Level 2 completed")
-            logger.info(f"[SOLA RAG] Step 5: Answer length: {len(answer)} characters")
-            logger.info(f"[SOLA RAG] Step 5: References extracted: {len(references)}")
-            logger.info(f"[SOLA RAG] =========================================")
-            logger.info(f"[SOLA RAG] ✅ RAG FLOW COMPLETED - All 5 steps executed")
-            logger.info(f"[SOLA RAG] Summary:")
-            logger.info(f"[SOLA RAG]   Step 1: Fast Retrieval (NO CROSS-ATTENTION) - Cosine similarity")
-            logger.info(f"[SOLA RAG]   Step 2: Metadata / Entity Filtering")
-            logger.info(f"[SOLA RAG]   Step 3: Re-ranking (CROSS-ATTENTION LEVEL 1) - Cross-Encoder")
-            logger.info(f"[SOLA RAG]   Step 4: Prompt Construction")
-            logger.info(f"[SOLA RAG]   Step 5: Answer Generation (CROSS-ATTENTION LEVEL 2) - LLM")
-            logger.info(f"[SOLA RAG] Answer ready with {len(references)} references")
-            logger.info(f"[SOLA RAG] =========================================")
+            started = time.perf_counter()
+            messages = self._prompt_messages(LLM_SYSTEM_PROMPT, question, documents)
+            response = await _with_timeout(get_llm().ainvoke(messages), RAG_CHAT_LLM_TIMEOUT, "generation")
+            timings["generation"] = time.perf_counter() - started
             
+            answer = response.content or CHAT_EMPTY_ANSWER
+            references = self._references(documents)
+            if response.content:
+                self._store_answer(
+                    question, cache_key, cache_partition, question_embedding, semantic_match,
+                    answer, references, index_name,
+                )
+            logger.info(
+                f"[SOLA RAG] achat answered with {len(references)} references ("
+                + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items())
+                + ")"
+            )
             return answer, references, index_name
             
+        except ChatStageTimeout as e:
+            logger.error(f"[SOLA RAG] achat: {e}")
+            return (
+                f"I encountered an error: {e}, please try again.",
+                [],
+                "",
+            )
         except Exception as e:
-            logger.error(f"Error in Sola RAG chat: {e}", exc_info=True)
+            logger.error(f"Error in Sola RAG achat: {e}", exc_info=True)
             return (
                 f"I encountered an error: {str(e)}",
                 [],
                 "",
             )
+    
+    def stream(
+        self,
+        question: str,
+        rag_type: str = "sola",
+        k: int = 5,
+        filter_category: Optional[str] = None,
+        filter_location: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming chat(): yields the references as soon as reranking is done, then the answer tokens
+        as the LLM produces them. Events (format_sse turns them into Server-Sent Events):
+            {"event": "references", "data": {"references": [...], "index_name": str}}
+            {"event": "token", "data": str}
+            {"event": "done", "data": {"answer": str, "cached": bool, "ttft_ms": float, "total_ms": float}}
+            {"event": "error", "data": {"message": str}}
+        ttft_ms is the time to the first answer token and total_ms the time to the end of the answer,
+        both measured from the call. Cached answers are sent as a single token.
+        
+        Args:
+            question: User's question
+            rag_type: "sola"
+            k: number of reranked chunks given to the LLM
+            filter_category: Optional metadata filter by category
+            filter_location: Optional metadata filter by location
+        
+        Yields:
+            Event dicts as above; the last one is "done" or "error"
+        """
+        started = time.perf_counter()
+        try:
+            from companies.sdk.sola_export import LLM_SYSTEM_PROMPT
+            
+            if rag_type.lower() not in ["sola"]:
+                logger.error(f"Invalid rag_type: {rag_type}")
+                yield {"event": "error", "data": {"message": "Error: rag_type must be 'sola'"}}
+                return
+            
+            cache_partition, cache_key, cached = self._exact_cache_lookup(
+                question, k, filter_category, filter_location, LLM_SYSTEM_PROMPT
+            )
+            question_embedding = None
+            semantic_match = None
+            if cached is None and get_semantic_answer_cache() is not None:
+                try:
+                    question_embedding = create_embedding_with_dimensions(question)
+                except Exception as cache_exc:
+                    logger.warning(f"[SOLA RAG] Semantic cache lookup failed: {cache_exc}")
+                if question_embedding is not None:
+                    semantic_match, cached = self._semantic_cache_lookup(question, question_embedding, cache_partition)
+            if cached is not None:
+                yield from self._cached_events(cached, started)
+                return
+            
+            index_name = SOLA_RAG_INDEX_NAME
+            documents = self._retrieve_documents(
+                question, k, self._search_filter(filter_category, filter_location), rag_type
+            )
+            references = self._references(documents)
+            yield {"event": "references", "data": {"references": references, "index_name": index_name}}
+            
+            ttft = None
+            parts = []
+            finish_reason = None
+            for chunk in get_llm().stream(self._prompt_messages(LLM_SYSTEM_PROMPT, question, documents)):
+                finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+                if not chunk.content:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                parts.append(chunk.content)
+                yield {"event": "token", "data": chunk.content}
+            
+            # Only reached when the LLM stream ended; a cut-off or empty answer is never cached
+            answer = "".join(parts)
+            if not answer:
+                answer = CHAT_EMPTY_ANSWER
+                yield {"event": "token", "data": answer}
+            elif finish_reason in (None, "stop"):
+                self._store_answer(
+                    question, cache_key, cache_partition, question_embedding, semantic_match,
+                    answer, references, index_name,
+                )
+            else:
+                logger.warning(f"[SOLA RAG] Streamed answer not cached (finish reason: {finish_reason})")
+            yield self._done_event(answer, False, started, ttft)
+            
+        except Exception as e:
+            logger.error(f"Error in Sola RAG stream: {e}", exc_info=True)
+            yield {"event": "error", "data": {"message": f"I encountered an error: {str(e)}"}}
+    
+    async def astream(
+        self,
+        question: str,
+        rag_type: str = "sola",
+        k: int = 5,
+        filter_category: Optional[str] = None,
+        filter_location: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async stream() over the achat() pipeline. RAG_CHAT_LLM_TIMEOUT bounds the wait for each
+        answer token rather than the whole answer. Closing the generator (client disconnect)
+        or cancelling its task stops the LLM request. Its clients are closed as for achat()
+        (aclose_async_clients).
+        
+        Args:
+            question: User's question
+            rag_type: "sola"
+            k: number of reranked chunks given to the LLM
+            filter_category: Optional metadata filter by category
+            filter_location: Optional metadata filter by location
+        
+        Yields:
+            Event dicts as stream()
+        """
+        started = time.perf_counter()
+        try:
+            from companies.sdk.sola_export import LLM_SYSTEM_PROMPT
+            
+            if rag_type.lower() not in ["sola"]:
+                logger.error(f"Invalid rag_type: {rag_type}")
+                yield {"event": "error", "data": {"message": "Error: rag_type must be 'sola'"}}
+                return
+            
+            cache_partition, cache_key, cached = self._exact_cache_lookup(
+                question, k, filter_category, filter_location, LLM_SYSTEM_PROMPT
+            )
+            question_embedding = None
+            semantic_match = None
+            if cached is None:
+                question_embedding = await _with_timeout(acreate_embedding_with_dimensions(question), RAG_CHAT_EMBED_TIMEOUT, "embedding")
+                if get_semantic_answer_cache() is not None:
+                    semantic_match, cached = self._semantic_cache_lookup(question, question_embedding, cache_partition)
+            if cached is not None:
+                for event in self._cached_events(cached, started):
+                    yield event
+                return
+            
+            index_name = SOLA_RAG_INDEX_NAME
+            documents = await self._aretrieve_documents(
+                question, k, self._search_filter(filter_category, filter_location), rag_type, {}
+            )
+            references = self._references(documents)
+            yield {"event": "references", "data": {"references": references, "index_name": index_name}}
+            
+            ttft = None
+            parts = []
+            finish_reason = None
+            chunks = get_llm().astream(self._prompt_messages(LLM_SYSTEM_PROMPT, question, documents)).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await _with_timeout(chunks.__anext__(), RAG_CHAT_LLM_TIMEOUT, "generation")
+                    except StopAsyncIteration:
+                        break
+                    finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+                    if not chunk.content:
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(chunk.content)
+                    yield {"event": "token", "data": chunk.content}
+            finally:
+                await chunks.aclose()
+            
+            # Only reached when the LLM stream ended; a cut-off or empty answer is never cached
+            answer = "".join(parts)
+            if not answer:
+                answer = CHAT_EMPTY_ANSWER
+                yield {"event": "token", "data": answer}
+            elif finish_reason in (None, "stop"):
+                self._store_answer(
+                    question, cache_key, cache_partition, question_embedding, semantic_match,
+                    answer, references, index_name,
+                )
+            else:
+                logger.warning(f"[SOLA RAG] Streamed answer not cached (finish reason: {finish_reason})")
+            yield self._done_event(answer, False, started, ttft)
+            
+        except ChatStageTimeout as e:
+            logger.error(f"[SOLA RAG] astream: {e}")
+            yield {"event": "error", "data": {"message": f"I encountered an error: {e}, please try again."}}
+        except Exception as e:
+            logger.error(f"Error in Sola RAG astream: {e}", exc_info=True)
+            yield {"event": "error", "data": {"message": f"I encountered an error: {str(e)}"}}
 
 
 # ============================================================
@@ -884,6 +4092,11 @@ class SolaRagCsvProcessor:
         filename: str,
         rag_type: str = "sola",
         blob_name: Optional[str] = None,
+        resume: bool = False,
+        chunk_size: Optional[int] = None,
+        embedding_batch_size: int = EMBEDDING_BATCH_SIZE,
+        upload_batch_size: int = SEARCH_UPLOAD_BATCH_SIZE,
+        max_workers: int = EMBEDDING_MAX_WORKERS,
     ) -> Dict[str, Any]:
         """
         Ingest a CSV or XLSX file and index into Azure AI Search using LangChain.
@@ -894,6 +4107,12 @@ class SolaRagCsvProcessor:
             filename: Original file name
             rag_type: "sola"
             blob_name: Optional blob name for storage
+            resume: Continue from the last checkpoint of an interrupted run on the same file,
+                retrying only rows that failed
+            chunk_size: Rows per chunk (defaults to RAG_CSV_READ_CHUNK_SIZE / RAG_EXCEL_READ_CHUNK_SIZE)
+            embedding_batch_size: Number of texts sent per embeddings request
+            upload_batch_size: Number of documents per Azure AI Search upload (max 1000)
+            max_workers: Number of concurrent embedding requests in flight
         
         Returns:
             Dict with status, file info, and indexing results
@@ -902,139 +4121,96 @@ class SolaRagCsvProcessor:
             print(f"[Sola RAG] Starting upload for file {filename} (path: {csv_file_path})")
             logger.info(f"Sola RAG: Starting upload for file {filename} (path: {csv_file_path})")
             
-            # Load CSV or XLSX into DataFrame
+            # Stream the file in chunks: CSV via pd.read_csv(chunksize), XLSX via openpyxl read-only
             file_ext = filename.lower()
+            encoding = None
             try:
                 if file_ext.endswith('.xlsx'):
-                    df = pd.read_excel(csv_file_path, engine='openpyxl')
+                    chunks = iter(iter_excel_chunks(csv_file_path, chunk_size=chunk_size or EXCEL_READ_CHUNK_SIZE))
                 elif file_ext.endswith('.csv'):
-                    try:
-                        df = pd.read_csv(csv_file_path, encoding='utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            df = pd.read_csv(csv_file_path, encoding='latin-1')
-                        except UnicodeDecodeError:
-                            df = pd.read_csv(csv_file_path, encoding='iso-8859-1')
+                    encoding = detect_csv_encoding(csv_file_path)
+                    chunks = iter(iter_csv_chunks(csv_file_path, chunk_size=chunk_size or CSV_READ_CHUNK_SIZE, encoding=encoding))
                 else:
                     return {
                         "status": "error",
                         "error": f"Unsupported file type. Only CSV and XLSX files are supported.",
                     }
+                first_chunk = next(chunks, None)
             except Exception as e:
                 return {
                     "status": "error",
                     "error": f"Failed to read file: {str(e)}",
                 }
             
-            if df.empty:
+            if first_chunk is None or first_chunk.empty:
                 return {
                     "status": "error",
                     "error": "File is empty",
                 }
             
-            print(f"[Sola RAG] Loaded file {filename} with {len(df)} rows")
-            logger.info(f"Sola RAG: Loaded file {filename} with {len(df)} rows")
-            
-            # Normalize column names
-            df.columns = df.columns.str.lower().str.strip()
+            encoding_info = f", encoding {encoding}" if encoding else ""
+            print(f"[Sola RAG] Loaded file {filename} ({len(first_chunk)} rows in first chunk{encoding_info})")
+            logger.info(f"Sola RAG: Loaded file {filename} ({len(first_chunk)} rows in first chunk{encoding_info})")
             
             # Initialize search client (một lần cho tất cả rows)
             index_name = SOLA_RAG_INDEX_NAME
-            from azure.core.credentials import AzureKeyCredential
-            from azure.search.documents import SearchClient
+            search_client = get_search_client(index_name)
             
-            search_client = SearchClient(
-                endpoint=AZURE_SEARCH_ENDPOINT,
-                index_name=index_name,
-                credential=AzureKeyCredential(AZURE_SEARCH_KEY),
-                
-            )
+            # Pipelined indexing: Chunks → Documents (column-wise) → Embedding workers (batched) → Upload stage (batched)
+            print(f"[Sola RAG] Processing rows through ingestion pipeline (embedding batch={embedding_batch_size}, upload batch={upload_batch_size}, workers={max_workers})...")
+            logger.info(f"Sola RAG: Processing rows through ingestion pipeline (embedding batch={embedding_batch_size}, upload batch={upload_batch_size}, workers={max_workers})")
+            
+            total_rows = 0
+            
+            # Progress checkpoint (last committed row + failed ids) for crash/resume
+            checkpoint = IngestionCheckpoint.open(index_name, filename, Path(csv_file_path), resume)
+            resumed_from_row = checkpoint.last_committed_row
+            if resume and resumed_from_row:
+                print(f"[Sola RAG] Resuming after row {resumed_from_row} ({len(checkpoint.failed_ids)} failed rows to retry)")
+                logger.info(f"Sola RAG: Resuming after row {resumed_from_row} ({len(checkpoint.failed_ids)} failed rows to retry)")
             
-            # Process từng row: Build document → Generate embedding → Index
-            print(f"[Sola RAG] Processing {len(df)} rows sequentially (row → embedding → index)...")
-            logger.info(f"Sola RAG: Processing {len(df)} rows sequentially")
+            def _iter_documents():
+                nonlocal total_rows
+                for chunk in itertools.chain([first_chunk], chunks):
+                    # Normalize column names
+                    chunk.columns = chunk.columns.str.lower().str.strip()
+                    total_rows += len(chunk)
+                    for search_doc in build_csv_documents(chunk, filename):
+                        if checkpoint.should_process(search_doc["row_index"], search_doc["id"]):
+                            yield search_doc
             
-            total_indexed = 0
-            total_failed = 0
+            def _on_batch_done(batch: List[Dict[str, Any]], batch_failed_ids: List[str]) -> None:
+                checkpoint.mark_done([(d["row_index"], d["id"]) for d in batch], batch_failed_ids)
+                checkpoint.save()
+                if len(batch_failed_ids) < len(batch):
+                    bump_index_version(index_name)
             
             try:
-                for idx, row in df.iterrows():
-                    try:
-                        # Build content text from row data
-                        content_parts = []
-                        for col in df.columns:
-                            value = row.get(col)
-                            if pd.notna(value) and str(value).strip():
-                                content_parts.append(f"{col}: {value}")
-                        
-                        content_text = ". ".join(content_parts) + "."
-                        
-                        # Build metadata
-                        metadata = {
-                            "row_index": int(idx) + 1,  # 1-based
-                            "filename": filename,
-                        }
-                        
-                        # Add all row data as metadata (only Base Carbone fields that exist in schema)
-                        for col in df.columns:
-                            value = row.get(col)
-                            if pd.notna(value):
-                                # Only include Base Carbone schema fields
-                                if col in ["identifier", "status", "name_fr", "name_en", "category", "tags_fr", "tags_en",
-                                          "unit_fr", "unit_en", "contributor", "programme", "source", "url", "location",
-                                          "total", "co2f", "ch4f", "ch4b", "n2o"]:
-                                    if col in ["identifier", "row_index"]:
-                                        try:
-                                            metadata[col] = int(value) if value else 0
-                                        except:
-                                            metadata[col] = str(value)
-                                    elif col in ["total", "co2f", "ch4f", "ch4b", "n2o"]:
-                                        try:
-                                            metadata[col] = float(value) if value else None
-                                        except:
-                                            metadata[col] = str(value)
-                                    else:
-                                        metadata[col] = str(value) if value else ""
-                        
-                        # Generate embedding for this document
-                        embedding = create_embedding_with_dimensions(content_text)
-                        
-                        # Build search document (doc_id must be URL-safe for Azure Search)
-                        doc_id = f"sola_{sanitize_key(str(metadata['row_index']))}"
-                        search_doc = {
-                            "id": doc_id,
-                            "content": content_text,
-                            "content_vector": embedding,
-                            **metadata,  # Only fields already filtered to match schema
-                        }
-                        
-                        # Index document to Azure AI Search (từng document một)
-                        print(f"[Sola RAG] Indexing doc_id={doc_id}")
-                        result = search_client.upload_documents(documents=[search_doc])
-                        if result[0].succeeded:
-                            total_indexed += 1
-                            if total_indexed % 100 == 0:
-                                print(f"[Sola RAG] Indexed {total_indexed} rows...")
-                                logger.info(f"Sola RAG: Indexed {total_indexed} rows")
-                        else:
-                            total_failed += 1
-                            logger.warning(f"Sola RAG: Failed to index row {metadata['row_index']}: {result[0].error_message}")
-                            
-                    except Exception as row_error:
-                        total_failed += 1
-                        print(f"[Sola RAG] ERROR doc_id={doc_id if 'doc_id' in locals() else 'unknown'} row_index={metadata.get('row_index','?')} err={row_error}")
-                        logger.error(f"Sola RAG: Error processing row {idx}: {row_error}", exc_info=True)
-                        continue
-                
-                print(f"[Sola RAG] SUCCESS: Indexed {total_indexed}/{len(df)} rows to index '{index_name}' (failed: {total_failed})")
-                logger.info(f"Sola RAG: Successfully indexed {total_indexed}/{len(df)} rows to index '{index_name}' (failed: {total_failed})")
+                batch_result = index_documents_in_batches(
+                    search_client,
+                    _iter_documents(),
+                    embedding_batch_size=embedding_batch_size,
+                    upload_batch_size=upload_batch_size,
+                    max_workers=max_workers,
+                    log_prefix="Sola RAG",
+                    on_batch_done=_on_batch_done,
+                )
+                checkpoint.finish()
+                if isinstance(search_client, LocalVectorIndex):
+                    search_client.maybe_build_ann_index()
+                total_indexed = batch_result["indexed"]
+                total_failed = batch_result["failed"]
+                print(f"[Sola RAG] SUCCESS: Indexed {total_indexed}/{total_rows} rows to index '{index_name}' (failed: {total_failed})")
+                logger.info(f"Sola RAG: Successfully indexed {total_indexed}/{total_rows} rows to index '{index_name}' (failed: {total_failed})")
                 
                 return {
                     "status": "success",
                     "file": filename,
                     "docs_indexed": total_indexed,
-                    "total_rows": len(df),
+                    "total_rows": total_rows,
                     "failed": total_failed,
+                    "resumed_from_row": resumed_from_row if resume else None,
+                    "encoding": encoding,
                     "index_name": index_name,
                 }
                 
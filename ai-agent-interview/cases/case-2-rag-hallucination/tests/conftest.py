@@ -0,0 +1,35 @@
+"""
+Test setup for the case 2 modules.
+
+case2_rag / case2_export read Django settings at import time and import each other as
+companies.sdk.sola_rag / companies.sdk.sola_export, so both are configured here before
+any test module imports them.
+"""
+import sys
+import types
+from pathlib import Path
+
+CASE_DIR = Path(__file__).resolve().parent.parent
+if str(CASE_DIR) not in sys.path:
+    sys.path.insert(0, str(CASE_DIR))
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        OPENAI_API_BASE="https://openai.invalid/",
+        OPENAI_API_KEY="test",
+        OPENAI_API_VERSION="2024-02-01",
+        RAG_AZURE_AI_SEARCH_ENDPOINT="https://search.invalid",
+        RAG_AZURE_AI_SEARCH_KEY="test",
+    )
+
+import case2_rag  # noqa: E402
+
+sys.modules.setdefault("companies", types.ModuleType("companies"))
+sys.modules.setdefault("companies.sdk", types.ModuleType("companies.sdk"))
+sys.modules["companies.sdk.sola_rag"] = case2_rag
+
+import case2_export  # noqa: E402
+
+sys.modules["companies.sdk.sola_export"] = case2_export
@@ -0,0 +1,69 @@
+import pytest
+
+import case2_rag
+from case2_rag import MemoryAnswerCache, SqliteAnswerCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(max_entries=2, ttl=0):
+        if request.param == "sqlite":
+            return SqliteAnswerCache(tmp_path / "answers.sqlite3", max_entries, ttl)
+        return MemoryAnswerCache(max_entries, ttl)
+    return make
+
+
+def test_get_returns_what_was_put(make_cache):
+    cache = make_cache()
+    assert cache.get("k") is None
+    cache.put("k", {"answer": "a", "references": [{"identifier": 1}], "index_name": "i"})
+    assert cache.get("k") == {"answer": "a", "references": [{"identifier": 1}], "index_name": "i"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(make_cache, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(case2_rag.time, "time", lambda: float(next(clock)))
+    cache = make_cache(max_entries=2)
+    cache.put("a", {"answer": "a"})
+    cache.put("b", {"answer": "b"})
+    assert cache.get("a") is not None
+    cache.put("c", {"answer": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_expired_entries_are_not_served(make_cache, monkeypatch):
+    cache = make_cache(ttl=60)
+    monkeypatch.setattr(case2_rag.time, "time", lambda: 1000.0)
+    cache.put("k", {"answer": "a"})
+    monkeypatch.setattr(case2_rag.time, "time", lambda: 1059.0)
+    assert cache.get("k") is not None
+    monkeypatch.setattr(case2_rag.time, "time", lambda: 1061.0)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_sqlite_cache_is_shared_through_the_file(tmp_path):
+    SqliteAnswerCache(tmp_path / "answers.sqlite3", 10, 0).put("k", {"answer": "a"})
+    assert SqliteAnswerCache(tmp_path / "answers.sqlite3", 10, 0).get("k") == {"answer": "a"}
+
+
+def test_cache_keys_normalize_the_question_within_a_partition():
+    partition = case2_rag.answer_cache_partition("Transport", None, 4, "prompt", "v1")
+    assert case2_rag.answer_cache_key("  Emission factor of the METRO ? ", partition) == case2_rag.answer_cache_key("emission factor of the metro", partition)
+    other = case2_rag.answer_cache_partition("Transport", None, 4, "prompt", "v2")
+    assert case2_rag.answer_cache_key("emission factor of the metro", other) != case2_rag.answer_cache_key("emission factor of the metro", partition)
+
+
+def test_answer_caches_stay_disabled_without_a_configured_index_state_dir(monkeypatch, caplog):
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR_CONFIGURED", False)
+    monkeypatch.setattr(case2_rag, "_answer_cache_state_dir_warned", False)
+    monkeypatch.setattr(case2_rag, "RAG_ANSWER_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(case2_rag, "RAG_SEMANTIC_CACHE_MODE", "shadow")
+    monkeypatch.setattr(case2_rag, "_answer_cache", None)
+    monkeypatch.setattr(case2_rag, "_semantic_answer_cache", None)
+    for _ in range(3):
+        assert case2_rag.get_answer_cache() is None and case2_rag.get_semantic_answer_cache() is None
+    assert len([record for record in caplog.records if "RAG_INDEX_STATE_DIR" in record.message]) == 1
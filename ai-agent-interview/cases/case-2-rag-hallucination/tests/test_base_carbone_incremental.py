@@ -0,0 +1,69 @@
+import pytest
+
+import case2_rag
+
+
+def _document(row_index, name):
+    return {"id": f"base_carbone_{row_index}", "row_index": row_index, "identifier": 1000 + row_index, "name_fr": name, "content": name}
+
+
+@pytest.fixture
+def ingest(monkeypatch, tmp_path):
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR", tmp_path / "state")
+    monkeypatch.setattr(case2_rag, "RAG_SEARCH_BACKEND", "local")
+    monkeypatch.setattr(case2_rag, "RAG_LOCAL_INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(case2_rag, "_local_indexes", {})
+    embedded = []
+
+    def create_embeddings(texts):
+        embedded.extend(texts)
+        return [[float(len(text))] + [1.0] * (case2_rag.EMBEDDING_DIMENSIONS - 1) for text in texts]
+
+    monkeypatch.setattr(case2_rag, "create_embeddings_with_dimensions", create_embeddings)
+    source = tmp_path / "Base_Carbone.xlsx"
+
+    def run(documents, incremental=True):
+        source.write_text(repr(documents))  # a new source checksum per content
+        monkeypatch.setattr(case2_rag, "iter_base_carbone_document_chunks", lambda *args, **kwargs: iter([documents]))
+        embedded.clear()
+        result = case2_rag.BaseCarboneExcelProcessor().upload_base_carbone_excel(str(source), incremental=incremental)
+        assert result["status"] == "success", result
+        return result, list(embedded)
+
+    return run
+
+
+def test_incremental_runs_only_embed_changed_rows_and_delete_removed_ones(ingest):
+    result, embedded = ingest([_document(1, "Gaz"), _document(2, "Fioul"), _document(3, "Propane")], incremental=False)
+    assert (result["docs_indexed"], len(embedded)) == (3, 3)
+
+    result, embedded = ingest([_document(1, "Gaz"), _document(2, "Fioul"), _document(3, "Propane")])
+    assert (result["docs_indexed"], result["unchanged"], embedded) == (0, 3, [])
+
+    result, embedded = ingest([_document(1, "Gaz naturel"), _document(2, "Fioul"), _document(4, "Butane")])
+    assert (result["docs_indexed"], result["unchanged"], result["deleted"]) == (2, 1, 1)
+    assert sorted(embedded) == ["Butane", "Gaz naturel"]
+    index = case2_rag.get_local_vector_index(case2_rag.SOLA_RAG_INDEX_NAME)
+    assert sorted(doc["id"] for doc in index._documents) == ["base_carbone_1", "base_carbone_2", "base_carbone_4"]
+    assert index.get_document("base_carbone_1")["name_fr"] == "Gaz naturel"
+
+    result, embedded = ingest([_document(1, "Gaz naturel"), _document(2, "Fioul"), _document(4, "Butane")])
+    assert (result["docs_indexed"], result["deleted"], embedded) == (0, 0, [])
+
+
+def test_failed_rows_are_retried_by_the_next_incremental_run(ingest, monkeypatch):
+    ingest([_document(1, "Gaz"), _document(2, "Fioul")], incremental=False)
+    create_embeddings = case2_rag.create_embeddings_with_dimensions
+
+    def failing(texts):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(case2_rag, "create_embeddings_with_dimensions", failing)
+    documents = [_document(1, "Gaz naturel"), _document(2, "Fioul")]
+    result, _ = ingest(documents)
+    assert (result["docs_indexed"], result["failed"], result["unchanged"]) == (0, 1, 1)
+
+    monkeypatch.setattr(case2_rag, "create_embeddings_with_dimensions", create_embeddings)
+    result, embedded = ingest(documents)
+    assert (result["docs_indexed"], result["unchanged"]) == (1, 1)
+    assert embedded == ["Gaz naturel"]
@@ -0,0 +1,57 @@
+import numpy as np
+
+from case2_rag import EmbeddingCache
+
+DIMENSIONS = 4
+
+
+def _cache(path, max_entries=8):
+    return EmbeddingCache(path, "model", DIMENSIONS, max_entries)
+
+
+def test_vectors_survive_a_reload(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["tram", "bus"], [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+    cache.flush()
+    reloaded = _cache(tmp_path)
+    assert reloaded.get_many(["bus", "  tram ", "train"]) == [[0.0, 1.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0], None]
+
+
+def test_a_key_persisted_without_its_vector_is_a_miss(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["tram", "bus"], [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+    cache.flush()
+    # Power loss: the .keys page reached the disk, the .f32 page of slot 0 did not
+    vectors = np.memmap(next(tmp_path.glob("*.f32")), dtype=np.float32, mode="r+", shape=(8, DIMENSIONS))
+    vectors[0] = 0.0
+    vectors.flush()
+    reloaded = _cache(tmp_path)
+    assert reloaded.get_many(["tram", "bus"]) == [None, [0.0, 1.0, 0.0, 0.0]]
+    reloaded.put_many(["tram"], [[0.5, 0.5, 0.0, 0.0]])
+    assert reloaded.get_many(["tram"]) == [[0.5, 0.5, 0.0, 0.0]]
+    assert reloaded.stats()["entries"] == 2
+
+
+def test_processes_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+    # Two instances on one directory stand for two worker processes (each has its own lock file handle)
+    first, second = _cache(tmp_path), _cache(tmp_path)
+    first.put_many(["tram"], [[1.0, 0.0, 0.0, 0.0]])
+    second.put_many(["bus"], [[0.0, 1.0, 0.0, 0.0]])
+    first.put_many(["metro"], [[0.0, 0.0, 1.0, 0.0]])
+    for cache in (first, second):
+        assert cache.get_many(["tram", "bus", "metro"]) == [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0]]
+        assert cache.stats()["entries"] == 3
+
+
+def test_changing_max_entries_keeps_the_most_recently_used_entries(tmp_path):
+    cache = _cache(tmp_path, max_entries=4)
+    texts = ["a", "b", "c", "d"]
+    cache.put_many(texts, [[float(i), 0.0, 0.0, 0.0] for i in range(4)])
+    cache.flush()
+    grown = _cache(tmp_path, max_entries=8)
+    assert grown.get_many(texts) == [[float(i), 0.0, 0.0, 0.0] for i in range(4)]
+    grown.flush()
+    shrunk = _cache(tmp_path, max_entries=2)
+    # The last lookups read a, b, c, d: "c" and "d" are the most recently used
+    assert shrunk.get_many(["c", "d", "a", "b"]) == [[2.0, 0.0, 0.0, 0.0], [3.0, 0.0, 0.0, 0.0], None, None]
+    assert shrunk.stats()["entries"] == 2
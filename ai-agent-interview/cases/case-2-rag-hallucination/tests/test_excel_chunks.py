@@ -0,0 +1,18 @@
+from openpyxl import Workbook
+
+from case2_rag import iter_excel_chunks
+
+
+def test_first_sheet_is_read_whatever_sheet_was_active(tmp_path):
+    wb = Workbook()
+    wb.active.append(["name", "value"])
+    wb.active.append(["first", 1])
+    second = wb.create_sheet("Second")
+    second.append(["name", "value"])
+    second.append(["second", 2])
+    wb.active = 1
+    path = tmp_path / "workbook.xlsx"
+    wb.save(path)
+
+    assert list(next(iter(iter_excel_chunks(path)))["name"]) == ["first"]
+    assert list(next(iter(iter_excel_chunks(path, sheet_name="Second")))["name"]) == ["second"]
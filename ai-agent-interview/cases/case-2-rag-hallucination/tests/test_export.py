@@ -0,0 +1,173 @@
+import hashlib
+import math
+import re
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+from django.conf import settings
+from openpyxl import Workbook, load_workbook
+
+import case2_export
+import case2_rag
+
+INVOICE_HEADER = ("source_file", "invoice_type", "activity_data", "unit", "location", "date")
+INVOICE_TYPES = [
+    "diesel fuel", "train ticket Paris Lyon", "office electricity", "diesel fuel", "natural gas heating",
+    "laptop purchase", "hotel night", "train ticket Paris Lyon", "plastic packaging", "office electricity",
+    "taxi ride", "diesel fuel",
+]
+FACTORS = [
+    ("Gazole routier", "Diesel fuel", "Combustibles > Fossiles > Liquides", "litre", 3.1),
+    ("TGV", "High speed train", "Transport de personnes > Ferroviaire", "passager.km", 0.0029),
+    ("Electricité - mix moyen", "Electricity - average mix", "Electricité > France continentale", "kWh", 0.052),
+    ("Gaz naturel", "Natural gas", "Combustibles > Fossiles > Gazeux", "kWh PCI", 0.227),
+    ("Ordinateur portable", "Laptop computer", "Achats de biens > Equipements informatiques", "unité", 156.0),
+    ("Nuitée d'hôtel", "Hotel night", "Achats de services > Hébergement", "nuitée", 6.9),
+    ("Plastique", "Plastic packaging", "Achats de biens > Emballages", "tonne", 2830.0),
+    ("Taxi", "Taxi ride", "Transport de personnes > Routier", "km", 0.2),
+]
+
+
+def _embedding(text):
+    # Hashed bag of words: texts sharing words are close
+    vector = np.zeros(case2_rag.EMBEDDING_DIMENSIONS, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        h = int(hashlib.md5(token.encode()).hexdigest()[:8], 16)
+        vector[h % len(vector)] += 1.0
+    return vector.tolist()
+
+
+def _factor_document(row_index, name_fr, name_en, category, unit, total):
+    return {
+        "id": f"base_carbone_{row_index}", "content": f"{name_fr} {name_en} {category}", "row_index": row_index,
+        "identifier": 20000 + row_index, "status": "Valide générique", "name_fr": name_fr, "name_en": name_en,
+        "category": category, "tags_fr": name_fr, "tags_en": name_en, "unit_fr": unit, "unit_en": unit,
+        "location": "France continentale", "total": total, "content_vector": _embedding(f"{name_fr} {name_en} {category}"),
+    }
+
+
+@pytest.fixture
+def export(monkeypatch, tmp_path):
+    monkeypatch.setattr(case2_rag, "RAG_SEARCH_BACKEND", "local")
+    monkeypatch.setattr(case2_rag, "RAG_LOCAL_INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR", tmp_path / "state")
+    monkeypatch.setattr(case2_rag, "BASE_CARBONE_SNAPSHOT_DIR", tmp_path / "snapshot")
+    monkeypatch.setattr(case2_rag, "_local_indexes", {})
+    monkeypatch.setattr(case2_export, "_factor_store", None, raising=False)
+    case2_rag.get_search_client().upload_documents([_factor_document(i + 1, *factor) for i, factor in enumerate(FACTORS)])
+
+    embedded = []
+
+    def create_embeddings(texts):
+        embedded.append(list(texts))
+        return [_embedding(text) for text in texts]
+
+    def create_embedding(text):
+        pytest.fail("query embedded one by one")
+
+    monkeypatch.setattr(case2_rag, "create_embeddings_with_dimensions", create_embeddings)
+    monkeypatch.setattr(case2_rag, "create_embedding_with_dimensions", create_embedding)
+
+    def offline(*args, **kwargs):
+        raise case2_export.requests.ConnectionError("offline")
+
+    monkeypatch.setattr(case2_export.requests, "get", offline)
+
+    invoices = tmp_path / "invoices.xlsx"
+    workbook = Workbook()
+    workbook.active.append(INVOICE_HEADER)
+    for i, invoice_type in enumerate(INVOICE_TYPES):
+        workbook.active.append((f"invoice_{i}.pdf", invoice_type, f"{10 + i}.000", "EUR", "France", "2024-04-03"))
+    workbook.save(invoices)
+
+    class DataHubFile:
+        file_name, blob_name, upload_date = "invoices.xlsx", "invoices", "today"
+
+    class Query:
+        def filter(self, **kwargs):
+            return self
+
+        def order_by(self, *args):
+            return self
+
+        def first(self):
+            return DataHubFile()
+
+    models = types.ModuleType("companies.models")
+    models.DataHubDocument = type("DataHubDocument", (), {"objects": Query(), "DataType": types.SimpleNamespace(AI_INPUT_SOLA="sola")})
+    blob = types.ModuleType("companies.sdk.azure_storage_blob")
+    blob.AzureStorageBlob = type("AzureStorageBlob", (), {
+        "__init__": lambda self, container: None,
+        "download_blob_content": lambda self, name: invoices.read_bytes(),
+    })
+    monkeypatch.setitem(sys.modules, "companies.models", models)
+    monkeypatch.setitem(sys.modules, "companies.sdk.azure_storage_blob", blob)
+    monkeypatch.setattr(settings, "SOLA_RAG_AZURE_STORAGE_CONTAINER_NAME", "container", raising=False)
+    (tmp_path / "companies" / "static" / "data").mkdir(parents=True)
+    (tmp_path / "companies" / "static" / "data" / "template.xlsx").write_bytes((case2_rag.Path(case2_export.__file__).parent / "template.xlsx").read_bytes())
+    monkeypatch.chdir(tmp_path)
+
+    def run(**kwargs):
+        embedded.clear()
+        result = case2_export.export_sola_to_excel("task", 1, **kwargs)
+        assert result["status"] == "completed", result
+        workbook = load_workbook(result["file_path"], read_only=True)
+        return [[row for row in sheet.iter_rows(values_only=True)] for sheet in workbook.worksheets], list(embedded)
+
+    return run
+
+
+def test_candidates_are_retrieved_with_batched_embeddings(export, monkeypatch):
+    monkeypatch.setattr(case2_rag, "EMBEDDING_BATCH_SIZE", 4)
+    _, embedded = export()
+    prompts = [prompt for batch in embedded for prompt in batch]
+    assert len(prompts) == len(set(prompts)) == len(set(INVOICE_TYPES))  # duplicate invoices share one query
+    assert [len(batch) for batch in embedded] == [4] * (len(prompts) // 4) + ([len(prompts) % 4] if len(prompts) % 4 else [])
+    assert len(embedded) == math.ceil(len(prompts) / 4)
+
+
+def test_concurrent_matching_writes_the_same_rows_in_invoice_order(export, monkeypatch):
+    build_mapping = case2_export.build_mapping
+
+    def slow_first_invoices(invoice, *args):
+        # Earlier invoices finish last, so workers complete out of order
+        position = int(re.search(r"\d+", invoice.source_file).group())
+        time.sleep(0.002 * (len(INVOICE_TYPES) - position))
+        return build_mapping(invoice, *args)
+
+    monkeypatch.setattr(case2_export, "build_mapping", slow_first_invoices)
+    sequential, _ = export(max_workers=1)
+    concurrent, _ = export(max_workers=8)
+    assert concurrent == sequential
+    invoice_rows = [row for row in sequential[0] if row[1] in INVOICE_TYPES]
+    assert [row[1] for row in invoice_rows] == INVOICE_TYPES
+
+
+def test_progress_is_reported_while_candidates_are_retrieved(export, monkeypatch):
+    monkeypatch.setattr(case2_rag, "EMBEDDING_BATCH_SIZE", 2)
+    reports = []
+    export(progress_callback=lambda status, progress, message: reports.append((progress, message)))
+    retrieval = [progress for progress, message in reports if message.startswith("Retrieving candidate factors")]
+    assert retrieval[0] == 25 and retrieval[-1] == 50 and len(retrieval) > 3
+    progresses = [progress for progress, _ in reports]
+    assert progresses == sorted(progresses) and progresses[-1] == 100
+
+
+def test_hybrid_similarities_come_from_the_vector_subscores(export, monkeypatch):
+    monkeypatch.setattr(case2_rag, "RAG_HYBRID_SEARCH", True)
+    search = case2_rag.LocalVectorIndex.search
+    requests = []
+
+    def spy(self, search_text=None, **kwargs):
+        requests.append((search_text, kwargs))
+        return search(self, search_text, **kwargs)
+
+    monkeypatch.setattr(case2_rag.LocalVectorIndex, "search", spy)
+    export()
+    hybrid = [kwargs for text, kwargs in requests if text not in (None, "*") and kwargs.get("vector_queries")]
+    assert hybrid and all(kwargs["debug"] == "vector" and "content_vector" not in kwargs["select"] for kwargs in hybrid)
+    # Every factor is within the vector top 30 here: no hit is keyword-only, so no vector is fetched
+    assert not [kwargs for text, kwargs in requests if "content_vector" in (kwargs.get("select") or [])]
@@ -0,0 +1,28 @@
+from case2_export import FactorStore
+
+
+def _document(row_index, name, identifier=None):
+    return {"id": f"base_carbone_{row_index}", "row_index": row_index, "identifier": identifier or 1000 + row_index, "name_fr": name}
+
+
+def test_hits_resolve_by_document_id_not_row_index():
+    store = FactorStore.from_documents([_document(1, "Gaz"), _document(2, "Fioul")], version="v1")
+    assert len(store) == 2
+    assert store.resolve_hit({"id": "base_carbone_2", "row_index": 2, "identifier": 1002}).name_fr == "Fioul"
+    # A CSV document with the same row_index is not a Base Carbone factor
+    assert store.resolve_hit({"id": "sola_2", "row_index": 2}) is None
+    assert store.resolve_hit({"row_index": 2}) is None
+
+
+def test_hits_of_another_version_of_the_row_are_not_resolved():
+    store = FactorStore.from_documents([_document(1, "Gaz", identifier=7)])
+    assert store.resolve_hit({"id": "base_carbone_1", "identifier": 8}) is None
+    assert store.get("base_carbone_1").identifier == 7
+
+
+def test_hits_with_other_emission_values_are_not_resolved():
+    # A new Base Carbone release keeps the identifier and changes the values
+    store = FactorStore.from_documents([dict(_document(1, "Gaz"), total=0.2, co2f=0.18)])
+    assert store.resolve_hit({"id": "base_carbone_1", "identifier": 1001, "total": 0.2, "co2f": 0.18, "n2o": None}).name_fr == "Gaz"
+    assert store.resolve_hit({"id": "base_carbone_1", "identifier": 1001, "total": 0.25, "co2f": 0.18}) is None
+    assert store.resolve_hit({"id": "base_carbone_1", "identifier": 1001, "total": 0.2, "co2f": 0.18, "n2o": 0.01}) is None
@@ -0,0 +1,66 @@
+import pytest
+
+import case2_rag
+from case2_rag import IngestionCheckpoint
+
+
+@pytest.fixture
+def source(monkeypatch, tmp_path):
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR", tmp_path / "state")
+    path = tmp_path / "factors.xlsx"
+    path.write_bytes(b"version 1")
+    return path
+
+
+def test_committed_row_only_advances_over_a_contiguous_prefix(source):
+    checkpoint = IngestionCheckpoint.open("index", source.name, source, resume=False)
+    checkpoint.mark_done([(3, "c"), (4, "d")])
+    assert checkpoint.last_committed_row == 0
+    checkpoint.mark_done([(1, "a"), (2, "b")], failed=["b"])
+    assert checkpoint.last_committed_row == 4
+    assert checkpoint.failed_ids == {"b": 2}
+
+
+def test_resume_skips_committed_rows_and_retries_failed_ones(source):
+    checkpoint = IngestionCheckpoint.open("index", source.name, source, resume=False)
+    checkpoint.mark_done([(1, "a"), (2, "b"), (3, "c")], failed=["b"])
+    checkpoint.save()
+
+    resumed = IngestionCheckpoint.open("index", source.name, source, resume=True)
+    assert resumed.last_committed_row == 3
+    assert [resumed.should_process(row, doc_id) for row, doc_id in [(1, "a"), (2, "b"), (3, "c"), (4, "d")]] == [
+        False, True, False, True,
+    ]
+    resumed.mark_done([(2, "b")])
+    resumed.finish()
+    assert not resumed.path.exists()
+
+
+def test_resume_ignores_a_checkpoint_of_another_source_version(source):
+    checkpoint = IngestionCheckpoint.open("index", source.name, source, resume=False)
+    checkpoint.mark_done([(1, "a")])
+    checkpoint.save()
+    source.write_bytes(b"version 2")
+    assert IngestionCheckpoint.open("index", source.name, source, resume=True).last_committed_row == 0
+    assert IngestionCheckpoint.open("index", source.name, source, resume=False).last_committed_row == 0
+
+
+def test_precomputed_checksum_is_not_recomputed(source, monkeypatch):
+    checksum = case2_rag.compute_file_checksum(source)
+    checkpoint = IngestionCheckpoint.open("index", source.name, source, resume=False)
+    checkpoint.mark_done([(1, "a")])
+    checkpoint.save()
+
+    def fail(path):
+        raise AssertionError("source hashed again")
+
+    monkeypatch.setattr(case2_rag, "compute_file_checksum", fail)
+    resumed = IngestionCheckpoint.open("index", source.name, source, resume=True, source_checksum=checksum)
+    assert resumed.last_committed_row == 1
+
+
+def test_finish_keeps_failed_rows_for_the_next_run(source):
+    checkpoint = IngestionCheckpoint.open("index", source.name, source, resume=False)
+    checkpoint.mark_done([(1, "a")], failed=["a"])
+    checkpoint.finish()
+    assert IngestionCheckpoint.open("index", source.name, source, resume=True).failed_ids == {"a": 1}
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+import case2_rag
+from case2_rag import LocalIndexingResult
+
+
+def _documents(count):
+    return [{"id": f"d{i}", "content": f"text {i}"} for i in range(count)]
+
+
+class FakeSearchClient:
+    def __init__(self, fail_keys=(), broken_results=False, raises=False):
+        self.fail_keys = set(fail_keys)
+        self.broken_results = broken_results
+        self.raises = raises
+        self.uploaded = []
+
+    def upload_documents(self, documents):
+        if self.raises:
+            raise RuntimeError("service unavailable")
+        self.uploaded.extend(doc["id"] for doc in documents)
+        return self._results(documents)
+
+    def _results(self, documents):
+        for doc in documents:
+            if self.broken_results:
+                raise ConnectionError("connection reset while reading results")
+            yield LocalIndexingResult(doc["id"], doc["id"] not in self.fail_keys, "rejected" if doc["id"] in self.fail_keys else None, 200)
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    def create_embeddings(texts):
+        return [[1.0] * 4 for _ in texts]
+
+    monkeypatch.setattr(case2_rag, "create_embeddings_with_dimensions", create_embeddings)
+
+
+def _index(client, documents, **kwargs):
+    # Run in a thread so a pipeline deadlock fails the test instead of hanging it
+    done = []
+    result = {}
+
+    def on_batch_done(batch, failed_ids):
+        done.append(([d["id"] for d in batch], list(failed_ids)))
+
+    def run():
+        result.update(case2_rag.index_documents_in_batches(
+            client, documents, embedding_batch_size=1, upload_batch_size=2, max_workers=2,
+            on_batch_done=on_batch_done, **kwargs,
+        ))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "indexing pipeline deadlocked"
+    return result, done
+
+
+def test_per_document_results_are_counted_and_reported(embeddings):
+    result, done = _index(FakeSearchClient(fail_keys={"d3"}), _documents(6))
+    assert (result["total"], result["indexed"], result["failed"], result["failed_ids"]) == (6, 5, 1, ["d3"])
+    assert sorted(doc_id for batch, _ in done for doc_id in batch) == [f"d{i}" for i in range(6)]
+    assert [failed for _, failed in done if failed] == [["d3"]]
+
+
+@pytest.mark.parametrize("client", [FakeSearchClient(raises=True), FakeSearchClient(broken_results=True)], ids=["upload", "results"])
+def test_failing_uploads_fail_their_batches_without_stalling_the_pipeline(embeddings, client):
+    result, done = _index(client, _documents(40))
+    assert (result["indexed"], result["failed"]) == (0, 40)
+    assert sorted(result["failed_ids"]) == sorted(f"d{i}" for i in range(40))
+    assert sum(len(batch) for batch, _ in done) == 40
+
+
+def test_short_embedding_responses_fail_the_documents_without_a_vector(monkeypatch):
+    monkeypatch.setattr(case2_rag, "create_embeddings_with_dimensions", lambda texts: [[1.0] * 4 for _ in texts[:-1]])
+    client = FakeSearchClient()
+    result = case2_rag.index_documents_in_batches(client, _documents(4), embedding_batch_size=2, upload_batch_size=10, max_workers=1)
+    assert (result["indexed"], result["failed"]) == (2, 2)
+    assert sorted(result["failed_ids"]) == ["d1", "d3"] and sorted(client.uploaded) == ["d0", "d2"]
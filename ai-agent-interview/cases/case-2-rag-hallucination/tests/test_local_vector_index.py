@@ -0,0 +1,205 @@
+import numpy as np
+import pytest
+
+import case2_rag
+from case2_rag import LocalVectorIndex
+
+DIMENSIONS = 8
+
+
+def _doc(doc_id, seed, **fields):
+    vector = np.random.default_rng(seed).normal(size=DIMENSIONS)
+    return {"id": doc_id, "content": fields.pop("content", f"document {doc_id}"), "content_vector": vector.tolist(), **fields}
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LocalVectorIndex(tmp_path / "index", dimensions=DIMENSIONS)
+
+
+def test_batched_uploads_append_and_replace_rows_in_place(index):
+    index.upload_documents([_doc(f"d{i}", i) for i in range(5)])
+    index.upload_documents([_doc("d1", 100, category="updated"), _doc("d5", 5), _doc("d6", 6)])
+    assert index.get_document_count() == 7
+    assert index.get_document("d1")["category"] == "updated"
+    assert np.allclose(index._vectors[1], _unit(_doc("d1", 100)["content_vector"]))
+    assert (index.path / "vectors.f32").stat().st_size == 7 * DIMENSIONS * 4
+
+    reloaded = LocalVectorIndex(index.path, dimensions=DIMENSIONS)
+    assert [doc["id"] for doc in reloaded._documents] == [f"d{i}" for i in range(7)]
+    assert reloaded.get_document("d1")["category"] == "updated"
+    assert np.array_equal(reloaded._vectors, index._vectors)
+
+
+def test_document_log_is_folded_into_the_snapshot_once_it_outgrows_the_index(index):
+    index.upload_documents([_doc(f"d{i}", i) for i in range(4)])
+    index.upload_documents([_doc("d0", 10, category="first")])
+    assert (index.path / "documents.log").exists()
+    for seed in range(11, 15):
+        index.upload_documents([_doc("d0", seed, category=f"v{seed}")])
+    assert not (index.path / "documents.log").exists()
+    assert LocalVectorIndex(index.path, dimensions=DIMENSIONS).get_document("d0")["category"] == "v14"
+
+
+def test_rows_of_an_interrupted_upload_are_dropped_on_load(index):
+    index.upload_documents([_doc(f"d{i}", i) for i in range(3)])
+    index.upload_documents([_doc("d3", 3)])
+    with open(index.path / "documents.log", "a", encoding="utf-8") as f:
+        f.write('[4, {"id": "d4"')  # crash while appending, before meta.json was updated
+    reloaded = LocalVectorIndex(index.path, dimensions=DIMENSIONS)
+    assert reloaded.get_document_count() == 4
+    reloaded.upload_documents([_doc("d4", 4)])
+    assert LocalVectorIndex(index.path, dimensions=DIMENSIONS).get_document("d4")["id"] == "d4"
+
+
+def test_invalid_documents_are_reported_without_writing(index):
+    results = index.upload_documents([{"id": "d0", "content_vector": [1.0]}, {"content_vector": [1.0] * DIMENSIONS}])
+    assert [result.succeeded for result in results] == [False, False]
+    assert index.get_document_count() == 0
+    assert not index.path.exists()
+
+
+def test_uploads_assign_new_rows_to_ivf_clusters(index):
+    index.upload_documents([_doc(f"d{i}", i) for i in range(40)])
+    index.build_ann_index(nlist=4)
+    index.upload_documents([_doc("d40", 40), _doc("d0", 1000)])
+    assignments = index._ivf["assignments"]
+    assert len(assignments) == 41
+    expected = index._assign_clusters(np.asarray(index._vectors[[0, 40]]), index._ivf["centroids"])
+    assert assignments[[0, 40]].tolist() == expected.tolist()
+    assert len(LocalVectorIndex(index.path, dimensions=DIMENSIONS)._ivf["assignments"]) == 41
+
+
+def test_delete_removes_known_ids_and_reports_unknown_ones(index):
+    index.upload_documents([_doc(f"d{i}", i) for i in range(4)])
+    results = index.delete_documents([{"id": "d1"}, {"id": "missing"}])
+    assert [(result.key, result.succeeded, result.status_code) for result in results] == [("d1", True, 200), ("missing", False, 404)]
+    assert [doc["id"] for doc in LocalVectorIndex(index.path, dimensions=DIMENSIONS)._documents] == ["d0", "d2", "d3"]
+    assert np.allclose(index._vectors[1], _unit(_doc("d2", 2)["content_vector"]))
+
+
+def test_deleting_only_unknown_ids_does_not_rewrite_the_index(index, monkeypatch):
+    index.upload_documents([_doc("d0", 0)])
+    monkeypatch.setattr(index, "_save", lambda *args: pytest.fail("index rewritten"))
+    assert not index.delete_documents([{"id": "missing"}])[0].succeeded
+
+
+def test_delete_in_batches_treats_unknown_ids_as_already_deleted(index):
+    index.upload_documents([_doc("d0", 0), _doc("d1", 1)])
+    assert case2_rag.delete_documents_in_batches(index, ["d0", "missing"]) == (1, [])
+
+
+@pytest.fixture
+def filter_index(index):
+    index.upload_documents([
+        _doc("d0", 0, category="Transport", year=2020, name_fr="Métro, 'ligne' 1"),
+        _doc("d1", 1, category="Transport", year=2023, name_fr=None),
+        _doc("d2", 2, category="Energie", year=2021, name_fr="Gaz"),
+        _doc("d3", 3, category="Energie", year=2024, name_fr="Fioul"),
+    ])
+    return index
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("category eq 'Transport'", ["d0", "d1"]),
+    ("category ne 'Transport'", ["d2", "d3"]),
+    ("year ge 2021 and year lt 2024", ["d1", "d2"]),
+    ("category eq 'Energie' or year le 2020", ["d0", "d2", "d3"]),
+    ("not (category eq 'Energie' and year gt 2021)", ["d0", "d1", "d2"]),
+    ("name_fr eq null", ["d1"]),
+    ("name_fr eq 'Métro, ''ligne'' 1'", ["d0"]),
+    ("search.in(id, 'd3,d0,unknown')", ["d0", "d3"]),
+    ("search.in(name_fr, 'Gaz|Fioul', '|')", ["d2", "d3"]),
+])
+def test_odata_filters(filter_index, expression, expected):
+    assert [hit["id"] for hit in filter_index.search("*", filter=expression, select=["id"], top=10)] == expected
+
+
+@pytest.mark.parametrize("expression", ["category eq", "(year gt 2020", "year between 1", "search.in(id)", "category eq 'a' 'b'"])
+def test_invalid_odata_filters_raise(filter_index, expression):
+    with pytest.raises(ValueError):
+        filter_index.search("*", filter=expression)
+
+
+def test_vector_store_searches_are_hybrid_by_default_like_azure_search(filter_index, monkeypatch):
+    searches = []
+    original_search = filter_index.search
+
+    def search(search_text=None, **kwargs):
+        searches.append(search_text)
+        return original_search(search_text, **kwargs)
+
+    monkeypatch.setattr(filter_index, "search", search)
+    # Query vector of d2, whose nearest neighbour is d1; only d3 matches the keywords
+    store = case2_rag.LocalVectorStore(filter_index, lambda query: _doc("d2", 2)["content_vector"])
+    assert {doc.metadata["id"] for doc, _ in store.similarity_search_with_score("d3", k=2)} == {"d2", "d3"}
+    similarity = store.similarity_search_with_score("d3", k=2, search_type="similarity")
+    assert [doc.metadata["id"] for doc, _ in similarity] == ["d2", "d1"] and similarity[0][1] == pytest.approx(1.0)
+    assert searches == ["d3", None]
+    with pytest.raises(ValueError):
+        store.similarity_search_with_score("d3", search_type="semantic_hybrid")
+
+
+def test_bm25_prefers_rare_terms_and_shorter_documents(index):
+    index.upload_documents([
+        _doc("d0", 0, content="diesel truck transport"),
+        _doc("d1", 1, content="electric truck transport by rail and road over long distances"),
+        _doc("d2", 2, content="rail transport"),
+    ])
+    hits = index.search("electric truck", select=["id"], top=10)
+    assert [hit["id"] for hit in hits] == ["d1", "d0"]  # "electric" is rare, so it outweighs d0's shorter length
+    truck = index.search("truck", select=["id"], top=10)
+    assert [hit["id"] for hit in truck] == ["d0", "d1"] and truck[0]["@search.score"] > truck[1]["@search.score"]
+    assert index.search("aviation") == []
+
+
+def test_hybrid_scores_are_reciprocal_rank_fusion_with_one_based_ranks(filter_index):
+    from azure.search.documents.models import VectorizedQuery
+    k = case2_rag.RAG_HYBRID_RRF_K
+    vector_query = VectorizedQuery(vector=_doc("d2", 2)["content_vector"], k_nearest_neighbors=2, fields="content_vector")
+    hits = filter_index.search("d2", vector_queries=[vector_query], select=["id"], top=3)
+    # d2 is first in both rankings, d1 second by vector only
+    assert [(hit["id"], hit["@search.score"]) for hit in hits] == [
+        ("d2", pytest.approx(2 / (k + 1))),
+        ("d1", pytest.approx(1 / (k + 2))),
+    ]
+
+
+def test_hybrid_debug_info_carries_the_vector_subscores(filter_index):
+    from azure.search.documents.models import VectorizedQuery
+    query_vector = _doc("d2", 2)["content_vector"]
+    vector_query = VectorizedQuery(vector=query_vector, k_nearest_neighbors=2, fields="content_vector")
+    hits = filter_index.search("d2", vector_queries=[vector_query], select=["id"], top=3, debug="vector")
+    vector_only = {hit["id"]: hit["@search.score"] for hit in filter_index.search(vector_queries=[vector_query], select=["id"], top=2)}
+    for hit in hits:
+        subscores = hit["@search.document_debug_info"].vectors.subscores
+        assert subscores.vectors[0]["content_vector"].search_score == pytest.approx(vector_only[hit["id"]])
+    assert "@search.document_debug_info" not in filter_index.search("d2", vector_queries=[vector_query], top=3)[0]
+
+
+def test_vectors_are_returned_only_when_selected(filter_index):
+    hit = filter_index.search("d2", select=["id", "content_vector"], top=1)[0]
+    assert hit["id"] == "d2" and np.allclose(hit["content_vector"], _unit(_doc("d2", 2)["content_vector"]))
+    assert "content_vector" not in filter_index.search("d2", select=["id"], top=1)[0]
+    assert "content_vector" not in filter_index.get_document("d2")
+
+
+def test_ivf_recall_against_exact_search(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(16, DIMENSIONS))
+    vectors = centers[rng.integers(0, 16, size=2000)] + 0.2 * rng.normal(size=(2000, DIMENSIONS))
+    index = LocalVectorIndex(tmp_path / "ivf", dimensions=DIMENSIONS)
+    index.upload_documents([{"id": f"d{i}", "content": "", "content_vector": vector.tolist()} for i, vector in enumerate(vectors)])
+    stats = index.build_ann_index(nlist=16, seed=0)
+    assert stats["count"] == 2000 and stats["empty_clusters"] == 0
+    report = index.ann_recall_report(k=10, nprobe_values=(1, 4, 16), queries=50)
+    recall = {row["nprobe"]: row["recall"] for row in report["rows"]}
+    scanned = {row["nprobe"]: row["scanned"] for row in report["rows"]}
+    assert recall[16] == 1.0  # every cluster probed: exact
+    assert recall[4] >= 0.95 and scanned[4] < 2000
+    assert recall[1] <= recall[4]
@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from case2_export import InvoiceRecord, MatchMemo, invoice_matching_key, strict_mapping_key
+
+KEYS = ["a", "a", "b", "a", "b"]
+REPRESENTATIVES = {"a": 0, "b": 2}
+
+
+def _selection(invoice_index, llm_decision=None):
+    # (selected, candidates, llm_decision, detected_category, is_strict_match)
+    return (f"factor-{invoice_index}", [], llm_decision, None, False)
+
+
+def test_duplicates_reuse_the_representative_selection():
+    calls = []
+
+    def select(invoice_index):
+        calls.append(invoice_index)
+        return _selection(invoice_index)
+
+    memo = MatchMemo(select, KEYS, REPRESENTATIVES)
+    # A duplicate asks first: the selection is still computed from the group's first invoice
+    assert memo.get(3)[0] == "factor-0"
+    assert [memo.get(i)[0] for i in range(5)] == ["factor-0", "factor-0", "factor-2", "factor-0", "factor-2"]
+    assert sorted(calls) == [0, 2]
+    assert memo.stats() == {"hits": 4, "misses": 2, "hit_rate": round(4 / 6, 4)}
+
+
+def test_llm_decisions_are_selected_per_invoice():
+    calls = []
+
+    def select(invoice_index):
+        calls.append(invoice_index)
+        return _selection(invoice_index, llm_decision=f"decision-{invoice_index}")
+
+    memo = MatchMemo(select, KEYS, REPRESENTATIVES)
+    # A duplicate reaching the key first computes the representative's selection, then its own
+    assert memo.get(1)[2] == "decision-1"
+    assert calls == [0, 1]
+    results = [memo.get(i) for i in (0, 2, 3, 4)]
+    assert [result[2] for result in results] == ["decision-0", "decision-2", "decision-3", "decision-4"]
+    # One selection per invoice: the representative's is handed over, never recomputed
+    assert sorted(calls) == [0, 1, 2, 3, 4]
+
+
+def test_empty_selections_are_memoized():
+    calls = []
+
+    def select(invoice_index):
+        calls.append(invoice_index)
+        return None
+
+    memo = MatchMemo(select, KEYS, REPRESENTATIVES)
+    assert [memo.get(i) for i in range(5)] == [None] * 5
+    assert sorted(calls) == [0, 2]
+
+
+def test_concurrent_duplicates_wait_for_one_selection():
+    keys = ["k"] * 50
+    calls = []
+    lock = threading.Lock()
+    started = threading.Event()
+
+    def select(invoice_index):
+        with lock:
+            calls.append(invoice_index)
+        started.wait(0.05)
+        return _selection(invoice_index)
+
+    memo = MatchMemo(select, keys, {"k": 0})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(memo.get, range(50)))
+    assert calls == [0]
+    assert {result[0] for result in results} == {"factor-0"}
+
+
+def _invoice(invoice_type, **fields):
+    values = dict.fromkeys(InvoiceRecord.__dataclass_fields__)
+    values.update(invoice_type=invoice_type, raw={}, **fields)
+    return InvoiceRecord(**values)
+
+
+def test_invoices_share_a_key_only_with_the_same_strict_mapping_key():
+    # Strict mappings are looked up on the lowercased, stripped invoice type: inner whitespace counts
+    assert strict_mapping_key("Train  TGV") != strict_mapping_key("Train TGV")
+    assert invoice_matching_key(_invoice("Train  TGV")) != invoice_matching_key(_invoice("Train TGV"))
+    assert invoice_matching_key(_invoice(" train tgv ", location="Paris")) == invoice_matching_key(_invoice("Train TGV", location="paris"))
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+import case2_rag
+
+
+class FakeSearchClient:
+    def __init__(self, endpoint, index_name, credential, transport):
+        self.endpoint = endpoint
+        self.index_name = index_name
+        self.transport = transport
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    created = []
+
+    def make_client(**kwargs):
+        created.append(FakeSearchClient(**kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(case2_rag, "RAG_SEARCH_BACKEND", "azure")
+    monkeypatch.setattr(case2_rag, "SearchClient", make_client)
+    monkeypatch.setattr(case2_rag, "_search_clients", {})
+    monkeypatch.setattr(case2_rag, "_search_transport", None)
+    return created
+
+
+def test_one_client_per_endpoint_and_index_over_one_transport(registry):
+    client = case2_rag.get_search_client("index-a", "https://search.invalid/")
+    assert case2_rag.get_search_client("index-a", "https://search.invalid") is client
+    other = case2_rag.get_search_client("index-b", "https://search.invalid")
+    assert other is not client and len(registry) == 2
+    assert client.transport is other.transport is case2_rag.get_search_transport()
+    assert client.endpoint == "https://search.invalid"
+
+
+def test_concurrent_first_calls_create_a_single_client(registry):
+    barrier = threading.Barrier(8)
+    clients = []
+
+    def get():
+        barrier.wait()
+        clients.append(case2_rag.get_search_client("index-a", "https://search.invalid"))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry) == 1 and all(client is registry[0] for client in clients)
+
+
+def test_vector_store_is_built_once_per_backend_and_index(monkeypatch):
+    built = []
+
+    def make_store(**kwargs):
+        built.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(case2_rag, "RAG_SEARCH_BACKEND", "azure")
+    monkeypatch.setattr(case2_rag, "AzureSearch", make_store)
+    monkeypatch.setattr(case2_rag, "_vector_stores", {})
+    monkeypatch.setattr(case2_rag, "_search_transport", None)
+    store = case2_rag.get_vector_store()
+    assert case2_rag.get_vector_store() is store and len(built) == 1
+    assert built[0]["additional_search_client_options"]["transport"] is case2_rag.get_search_transport()
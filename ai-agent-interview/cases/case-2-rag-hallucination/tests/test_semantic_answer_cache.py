@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import case2_rag
+from case2_rag import SemanticAnswerCache
+
+DIMENSIONS = 4
+
+
+def _partition(index_version, k=4):
+    return case2_rag.answer_cache_partition(None, None, k, "prompt", index_version)
+
+
+def _cache(**kwargs):
+    return SemanticAnswerCache(**{"threshold": 0.95, "max_entries": 3, "ttl": 0, "dimensions": DIMENSIONS, **kwargs})
+
+
+def test_lookup_serves_the_most_similar_question_above_the_threshold():
+    cache = _cache()
+    cache.add("tram", [1, 0, 0, 0], _partition("v1"), {"answer": "tram answer"})
+    cache.add("bus", [0, 1, 0, 0], _partition("v1"), {"answer": "bus answer"})
+    match = cache.lookup([0.99, 0.1, 0, 0], _partition("v1"))
+    assert match["question"] == "tram" and match["value"]["answer"] == "tram answer"
+    assert match["similarity"] == pytest.approx(0.99 / np.hypot(0.99, 0.1))
+    assert cache.lookup([0.7, 0.7, 0, 0], _partition("v1")) is None  # below the threshold for both
+    assert cache.lookup([1, 0, 0, 0], _partition("v1", k=8)) is None  # other partition
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = _cache()
+    for i, vector in enumerate(np.eye(DIMENSIONS)[:3]):
+        cache.add(f"q{i}", vector.tolist(), _partition("v1"), {"answer": i})
+    cache.lookup([1, 0, 0, 0], _partition("v1"))  # q0 becomes the most recently used
+    cache.add("q3", [0, 0, 0, 1], _partition("v1"), {"answer": 3})
+    assert cache.lookup([0, 1, 0, 0], _partition("v1")) is None
+    assert [cache.lookup(vector, _partition("v1"))["question"] for vector in ([1, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1])] == ["q0", "q2", "q3"]
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    cache = _cache(ttl=60)
+    monkeypatch.setattr(case2_rag.time, "time", lambda: 1000.0)
+    cache.add("tram", [1, 0, 0, 0], _partition("v1"), {"answer": "tram answer"})
+    monkeypatch.setattr(case2_rag.time, "time", lambda: 1061.0)
+    assert cache.lookup([1, 0, 0, 0], _partition("v1")) is None
+
+
+def test_partitions_of_previous_index_versions_are_dropped_and_their_slots_reused():
+    cache = _cache()
+    cache.add("tram", [1, 0, 0, 0], _partition("v1"), {"answer": "old"})
+    cache.add("bus", [0, 1, 0, 0], _partition("v1", k=8), {"answer": "old"})
+    cache.add("train", [0, 0, 1, 0], _partition("v2"), {"answer": "new"})
+    assert cache.retain_partitions(lambda partition: partition == _partition("v2")) == 2
+    assert len(cache._partition_ids) == 1 and cache.stats()["entries"] == 1
+    cache.add("tram", [1, 0, 0, 0], _partition("v3"), {"answer": "newer"})
+    cache.add("bus", [0, 1, 0, 0], _partition("v3"), {"answer": "newer"})
+    assert cache._next_free == 3  # freed slots reused before growing or evicting
+    assert cache.lookup([0, 0, 1, 0], _partition("v2"))["value"]["answer"] == "new"
+    assert cache.lookup([1, 0, 0, 0], _partition("v1")) is None
+
+
+def test_bumping_the_index_version_prunes_the_semantic_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR", tmp_path)
+    cache = _cache()
+    monkeypatch.setattr(case2_rag, "_semantic_answer_cache", cache)
+    old_version = case2_rag.get_index_version(case2_rag.SOLA_RAG_INDEX_NAME)
+    cache.add("tram", [1, 0, 0, 0], _partition(old_version), {"answer": "old"})
+    case2_rag.bump_index_version("other-index")
+    assert cache.stats()["entries"] == 1
+    new_version = case2_rag.bump_index_version(case2_rag.SOLA_RAG_INDEX_NAME)
+    assert cache.stats()["entries"] == 0 and cache._partition_ids == {}
+    assert case2_rag.get_index_version(case2_rag.SOLA_RAG_INDEX_NAME) == new_version
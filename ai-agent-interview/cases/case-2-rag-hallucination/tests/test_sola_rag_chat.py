@@ -0,0 +1,312 @@
+import asyncio
+
+import pytest
+from langchain.schema import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import case2_rag
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.searches = 0
+
+    def _results(self):
+        self.searches += 1
+        return [
+            (Document(page_content=f"factor {i}", metadata={"identifier": i, "row_index": i, "name_fr": f"f{i}"}), 1.0 / (i + 1))
+            for i in range(8)
+        ]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self._results()[:k]
+
+    async def asimilarity_search_with_score(self, query, k=4, **kwargs):
+        return self._results()[:k]
+
+
+class FakeLLM:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        return self.answers.pop(0) if self.answers else "answer"
+
+    def invoke(self, messages):
+        return AIMessage(content=self._next())
+
+    async def ainvoke(self, messages):
+        return AIMessage(content=self._next())
+
+    def _tokens(self):
+        answer = self._next()
+        return [answer[i:i + 3] for i in range(0, len(answer), 3)]
+
+    def stream(self, messages):
+        for token in self._tokens():
+            yield AIMessageChunk(content=token)
+
+    async def astream(self, messages):
+        for token in self._tokens():
+            await asyncio.sleep(0)
+            yield AIMessageChunk(content=token)
+
+
+def _embedding(text):
+    return [float(len(text))] + [1.0] * (case2_rag.EMBEDDING_DIMENSIONS - 1)
+
+
+@pytest.fixture
+def chat_store(monkeypatch):
+    """Fake search and embeddings, with the cache settings left as configured"""
+    store = FakeVectorStore()
+    monkeypatch.setattr(case2_rag, "_answer_cache", None)
+    monkeypatch.setattr(case2_rag, "_semantic_answer_cache", None)
+    monkeypatch.setattr(case2_rag, "_query_embeddings", case2_rag.OrderedDict())
+    monkeypatch.setattr(case2_rag, "_request_embeddings", lambda texts: [_embedding(t) for t in texts])
+
+    async def arequest_embeddings(texts):
+        return [_embedding(t) for t in texts]
+
+    monkeypatch.setattr(case2_rag, "_arequest_embeddings", arequest_embeddings)
+    monkeypatch.setattr(case2_rag, "get_vector_store", lambda rag_type="sola": store)
+    monkeypatch.setattr(case2_rag, "_vector_stores", {(case2_rag.RAG_SEARCH_BACKEND, case2_rag.SOLA_RAG_INDEX_NAME): store})
+    return store
+
+
+@pytest.fixture
+def chat_env(chat_store, monkeypatch, tmp_path):
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR", tmp_path)
+    monkeypatch.setattr(case2_rag, "RAG_INDEX_STATE_DIR_CONFIGURED", True)
+    monkeypatch.setattr(case2_rag, "RAG_ANSWER_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(case2_rag, "RAG_SEMANTIC_CACHE_MODE", "serve")
+    return chat_store
+
+
+def _use_llm(monkeypatch, answers):
+    llm = FakeLLM(answers)
+    monkeypatch.setattr(case2_rag, "get_llm", lambda: llm)
+    return llm
+
+
+def test_chat_retrieves_once_and_caches_the_answer(chat_env, monkeypatch):
+    llm = _use_llm(monkeypatch, ["first answer"])
+    chat = case2_rag.SolaRagChat()
+    answer, references, index_name = chat.chat("Emission factor for the metro?", k=3)
+    assert answer == "first answer"
+    assert [ref["identifier"] for ref in references] == [0, 1, 2]
+    assert index_name == case2_rag.SOLA_RAG_INDEX_NAME
+    assert chat_env.searches == 1
+    assert chat.chat("emission factor for the METRO", k=3)[0] == "first answer"
+    assert llm.calls == 1
+
+
+def test_chat_answers_with_the_default_settings(chat_store, monkeypatch):
+    llm = _use_llm(monkeypatch, ["first answer", "second answer"])
+    chat = case2_rag.SolaRagChat()
+    assert chat.chat("Emission factor for the TGV?", k=3)[0] == "first answer"
+    assert chat.chat("Emission factor for the TGV?", k=3)[0] == "second answer"
+    assert llm.calls == 2 and chat_store.searches == 2
+    assert case2_rag.get_semantic_answer_cache() is None
+
+
+@pytest.mark.parametrize("entry_point", ["chat", "achat"])
+def test_empty_answers_are_not_cached(chat_env, monkeypatch, entry_point):
+    llm = _use_llm(monkeypatch, ["", "real answer"])
+    chat = case2_rag.SolaRagChat()
+
+    def ask():
+        if entry_point == "achat":
+            return asyncio.run(chat.achat("emission factor for the tram"))
+        return chat.chat("emission factor for the tram")
+
+    assert ask()[0] == case2_rag.CHAT_EMPTY_ANSWER
+    assert ask()[0] == "real answer"
+    assert ask()[0] == "real answer"
+    assert llm.calls == 2
+
+
+def test_achat_timeout_returns_an_error_answer(chat_env, monkeypatch):
+    class SlowLLM(FakeLLM):
+        async def ainvoke(self, messages):
+            await asyncio.sleep(1)
+
+    monkeypatch.setattr(case2_rag, "get_llm", lambda: SlowLLM([]))
+    monkeypatch.setattr(case2_rag, "RAG_CHAT_LLM_TIMEOUT", 0.01)
+    answer, references, index_name = asyncio.run(case2_rag.SolaRagChat().achat("emission factor for the bus"))
+    assert "generation step timed out" in answer
+    assert (references, index_name) == ([], "")
+
+
+def _collect(chat, entry_point, question):
+    if entry_point == "astream":
+        async def run():
+            return [event async for event in chat.astream(question)]
+        return asyncio.run(run())
+    return list(chat.stream(question))
+
+
+@pytest.mark.parametrize("entry_point", ["stream", "astream"])
+def test_stream_events_and_caching(chat_env, monkeypatch, entry_point):
+    llm = _use_llm(monkeypatch, ["streamed answer"])
+    chat = case2_rag.SolaRagChat()
+    events = _collect(chat, entry_point, "emission factor for the train")
+    assert events[0]["event"] == "references"
+    assert "".join(event["data"] for event in events if event["event"] == "token") == "streamed answer"
+    done = events[-1]
+    assert done["event"] == "done" and done["data"]["answer"] == "streamed answer" and not done["data"]["cached"]
+    assert done["data"]["ttft_ms"] <= done["data"]["total_ms"]
+    cached = _collect(chat, entry_point, "Emission factor for the train?")
+    assert [event["event"] for event in cached] == ["references", "token", "done"]
+    assert cached[-1]["data"]["cached"] and cached[-1]["data"]["answer"] == "streamed answer"
+    assert llm.calls == 1
+    assert case2_rag.format_sse(cached[1]) == 'event: token\ndata: "streamed answer"\n\n'
+
+
+@pytest.mark.parametrize("entry_point", ["stream", "astream"])
+def test_stream_does_not_cache_empty_or_cut_off_answers(chat_env, monkeypatch, entry_point):
+    llm = _use_llm(monkeypatch, ["", "cut off", "full answer"])
+    original_tokens = llm._tokens
+
+    def tokens():
+        tokens = original_tokens()
+        if tokens == ["cut", " of", "f"]:
+            return tokens + [("", "length")]
+        return tokens
+
+    def to_chunk(token):
+        if isinstance(token, tuple):
+            return AIMessageChunk(content=token[0], response_metadata={"finish_reason": token[1]})
+        return AIMessageChunk(content=token)
+
+    def stream(messages):
+        for token in tokens():
+            yield to_chunk(token)
+
+    async def astream(messages):
+        for token in tokens():
+            yield to_chunk(token)
+
+    monkeypatch.setattr(llm, "stream", stream)
+    monkeypatch.setattr(llm, "astream", astream)
+    chat = case2_rag.SolaRagChat()
+    question = "emission factor for the ferry"
+    empty = _collect(chat, entry_point, question)
+    assert [event["data"] for event in empty if event["event"] == "token"] == [case2_rag.CHAT_EMPTY_ANSWER]
+    assert empty[-1]["data"]["answer"] == case2_rag.CHAT_EMPTY_ANSWER
+    assert _collect(chat, entry_point, question)[-1]["data"]["answer"] == "cut off"
+    assert _collect(chat, entry_point, question)[-1]["data"]["answer"] == "full answer"
+    assert _collect(chat, entry_point, question)[-1]["data"]["cached"]
+    assert llm.calls == 3
+
+
+def test_astream_token_timeout_is_not_cached(chat_env, monkeypatch):
+    llm = _use_llm(monkeypatch, ["slow answer", "fast answer"])
+    state = {"slow": True}
+
+    async def astream(messages):
+        slow = state.pop("slow", False)
+        for token in llm._tokens():
+            yield AIMessageChunk(content=token)
+            if slow:
+                await asyncio.sleep(1)
+
+    monkeypatch.setattr(llm, "astream", astream)
+    monkeypatch.setattr(case2_rag, "RAG_CHAT_LLM_TIMEOUT", 0.05)
+    chat = case2_rag.SolaRagChat()
+    events = _collect(chat, "astream", "emission factor for the plane")
+    assert events[-1]["event"] == "error" and "generation step timed out" in events[-1]["data"]["message"]
+    assert _collect(chat, "astream", "emission factor for the plane")[-1]["data"]["answer"] == "fast answer"
+
+
+def test_achat_searches_azure_through_a_client_of_each_event_loop(chat_env, monkeypatch):
+    import azure.search.documents.aio
+
+    class FakeEmbeddings(case2_rag.Embeddings):
+        def embed_documents(self, texts):
+            return [_embedding(t) for t in texts]
+
+        def embed_query(self, text):
+            return _embedding(text)
+
+    class FakeAzureSearch(case2_rag.AzureSearch):
+        def __init__(self):  # no index lookup over the network
+            self.embedding_function = FakeEmbeddings()
+            self.search_type = "hybrid"
+
+    class FakeAsyncSearchClient:
+        def __init__(self, endpoint, index_name, credential):
+            self.loop = asyncio.get_running_loop()
+            self.closed = False
+            clients.append(self)
+
+        async def close(self):
+            assert not self.loop.is_closed()
+            self.closed = True
+
+        async def search(self, search_text, vector_queries, filter, top):
+            assert asyncio.get_running_loop() is self.loop, "client used on another event loop"
+            searches.append((search_text, top))
+
+            async def results():
+                for i in range(3):
+                    yield {"id": f"d{i}", "content": f"factor {i}", "metadata": '{"identifier": %d}' % i, "@search.score": 1.0 / (i + 1)}
+
+            return results()
+
+    clients, searches = [], []
+    monkeypatch.setattr(azure.search.documents.aio, "SearchClient", FakeAsyncSearchClient)
+    monkeypatch.setattr(case2_rag, "_async_search_clients", case2_rag.weakref.WeakKeyDictionary())
+    store = FakeAzureSearch()
+    monkeypatch.setattr(case2_rag, "_vector_stores", {(case2_rag.RAG_SEARCH_BACKEND, case2_rag.SOLA_RAG_INDEX_NAME): store})
+    monkeypatch.setattr(case2_rag, "get_vector_store", lambda rag_type="sola": store)
+    monkeypatch.setattr(case2_rag, "RAG_SEMANTIC_CACHE_MODE", "off")  # both questions must be searched
+    _use_llm(monkeypatch, ["bus answer", "tram answer"])
+    chat = case2_rag.SolaRagChat()
+
+    async def answer(question):
+        try:
+            return await chat.achat(question, k=2)
+        finally:
+            await case2_rag.aclose_async_clients()
+
+    assert asyncio.run(answer("emission factor for the bus"))[0] == "bus answer"
+    _, references, _ = asyncio.run(answer("emission factor for the tram"))
+    assert [ref["identifier"] for ref in references] == [0, 1]
+    assert len(clients) == 2 and clients[0].loop is not clients[1].loop
+    assert all(client.closed for client in clients) and not case2_rag._async_search_clients
+    assert searches == [("emission factor for the bus", 30), ("emission factor for the tram", 30)]
+
+
+def test_aclose_async_clients_closes_the_clients_of_the_running_loop(monkeypatch):
+    closed = []
+
+    class FakeAsyncSearchClient:
+        def __init__(self, endpoint, index_name, credential):
+            pass
+
+        async def close(self):
+            closed.append(self)
+
+    import azure.search.documents.aio
+    monkeypatch.setattr(azure.search.documents.aio, "SearchClient", FakeAsyncSearchClient)
+    monkeypatch.setattr(case2_rag, "_async_search_clients", case2_rag.weakref.WeakKeyDictionary())
+
+    async def main():
+        client = case2_rag.get_async_search_client("index")
+        assert case2_rag.get_async_search_client("index") is client
+        await case2_rag.aclose_async_clients()
+        assert closed == [client]
+        assert case2_rag.get_async_search_client("index") is not client
+
+    asyncio.run(main())
+    assert len(closed) == 1
+
+
+def test_search_results_become_documents_as_azure_search_builds_them():
+    document = case2_rag.search_result_to_document({"id": "d1", "content": "TGV", "metadata": '{"identifier": 7}', "@search.score": 0.5})
+    assert (document.page_content, document.metadata) == ("TGV", {"id": "d1", "identifier": 7})
+    document = case2_rag.search_result_to_document({"id": "d2", "content": "Taxi", "content_vector": [0.1], "row_index": 3})
+    assert document.metadata == {"id": "d2", "row_index": 3}